@@ -0,0 +1,233 @@
+# Headless batch front end for video_stabilization.py
+#
+# Stabilizes every video matched by the given files, directories or glob
+# patterns, one video per worker process, without preview windows. Finished
+# outputs are skipped on the next run, so an interrupted batch can simply be
+# started again. A JSON summary with the FPS and tracked point statistics of
+# every file is written next to the outputs.
+#
+#   python batch_stabilize.py "flights/*.mp4" -o stabilized -j 8
+#   python batch_stabilize.py flights/ --set ANALYSIS_SCALE=0.5 --set OUTPUT_LAYOUT="'stabilized'"
+#   python batch_stabilize.py flights/ --config tuned.json   (from tune_smoothing.py)
+import argparse
+import ast
+import contextlib
+import glob
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import cv2
+
+import video_stabilization
+
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv', '.m4v', '.mpg', '.mpeg', '.ts')
+
+
+def findInputs(patterns, exclude_dir=None):
+  """Expand files, directories (not recursive) and glob patterns into video paths"""
+  found = []
+  for pattern in patterns:
+    if os.path.isdir(pattern):
+      paths = [os.path.join(pattern, name) for name in sorted(os.listdir(pattern))]
+    elif os.path.isfile(pattern):
+      paths = [pattern]
+    else:
+      paths = sorted(glob.glob(pattern, recursive=True))
+    for path in paths:
+      if not os.path.isfile(path) or not path.lower().endswith(VIDEO_EXTENSIONS):
+        continue
+      # Earlier outputs must not become inputs when the output dir is inside an input dir
+      if exclude_dir is not None and os.path.dirname(os.path.abspath(path)) == exclude_dir:
+        continue
+      if os.path.abspath(path) not in [os.path.abspath(p) for p in found]:
+        found.append(path)
+  return found
+
+
+def outputPath(input_path, output_dir, suffix):
+  name = os.path.splitext(os.path.basename(input_path))[0]
+  return os.path.join(output_dir, f"{name}{suffix}.mp4")
+
+
+def partialPath(output_path):
+  """Frames are written here and renamed to output_path once the file is complete"""
+  root, ext = os.path.splitext(output_path)
+  return f"{root}.partial{ext}"
+
+
+def isDone(output_path):
+  return os.path.isfile(output_path) and os.path.getsize(output_path) > 0
+
+
+def parseSetting(text):
+  """NAME=VALUE with VALUE as a Python literal, e.g. TRACK_GRID=(3,3)"""
+  name, sep, value = text.partition('=')
+  if not sep:
+    raise argparse.ArgumentTypeError(f"expected NAME=VALUE, got '{text}'")
+  try:
+    return name.strip(), ast.literal_eval(value.strip())
+  except (ValueError, SyntaxError):
+    raise argparse.ArgumentTypeError(f"'{value}' is not a Python literal")
+
+
+def loadConfig(path):
+  """Settings from a JSON object of NAME: value, e.g. exported by tune_smoothing.py"""
+  try:
+    with open(path) as f:
+      config = json.load(f)
+  except (OSError, ValueError) as e:
+    raise argparse.ArgumentTypeError(f"could not read config '{path}': {e}")
+  if not isinstance(config, dict):
+    raise argparse.ArgumentTypeError(f"config '{path}' must contain a JSON object")
+  # JSON has no tuples; settings such as TRACK_GRID expect them
+  return {name: tuple(value) if isinstance(value, list) else value for name, value in config.items()}
+
+
+def initWorker(settings, cv_threads):
+  video_stabilization.applySettings(settings)
+  # Several videos run at once, so OpenCV's own thread pool would oversubscribe the cores
+  cv2.setNumThreads(cv_threads)
+
+
+def stabilizeOne(input_path, output_path):
+  """Worker: stabilize one file, its console output goes to <output>.log"""
+  partial = partialPath(output_path)
+  log_path = os.path.splitext(output_path)[0] + '.log'
+  with open(log_path, 'w') as log, contextlib.redirect_stdout(log):
+    try:
+      result = video_stabilization.stabilizeVideo(input_path, partial)
+    except Exception:
+      if os.path.exists(partial):
+        os.remove(partial)
+      raise
+  if result['output_bytes'] == 0:
+    raise IOError(f"No frames were written for '{input_path}'")
+  os.replace(partial, output_path)
+  result['output'] = output_path
+  result['log'] = log_path
+  return result
+
+
+def loadSummary(path):
+  """Previous per-file records by input path, so resumed files keep their statistics"""
+  try:
+    with open(path) as f:
+      return {record['input']: record for record in json.load(f).get('files', [])}
+  except (OSError, ValueError, KeyError, TypeError):
+    return {}
+
+
+def writeSummary(path, records, settings, jobs, start_time):
+  done = [r for r in records if r['status'] == 'done']
+  summary = {
+    'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    'jobs': jobs,
+    'settings': {name: repr(value) for name, value in settings.items()},
+    'totals': {
+      'files': len(records),
+      'done': sum(1 for r in records if r['status'] == 'done' and not r.get('resumed')),
+      'skipped': sum(1 for r in records if r.get('resumed') or r['status'] == 'skipped'),
+      'failed': sum(1 for r in records if r['status'] == 'failed'),
+      'frames': sum(r.get('frames', 0) for r in done),
+      'wall_seconds': round(time.time() - start_time, 3),
+    },
+    'files': records,
+  }
+  # Rewritten after every file, so it is valid even if the batch is interrupted
+  tmp = path + '.tmp'
+  with open(tmp, 'w') as f:
+    json.dump(summary, f, indent=2)
+  os.replace(tmp, path)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Stabilize many videos in parallel without preview windows")
+  parser.add_argument('inputs', nargs='+', help="video files, directories or glob patterns")
+  parser.add_argument('-o', '--output-dir', default='stabilized', help="output directory (default: %(default)s)")
+  parser.add_argument('--suffix', default='_stabilized', help="added to the input name (default: %(default)s)")
+  parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                      help="worker processes (default: %(default)s)")
+  parser.add_argument('--cv-threads', type=int, default=None,
+                      help="OpenCV threads per worker (default: cores / jobs)")
+  parser.add_argument('--summary', default=None, help="JSON summary path (default: <output-dir>/summary.json)")
+  parser.add_argument('--force', action='store_true', help="re-render outputs that already exist")
+  parser.add_argument('--config', type=loadConfig, default={}, metavar='FILE.json',
+                      help="settings file, applied before any --set")
+  parser.add_argument('--set', dest='settings', type=parseSetting, action='append', default=[],
+                      metavar='NAME=VALUE', help="override a video_stabilization.py setting, may be repeated")
+  args = parser.parse_args(argv)
+
+  output_dir = os.path.abspath(args.output_dir)
+  inputs = findInputs(args.inputs, exclude_dir=output_dir)
+  if not inputs:
+    parser.error("no input videos found")
+
+  settings = dict(args.config)
+  settings.update(args.settings)
+  settings.update({'SHOW_PREVIEW': False, 'LOG_FRAMES': False})
+  try:
+    video_stabilization.applySettings(settings)
+  except KeyError as e:
+    parser.error(e.args[0])
+
+  outputs = [outputPath(path, output_dir, args.suffix) for path in inputs]
+  seen = {}
+  for path, out in zip(inputs, outputs):
+    if out in seen:
+      parser.error(f"'{path}' and '{seen[out]}' would both be written to '{out}'")
+    seen[out] = path
+
+  os.makedirs(output_dir, exist_ok=True)
+  summary_path = args.summary or os.path.join(output_dir, 'summary.json')
+  previous = loadSummary(summary_path)
+  start_time = time.time()
+
+  records = [None] * len(inputs)
+  pending = []
+  for k, (path, out) in enumerate(zip(inputs, outputs)):
+    if isDone(out) and not args.force:
+      record = dict(previous.get(path, {'input': path, 'output': out, 'status': 'skipped'}))
+      record['resumed'] = True
+      records[k] = record
+      print(f"[skip] {path} (already stabilized)")
+    else:
+      pending.append(k)
+
+  jobs = max(1, min(args.jobs, len(pending)))
+  cv_threads = args.cv_threads or max(1, (os.cpu_count() or 1) // jobs)
+  print(f"Stabilizing {len(pending)} of {len(inputs)} videos with {jobs} workers "
+        f"({cv_threads} OpenCV threads each)")
+
+  def finished():
+    return [r for r in records if r is not None]
+
+  with ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=(settings, cv_threads)) as pool:
+    futures = {pool.submit(stabilizeOne, inputs[k], outputs[k]): k for k in pending}
+    for future in as_completed(futures):
+      k = futures[future]
+      try:
+        record = future.result()
+        record['status'] = 'done'
+        points = record['tracked_points']
+        # No feature statistics when the motion came from the gyro log alone
+        tracking = (f"mean tracked points {points.get('mean', 0)}" if points is not None
+                    else "tracked points n/a (gyro motion)")
+        print(f"[done] {inputs[k]}: {record['frames']} frames in {record['seconds']:.1f} s "
+              f"({record['fps']:.1f} FPS), {tracking}")
+      except Exception as e:
+        record = {'input': inputs[k], 'output': outputs[k], 'status': 'failed', 'error': f"{type(e).__name__}: {e}"}
+        print(f"[fail] {inputs[k]}: {record['error']}")
+      records[k] = record
+      writeSummary(summary_path, finished(), settings, jobs, start_time)
+
+  writeSummary(summary_path, finished(), settings, jobs, start_time)
+  failed = sum(1 for r in records if r['status'] == 'failed')
+  print(f"Summary written to '{summary_path}'" + (f", {failed} failed" if failed else ""))
+  return 1 if failed else 0
+
+
+if __name__ == "__main__":
+  raise SystemExit(main())
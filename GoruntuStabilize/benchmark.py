@@ -0,0 +1,550 @@
+# Synthetic-jitter benchmark for video_stabilization.py and deneme.py
+#
+# Generates shaky test videos with a known camera path (a slow sweep plus
+# random jitter) at several resolutions and lengths, runs both stabilizers on
+# them without any window and reports per-stage timings, end-to-end FPS, peak
+# memory and stability metrics:
+#
+#   err px / err deg  mean error of the estimated frame-to-frame motion against
+#                     the ground truth
+#   ITF in / out      inter-frame transformation fidelity, the mean PSNR between
+#                     consecutive frames (higher is steadier)
+#   jitter in / out   RMS of the high-frequency part of the frame-to-frame
+#                     translation, from the ground truth for the input and
+#                     measured with LK on the output
+#
+# Every case runs in a fresh process so the peak memory belongs to that case.
+#
+#   python benchmark.py
+#   python benchmark.py --sizes 1280x720 --frames 150 600 --json results.json
+#   python benchmark.py --set ANALYSIS_SCALE=0.5 --set PERSISTENT_TRACKS=True
+#   python benchmark.py --sizes 640x480 --stabilizers --streams 1 2 4 8
+#
+# --streams runs deneme.MultiStreamStabilizer on that many cameras at once
+# (copies of the test video at different offsets) and reports the FPS each
+# stream gets, i.e. how many cameras one machine can stabilize in real time.
+import argparse
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import cv2
+
+import video_stabilization
+from batch_stabilize import parseSetting
+from trajectory_smoothing import smoothTrajectory
+
+try:
+  import resource
+  RESOURCE_AVAILABLE = True
+except ImportError:
+  RESOURCE_AVAILABLE = False
+
+try:
+  import psutil
+  PSUTIL_AVAILABLE = True
+except ImportError:
+  PSUTIL_AVAILABLE = False
+
+
+# Reference estimator for the output metrics, taken before any stage timers are installed
+_estimateMotion = video_stabilization.estimateMotion
+
+STABILIZERS = ('video_stabilization', 'deneme')
+
+# Per-stream frame rate a camera needs to count as handled in real time
+REALTIME_FPS = 30.0
+
+# Jitter of the synthetic camera, relative to the frame width for translation
+JITTER_TRANSLATION = 0.004
+JITTER_ROTATION = 0.003  # radians
+# Slow sweep the stabilizers should keep: amplitude (fraction of the width) and period
+SWEEP_AMPLITUDE = 0.08
+SWEEP_PERIOD = 240  # frames
+
+# Window of the moving average that separates jitter from intended motion
+JITTER_WINDOW = 7
+
+# Border ignored by the metrics (fraction of each side), where warps leave black or mirrored pixels
+METRIC_CROP = 0.1
+
+
+def peakMemoryMB():
+  """Peak resident memory of this process in MB, None if it cannot be measured"""
+  if RESOURCE_AVAILABLE:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+  if PSUTIL_AVAILABLE:
+    info = psutil.Process().memory_info()
+    return getattr(info, 'peak_wset', info.rss) / (1 << 20)
+  return None
+
+
+def motionParameters(m):
+  """(dx, dy, da) of a 2x3 or 3x3 similarity matrix, like estimateMotion returns"""
+  return np.array([m[0, 2], m[1, 2], np.arctan2(m[1, 0], m[0, 0])])
+
+
+def cameraPoses(n_frames, width, seed):
+  """Per-frame camera (x, y, angle): a slow sweep plus random jitter"""
+  rng = np.random.default_rng(seed)
+  t = np.arange(n_frames)
+  poses = np.zeros((n_frames, 3))
+  poses[:, 0] = SWEEP_AMPLITUDE * width * np.sin(2 * np.pi * t / SWEEP_PERIOD)
+  poses[:, 1] = 0.3 * SWEEP_AMPLITUDE * width * np.sin(2 * np.pi * t / (1.7 * SWEEP_PERIOD))
+  poses[:, :2] += rng.normal(0, JITTER_TRANSLATION * width, (n_frames, 2))
+  poses[:, 2] = rng.normal(0, JITTER_ROTATION, n_frames)
+  return poses
+
+
+def sceneTexture(width, height, seed):
+  """Textured scene with plenty of corners, large enough for every camera pose"""
+  rng = np.random.default_rng(seed + 1)
+  noise = (rng.random((height // 4, width // 4)) * 255).astype(np.uint8)
+  texture = cv2.resize(noise, (width, height), interpolation=cv2.INTER_CUBIC)
+  texture = cv2.cvtColor(texture, cv2.COLOR_GRAY2BGR)
+  for _ in range(width * height // 4000):
+    x, y = int(rng.integers(0, width)), int(rng.integers(0, height))
+    size = int(rng.integers(4, 30))
+    color = tuple(int(c) for c in rng.integers(0, 256, 3))
+    cv2.rectangle(texture, (x, y), (x + size, y + size), color, -1)
+  return texture
+
+
+def frameMatrices(poses, width, height, texture_shape):
+  """3x3 matrices mapping texture coordinates into each frame"""
+  th, tw = texture_shape[:2]
+  center = np.array([width / 2, height / 2])
+  matrices = np.zeros((len(poses), 3, 3))
+  for i, (x, y, a) in enumerate(poses):
+    r = np.array([[np.cos(a), -np.sin(a)], [np.sin(a), np.cos(a)]])
+    origin = np.array([tw / 2 + x, th / 2 + y])
+    matrices[i, :2, :2] = r
+    matrices[i, :2, 2] = center - r @ origin
+    matrices[i, 2, 2] = 1
+  return matrices
+
+
+def makeShakyVideo(directory, width, height, n_frames, fps=30, seed=0):
+  """Write (or reuse) a synthetic shaky video and its ground truth.
+
+  Returns the video path and the .npz path holding the camera poses and the
+  true frame-to-frame motion, in the (dx, dy, da) form of estimateMotion.
+  """
+  name = f"synthetic_{width}x{height}_{n_frames}_{seed}"
+  video_path = os.path.join(directory, name + '.avi')
+  truth_path = os.path.join(directory, name + '.truth.npz')
+  if os.path.isfile(video_path) and os.path.isfile(truth_path):
+    return video_path, truth_path
+
+  os.makedirs(directory, exist_ok=True)
+  poses = cameraPoses(n_frames, width, seed)
+  margin = int((SWEEP_AMPLITUDE + 6 * JITTER_TRANSLATION) * width + 0.1 * max(width, height)) + 8
+  texture = sceneTexture(width + 2 * margin, height + 2 * margin, seed)
+  matrices = frameMatrices(poses, width, height, texture.shape)
+
+  # MJPG keeps decoding cheap and the frames close to the rendered ones
+  out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+  if not out.isOpened():
+    raise IOError(f"Could not open video writer for '{video_path}'")
+  frame = np.empty((height, width, 3), np.uint8)
+  for m in matrices:
+    cv2.warpAffine(texture, m[:2], (width, height), dst=frame, flags=cv2.INTER_LINEAR)
+    out.write(frame)
+  out.release()
+
+  # Frame i+1 = M[i+1] M[i]^-1 applied to frame i
+  motion = np.array([motionParameters(matrices[i + 1] @ np.linalg.inv(matrices[i]))
+                     for i in range(n_frames - 1)])
+  np.savez(truth_path, poses=poses, motion=motion)
+  return video_path, truth_path
+
+
+def jitterRMS(motion):
+  """RMS of the translation left after removing a short moving average"""
+  motion = np.asarray(motion, np.float64)
+  if len(motion) < 3:
+    return 0.0
+  trend = smoothTrajectory(motion, method='moving_average', radius=JITTER_WINDOW // 2)
+  residual = motion[:, :2] - trend[:, :2]
+  return float(np.sqrt(np.mean(np.sum(residual ** 2, axis=1))))
+
+
+def motionError(estimated, truth):
+  """Mean error (px, deg) of estimated (dx, dy, da) rows against the ground truth"""
+  n = min(len(estimated), len(truth))
+  if n == 0:
+    return None, None
+  diff = np.asarray(estimated[:n], np.float64) - truth[:n]
+  return float(np.mean(np.hypot(diff[:, 0], diff[:, 1]))), float(np.degrees(np.mean(np.abs(diff[:, 2]))))
+
+
+class QualityMeter:
+  """ITF and measured jitter of a frame sequence, fed one frame at a time"""
+
+  def __init__(self, crop=METRIC_CROP):
+    self.crop = crop
+    self.prev = None
+    self.psnr = []
+    self.motion = []
+
+  def add(self, frame):
+    h, w = frame.shape[:2]
+    y0, x0 = int(h * self.crop), int(w * self.crop)
+    gray = cv2.cvtColor(frame[y0:h - y0, x0:w - x0], cv2.COLOR_BGR2GRAY)
+    if self.prev is not None:
+      self.psnr.append(min(cv2.PSNR(self.prev, gray), 100.0))
+      transform, _ = _estimateMotion(self.prev, gray)
+      self.motion.append(transform if transform is not None else [0, 0, 0])
+    self.prev = gray
+
+  def itf(self):
+    return float(np.mean(self.psnr)) if self.psnr else None
+
+  def jitter(self):
+    return jitterRMS(self.motion)
+
+
+class StageTimer:
+  """Accumulates the time spent in wrapped functions"""
+
+  def __init__(self):
+    self.totals = {}
+
+  def wrap(self, name, fn):
+    def timed(*args, **kwargs):
+      start = time.perf_counter()
+      try:
+        return fn(*args, **kwargs)
+      finally:
+        self.totals[name] = self.totals.get(name, 0.0) + time.perf_counter() - start
+    return timed
+
+  def msPerFrame(self, frames):
+    return {name: round(total * 1000 / max(1, frames), 3) for name, total in self.totals.items()}
+
+
+def decodeTime(video_path):
+  """Seconds per frame spent decoding the input alone"""
+  cap = cv2.VideoCapture(video_path)
+  start = time.perf_counter()
+  frames = 0
+  while cap.read()[0]:
+    frames += 1
+  cap.release()
+  return (time.perf_counter() - start) / max(1, frames)
+
+
+def benchVideoStabilization(video_path, truth_path, work_dir, settings):
+  """Run stabilizeVideo headless and measure it (runs in its own process)"""
+  vs = video_stabilization
+  vs.applySettings(settings)
+
+  timer = StageTimer()
+  captured = {}
+  estimates = []
+
+  def smoothTransforms(transforms):
+    captured['transforms'] = np.array(transforms)
+    return smooth(transforms)
+
+  def estimateMotion(*args, **kwargs):
+    result = motion(*args, **kwargs)
+    estimates.append(result[0] if result[0] is not None else [0, 0, 0])
+    return result
+
+  # Stage timers around the module functions; they are looked up at call time
+  motion = timer.wrap('motion', vs.estimateMotion)
+  smooth = timer.wrap('smooth', vs.smoothTransforms)
+  vs.analysisGray = timer.wrap('gray', vs.analysisGray)
+  vs.estimateMotion = estimateMotion
+  vs.smoothTransforms = smoothTransforms
+  vs.FrameRenderer.render = timer.wrap('warp', vs.FrameRenderer.render)
+  vs.FrameOutput.write = timer.wrap('encode', vs.FrameOutput.write)
+
+  output_path = os.path.join(work_dir, os.path.splitext(os.path.basename(video_path))[0] + '_vs.mp4')
+  result = vs.stabilizeVideo(video_path, output_path)
+  frames = result['frames']
+
+  truth = np.load(truth_path)
+  # Two-pass runs hand the whole array to the smoother; the serial pass skips the last pair
+  estimated = captured['transforms'][:max(0, len(captured['transforms']) - 1)] if 'transforms' in captured else estimates
+  err_px, err_deg = motionError(estimated, truth['motion'])
+
+  # Output metrics from the written file, outside the timed run
+  meter_in, meter_out = QualityMeter(), QualityMeter()
+  cap_in, cap_out = cv2.VideoCapture(video_path), cv2.VideoCapture(output_path)
+  while True:
+    ok_in, frame_in = cap_in.read()
+    ok_out, frame_out = cap_out.read()
+    if not (ok_in and ok_out):
+      break
+    if vs.OUTPUT_LAYOUT == 'side_by_side':
+      frame_out = frame_out[:, frame_out.shape[1] // 2:]
+    meter_in.add(frame_in)
+    meter_out.add(frame_out)
+  cap_in.release()
+  cap_out.release()
+
+  stages = timer.msPerFrame(frames)
+  stages['decode'] = round(decodeTime(video_path) * 1000, 3)
+  return {
+    'frames': frames,
+    'seconds': result['seconds'],
+    'fps': result['fps'],
+    'stages_ms': stages,
+    'peak_mb': peakMemoryMB(),
+    'err_px': err_px,
+    'err_deg': err_deg,
+    'itf_in': meter_in.itf(),
+    'itf_out': meter_out.itf(),
+    'jitter_in': jitterRMS(truth['motion']),
+    'jitter_out': meter_out.jitter(),
+  }
+
+
+def benchImageStabilizer(video_path, truth_path, settings):
+  """Run deneme.ImageStabilizer frame by frame and measure it (runs in its own process)"""
+  import deneme
+
+  stabilizer = deneme.ImageStabilizer(**settings)
+  estimates = []
+
+  meter_in, meter_out = QualityMeter(), QualityMeter()
+  cap = cv2.VideoCapture(video_path)
+  frames = 0
+  elapsed = 0.0
+  while True:
+    start = time.perf_counter()
+    ok, frame = cap.read()
+    if not ok:
+      break
+    stabilized, _ = stabilizer.process_frame(frame, frames)
+    elapsed += time.perf_counter() - start
+    # Metrics are not part of the timed loop
+    if frames > 0:
+      motion = stabilizer.last_motion
+      estimates.append([motion['x'], motion['y'], motion['angle']] if motion is not None else [0, 0, 0])
+    frames += 1
+    meter_in.add(frame)
+    meter_out.add(stabilized)
+  cap.release()
+
+  truth = np.load(truth_path)
+  err_px, err_deg = motionError(estimates, truth['motion'])
+  # The stabilizer's own stage histograms, folded into the benchmark's columns
+  summary = stabilizer.metrics.summary()
+  totals = {name: s['mean_ms'] * s['count'] for name, s in summary['stages'].items()}
+  columns = {'gray': ['gray'], 'detect': ['detect'],
+             'motion': ['precheck', 'phase', 'track', 'estimate'],
+             'warp': ['filter', 'warp'], 'total': ['total']}
+  stages = {column: round(sum(totals.get(name, 0.0) for name in names) / max(1, frames), 3)
+            for column, names in columns.items()}
+  stages['decode'] = round(max(0.0, elapsed * 1000 - totals.get('total', 0.0)) / max(1, frames), 3)
+  events = summary['events']
+  return {
+    'frames': frames,
+    'seconds': round(elapsed, 3),
+    'fps': round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+    'stages_ms': stages,
+    'peak_mb': peakMemoryMB(),
+    'err_px': err_px,
+    'err_deg': err_deg,
+    'itf_in': meter_in.itf(),
+    'itf_out': meter_out.itf(),
+    'jitter_in': jitterRMS(truth['motion']),
+    'jitter_out': meter_out.jitter(),
+    'estimators': {'phase': events['phase_frames'], 'lk': events['lk_frames'],
+                   'static': events['static_skips'], 'keyframes': events['keyframes']},
+  }
+
+
+def benchMultiStream(video_path, n_streams, settings):
+  """Run deneme.MultiStreamStabilizer on n_streams copies of a video (runs in its own process)"""
+  import deneme
+
+  stabilizer = deneme.MultiStreamStabilizer(n_streams, **settings)
+  caps = []
+  n_frames = int(cv2.VideoCapture(video_path).get(cv2.CAP_PROP_FRAME_COUNT))
+  for k in range(n_streams):
+    cap = cv2.VideoCapture(video_path)
+    # Different offsets, so the streams do not see identical frames
+    for _ in range(k * n_frames // (2 * n_streams)):
+      cap.grab()
+    caps.append(cap)
+
+  steps = 0
+  elapsed = 0.0
+  decode = 0.0
+  while True:
+    start = time.perf_counter()
+    frames = [cap.read()[1] for cap in caps]
+    decode += time.perf_counter() - start
+    if any(frame is None for frame in frames):
+      break
+    start = time.perf_counter()
+    stabilizer.process_frames(frames)
+    elapsed += time.perf_counter() - start
+    steps += 1
+  for cap in caps:
+    cap.release()
+  step_ms = stabilizer.step_ms()
+  stabilizer.close()
+
+  return {
+    'streams': n_streams,
+    'workers': stabilizer.workers,
+    'steps': steps,
+    'seconds': round(elapsed, 3),
+    'fps_per_stream': round(steps / elapsed, 2) if elapsed > 0 else 0.0,
+    'aggregate_fps': round(steps * n_streams / elapsed, 2) if elapsed > 0 else 0.0,
+    'decode_ms': round(decode * 1000 / max(1, steps), 3),
+    'step_ms': {name: round(ms, 3) for name, ms in step_ms.items()},
+    'peak_mb': peakMemoryMB(),
+  }
+
+
+def printStreamResults(results):
+  print(f"\n{'case':<24}{'streams':>8}{'workers':>8}{'fps/str':>9}{'total':>9}"
+        f"{'track':>8}{'filter':>8}{'warp':>8}{'decode':>8}{'peak MB':>9}")
+  for r in results:
+    row = f"{r['case']:<24}{r['streams']:>8}"
+    if 'error' in r:
+      print(row + f"  failed: {r['error']}")
+      continue
+    ms = r['step_ms']
+    print(row + f"{r['workers']:>8}{r['fps_per_stream']:>9.1f}{r['aggregate_fps']:>9.1f}"
+          f"{ms['track']:>8.2f}{ms['filter']:>8.3f}{ms['warp']:>8.2f}{r['decode_ms']:>8.2f}"
+          f"{formatValue(r['peak_mb'], '.0f'):>9}")
+  print("\nStep columns are ms per step (one frame of every stream); decoding is not part of the FPS.")
+  for case in dict.fromkeys(r['case'] for r in results):
+    handled = [r['streams'] for r in results
+               if r['case'] == case and r.get('fps_per_stream', 0) >= REALTIME_FPS]
+    print(f"{case}: largest tested stream count with >= {REALTIME_FPS:g} FPS per stream: "
+          f"{max(handled) if handled else 'none'}")
+
+
+def runIsolated(fn, *args):
+  """Run fn in a fresh process so peak memory and caches start from zero"""
+  context = multiprocessing.get_context('spawn')
+  with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+    return pool.submit(fn, *args).result()
+
+
+def formatValue(value, fmt):
+  return format(value, fmt) if value is not None else '-'
+
+
+def printResults(results):
+  stages = ['decode', 'gray', 'detect', 'motion', 'smooth', 'warp', 'encode']
+  print(f"\n{'case':<24}{'stabilizer':<21}{'fps':>8}"
+        + ''.join(f"{s:>8}" for s in stages)
+        + f"{'peak MB':>9}{'err px':>8}{'err deg':>8}{'ITF in':>8}{'ITF out':>8}{'jit in':>8}{'jit out':>8}")
+  for r in results:
+    row = f"{r['case']:<24}{r['stabilizer']:<21}"
+    if 'error' in r:
+      print(row + f"failed: {r['error']}")
+      continue
+    row += f"{r['fps']:>8.1f}" + ''.join(f"{formatValue(r['stages_ms'].get(s), '.2f'):>8}" for s in stages)
+    row += (f"{formatValue(r['peak_mb'], '.0f'):>9}{formatValue(r['err_px'], '.3f'):>8}"
+            f"{formatValue(r['err_deg'], '.4f'):>8}{formatValue(r['itf_in'], '.2f'):>8}"
+            f"{formatValue(r['itf_out'], '.2f'):>8}{r['jitter_in']:>8.2f}{r['jitter_out']:>8.2f}")
+    print(row)
+    if r.get('estimators'):
+      e = r['estimators']
+      print(f"{'':<24}{'':<21}motion estimated by phase correlation on {e['phase']} frames,"
+            f" by LK on {e['lk']}, skipped on {e['static']} static frames; {e['keyframes']} keyframes")
+  print("\nStage columns are ms per frame. video_stabilization FPS includes analysis, smoothing and encoding;"
+        "\ndeneme FPS covers decoding and process_frame only.")
+
+
+def parseSize(text):
+  try:
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got '{text}'")
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Benchmark both stabilizers on synthetic shaky video")
+  parser.add_argument('--sizes', type=parseSize, nargs='+', default=[(640, 360), (1280, 720), (1920, 1080)],
+                      metavar='WxH', help="frame sizes (default: 640x360 1280x720 1920x1080)")
+  parser.add_argument('--frames', type=int, nargs='+', default=[150], help="video lengths (default: 150)")
+  parser.add_argument('--seed', type=int, default=0, help="seed of the synthetic camera path")
+  parser.add_argument('--stabilizers', nargs='*', choices=STABILIZERS, default=list(STABILIZERS))
+  parser.add_argument('--streams', type=int, nargs='*', default=[], metavar='N',
+                      help="also run deneme.MultiStreamStabilizer with N cameras at once")
+  parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'goruntu_benchmark'),
+                      help="generated videos and outputs, reused between runs (default: %(default)s)")
+  parser.add_argument('--set', dest='settings', type=parseSetting, action='append', default=[],
+                      metavar='NAME=VALUE', help="override a video_stabilization.py setting, may be repeated")
+  parser.add_argument('--smoothing-factor', type=float, default=0.8, help="deneme.py smoothing factor")
+  parser.add_argument('--analysis-scale', type=float, default=1.0, help="deneme.py analysis scale")
+  parser.add_argument('--motion-estimator', choices=['lk', 'phase'], default='lk',
+                      help="deneme.py motion estimator (phase: phase correlation with LK fallback)")
+  parser.add_argument('--motion-reference', choices=['previous', 'keyframe'], default='previous',
+                      help="deneme.py motion reference (keyframe: track against a keyframe, skip static frames)")
+  parser.add_argument('--json', default=None, help="also write the results to this JSON file")
+  args = parser.parse_args(argv)
+
+  # Timings must not include the preview, logging or a warm motion cache
+  vs_settings = {'SHOW_PREVIEW': False, 'LOG_FRAMES': False, 'SHOW_FPS': False,
+                 'MOTION_CACHE': False, 'SCALE_REPORT_PAIRS': 0, 'OUTPUT_LAYOUT': 'stabilized'}
+  vs_settings.update(dict(args.settings))
+  try:
+    video_stabilization.applySettings(dict(vs_settings))
+  except KeyError as e:
+    parser.error(e.args[0])
+  deneme_settings = {'smoothing_factor': args.smoothing_factor, 'analysis_scale': args.analysis_scale,
+                     'motion_estimator': args.motion_estimator, 'reference': args.motion_reference}
+
+  results = []
+  stream_results = []
+  for width, height in args.sizes:
+    for n_frames in args.frames:
+      case = f"{width}x{height} x{n_frames}"
+      print(f"Generating {case}...")
+      video_path, truth_path = makeShakyVideo(args.work_dir, width, height, n_frames, seed=args.seed)
+      for name in args.stabilizers:
+        print(f"Running {name} on {case}...")
+        try:
+          if name == 'video_stabilization':
+            result = runIsolated(benchVideoStabilization, video_path, truth_path, args.work_dir, vs_settings)
+          else:
+            result = runIsolated(benchImageStabilizer, video_path, truth_path, deneme_settings)
+        except Exception as e:
+          result = {'error': f"{type(e).__name__}: {e}"}
+        result.update({'case': case, 'stabilizer': name, 'width': width, 'height': height})
+        results.append(result)
+      for n_streams in args.streams:
+        print(f"Running {n_streams} streams on {case}...")
+        try:
+          # The batched multi-stream tracker has no phase-correlation or keyframe path
+          multi_settings = {k: v for k, v in deneme_settings.items()
+                            if k not in ('motion_estimator', 'reference')}
+          result = runIsolated(benchMultiStream, video_path, n_streams, multi_settings)
+        except Exception as e:
+          result = {'streams': n_streams, 'error': f"{type(e).__name__}: {e}"}
+        result.update({'case': case, 'width': width, 'height': height})
+        stream_results.append(result)
+
+  if results:
+    printResults(results)
+  if stream_results:
+    printStreamResults(stream_results)
+  if args.json:
+    with open(args.json, 'w') as f:
+      json.dump({'settings': {k: repr(v) for k, v in vs_settings.items()}, 'deneme': deneme_settings,
+                 'results': results, 'streams': stream_results}, f, indent=2)
+    print(f"Results written to '{args.json}'")
+
+
+if __name__ == "__main__":
+  main()
@@ -6,9 +6,64 @@
 """
 import cv2
 import numpy as np
+import os
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 import time
 
+from governor import PerformanceGovernor
+from gyro_motion import videoTransforms
+from network_source import NetworkCapture, isNetworkURL
+from stage_metrics import MetricsServer, StageMetrics
+from threaded_capture import ThreadedCapture
+
+
+# Arka plan yakalama kuyruğu: kamerada yalnızca en yeni frame (1), video
+# dosyasında frame atlamadan önceden okunan frame sayısı
+CAMERA_QUEUE_SIZE = 1
+FILE_QUEUE_SIZE = 4
+
+# Performans yöneticisi: frame işleme süresi bu bütçeyi (ms) aşınca köşe
+# sayısı, LK penceresi/piramidi, analiz ölçeği ve yeniden tespit eşiği
+# governor.DEFAULT_LIMITS sınırları içinde düşürülür. None: kapalı
+FRAME_BUDGET_MS = 33.0
+
+# Video dosyasında hareket kaynağı: None (optik akış), 'gyro' (uçuş kontrol
+# kartının gyro/attitude kaydı: <video>.gyro.csv ve <video>.camera.json,
+# özellik takibi yapılmaz) veya 'gyro+flow' (gyro tahmini optik akışla
+# düzeltilir, takip başarısız olursa gyro kullanılır). Bkz. gyro_motion.py
+MOTION_SOURCE = None
+
+# process_frame aşamalarının (gri, LK, RANSAC, yeniden tespit, filtre, warp)
+# süre histogramları ve geri dönüş sayaçları: çıkışta METRICS_JSON dosyasına
+# yazılır; METRICS_PORT ayarlıysa çalışırken http://127.0.0.1:<port>/metrics
+# adresinden Prometheus metni olarak sunulur. None: kapalı
+METRICS_JSON = None
+METRICS_PORT = None
+
+# Hareket tahmincisi: 'lk' her frame'de LK + RANSAC kullanır; 'phase' önce
+# faz korelasyonu ile yalnızca ötelemeyi ölçer, dönme veya düşük güven
+# görülünce LK + RANSAC'a geçer. 'phase' yalnızca öteleme ağırlıklı
+# görüntüde hızlıdır, dönen görüntüde LK'dan yavaştır: isteğe bağlı
+MOTION_ESTIMATOR = 'lk'
+
+# Hareket referansı: 'previous' her frame'i bir öncekiyle karşılaştırır ve
+# hareketleri toplar; 'keyframe' her frame'i bir anahtar frame ile
+# karşılaştırır (toplam hata birikmez), anahtar frame yalnızca örtüşme veya
+# inlier oranı düşünce değişir. 'keyframe' modunda son tahminden beri hareket
+# STATIC_THRESHOLD pikselin altındaysa tahmin atlanır (None: her frame
+# tahmin edilir). Faz korelasyonu yalnızca 'previous' modunda kullanılır
+MOTION_REFERENCE = 'previous'
+STATIC_THRESHOLD = 0.5
+
+# Ağ yayını (rtsp://, udp://, http:// ...): VLC üzerinden yeniden yayın
+# yerine doğrudan, FFmpeg tamponu kapalı açılır. Yayın koparsa (okuma
+# NETWORK_READ_TIMEOUT_MS içinde frame vermezse) artan beklemelerle yeniden
+# bağlanılır ve stabilizatör sıfırlanır. NETWORK_TRANSPORT: RTSP için 'udp'
+# (en düşük gecikme), 'tcp' (kayıpsız, NAT arkasında) veya None (varsayılan)
+NETWORK_TRANSPORT = None
+NETWORK_READ_TIMEOUT_MS = 2000
+
 
 class KalmanFilter:
     """Kalman Filtresi - Hareket tahmini ve düzeltme için"""
@@ -32,11 +87,38 @@ class KalmanFilter:
         return self.x
 
 
+def compensation_matrix(w, h, dx, dy, da):
+    """Kompenzasyon + kenar kırpma için 2x3 warp matrisi"""
+    # Transformasyon matrisini oluştur
+    transform_matrix = np.array([
+        [np.cos(da), -np.sin(da), dx],
+        [np.sin(da), np.cos(da), dy],
+        [0.0, 0.0, 1.0]
+    ])
+    
+    # Crop (kenarları kırp) ve tekrar (w, h) boyutuna büyütme aynı
+    # warp içinde yapılır: tek yeniden örnekleme, ara görüntü yok
+    crop_margin = int(min(w, h) * 0.05)
+    sx = w / (w - 2 * crop_margin)
+    sy = h / (h - 2 * crop_margin)
+    crop_matrix = np.array([
+        [sx, 0.0, -crop_margin * sx],
+        [0.0, sy, -crop_margin * sy],
+        [0.0, 0.0, 1.0]
+    ])
+    return (crop_matrix @ transform_matrix)[:2]
+
+
 class ImageStabilizer:
     """Görüntü Stabilizasyon Sınıfı"""
     
-    def __init__(self, smoothing_factor=0.8):
+    def __init__(self, smoothing_factor=0.8, analysis_scale=1.0, lk_win_size=15, lk_max_level=2,
+                 motion_source=None, flow_correction=False, motion_estimator='lk', phase_scale=0.5,
+                 reference='previous', static_threshold=0.5):
         self.smoothing_factor = smoothing_factor
+        # Hareket tahmini bu ölçekte küçültülmüş gri görüntüde yapılır
+        # (ör. 0.5, 0.25), warp tam çözünürlükte kalır
+        self.analysis_scale = analysis_scale
         
         # Kalman filtreleri
         self.kalman_x = KalmanFilter(process_noise=0.01, measurement_noise=0.1)
@@ -50,39 +132,292 @@ class ImageStabilizer:
         # Önceki frame
         self.prev_gray = None
         self.prev_points = None
+        self.prev_small = None
+        
+        # Faz korelasyonu ('phase'): analiz görüntüsü phase_scale ile daha da
+        # küçültülür, sol ve sağ yarının ötelemesi ayrı ölçülür. Yanıtlardan
+        # biri phase_min_response altındaysa (düşük güven) veya iki yarının
+        # ötelemesi phase_max_disagreement pikselden fazla farklıysa (dönme,
+        # ölçek) o frame LK + RANSAC ile hesaplanır. Sonraki phase_backoff
+        # frame LK ile devam eder (reddedildikçe 2, 4, 8 katı; başarılı bir
+        # frame bekleme seviyesini sıfırlamaz, yalnızca bir düşürür), böylece
+        # arada bir öteleme görülen dönen sahnede iki yöntem birden çalışmaz
+        if motion_estimator not in ('lk', 'phase'):
+            raise ValueError(f"Bilinmeyen hareket tahmincisi: {motion_estimator}")
+        self.motion_estimator = motion_estimator
+        self.phase_scale = phase_scale
+        self.phase_min_response = 0.3
+        self.phase_max_disagreement = 0.5
+        self.phase_backoff = 15
+        self.phase_wait = 0
+        self.phase_rejections = 0
+        self.hanning_windows = {}
+        
+        # Anahtar frame referansı ('keyframe'): noktalar anahtar frame'de bir
+        # kez bulunur ve her frame'de anahtar frame'den takip edilir; anahtar
+        # frame'den bu frame'e dönüşüm, anahtar frame'in kümülatif konumuna
+        # eklenir. Takip edilen noktaların inlier oranı keyframe_min_inliers
+        # veya görüntü örtüşmesi keyframe_min_overlap altına düşünce o frame
+        # yeni anahtar frame olur. Ön kontrol: son tahmin edilen frame'den
+        # static_points noktanın piramitsiz LK ile en büyük kayması
+        # static_threshold pikselin altındaysa tam tahmin atlanır ve önceki
+        # dönüşüm kullanılır. Karşılaştırma son tahmin edilen frame'le
+        # yapıldığı için yavaş kayma eşiği aşınca yine tahmin edilir. Önceki
+        # frame 2 * static_threshold pikselden fazla hareket ettiyse (kayan
+        # kamera) ön kontrol boşuna çalışmasın diye atlanır
+        if reference not in ('previous', 'keyframe'):
+            raise ValueError(f"Bilinmeyen hareket referansı: {reference}")
+        self.reference = reference
+        self.static_threshold = static_threshold
+        self.static_points = 16
+        self.keyframe_min_inliers = 0.5
+        self.keyframe_min_overlap = 0.8
+        self.clear_keyframe()
+        
+        # Gyro kaydından frame çifti başına (dx, dy, da) hareket dizisi
+        # (gyro_motion.videoTransforms). flow_correction ile optik akış bu
+        # tahminden başlar; aksi halde optik akış hiç hesaplanmaz
+        self.motion_source = motion_source
+        self.flow_correction = flow_correction
+        self.prev_index = None
+        
+        # Takip edilen nokta sayısı bunun altına düşünce yeniden tespit yapılır
+        self.redetect_threshold = 50
+        
+        # Stabilize frame için tekrar kullanılan çıktı tamponu
+        self.output_buffer = None
+        
+        # Son işlenen frame'in ölçülen hareketi, uygulanan kompenzasyonu
+        # ({'x', 'y', 'angle'}, yoksa None) ve takip edilen nokta sayısı
+        self.last_motion = None
+        self.last_correction = None
+        self.last_tracked = None
         
         # Optik akış parametreleri
         self.feature_params = dict(
             maxCorners=200,
             qualityLevel=0.01,
-            minDistance=30,
+            minDistance=max(1, 30 * analysis_scale),
             blockSize=7
         )
         
+        # Pencere boyutu ve piramit derinliği: küçük değerler daha hızlı,
+        # ancak iki frame arasında daha az hareket takip edilebilir
         self.lk_params = dict(
-            winSize=(15, 15),
-            maxLevel=2,
+            winSize=(lk_win_size, lk_win_size),
+            maxLevel=lk_max_level,
             criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 10, 0.03)
         )
         
+        # Aşama süreleri ve sayaçlar (stage_metrics.py)
+        self.metrics = StageMetrics(
+            stages=('gray', 'precheck', 'phase', 'track', 'estimate', 'detect', 'filter', 'warp',
+                    'total'),
+            events=('frames', 'phase_frames', 'lk_frames', 'phase_low_response',
+                    'phase_rotation', 'static_skips', 'keyframes', 'no_motion', 'gyro_fallback',
+                    'too_few_points', 'redetections', 'estimation_errors')
+        )
+        
         # İstatistikler
         self.motion_history = deque(maxlen=30)
         self.fps_history = deque(maxlen=30)
+        self.motion_time_history = deque(maxlen=30)
+        
+    def configure(self, max_corners=None, lk_win_size=None, lk_max_level=None,
+                  analysis_scale=None, redetect_threshold=None):
+        """Takip parametrelerini çalışırken değiştir (None: değişmez)"""
+        if max_corners is not None:
+            self.feature_params['maxCorners'] = int(max_corners)
+        if lk_win_size is not None:
+            self.lk_params['winSize'] = (int(lk_win_size), int(lk_win_size))
+        if lk_max_level is not None:
+            self.lk_params['maxLevel'] = int(lk_max_level)
+        if redetect_threshold is not None:
+            self.redetect_threshold = int(redetect_threshold)
+        if analysis_scale is not None and analysis_scale != self.analysis_scale:
+            self.analysis_scale = analysis_scale
+            self.feature_params['minDistance'] = max(1, 30 * analysis_scale)
+            # Önceki gri görüntü ve noktalar eski ölçekte: takip yeniden başlar,
+            # filtre durumu korunur
+            self.prev_gray = None
+            self.prev_points = None
+            self.prev_small = None
+            self.clear_keyframe()
+    
+    def clear_keyframe(self):
+        """Anahtar frame durumunu sil (sonraki frame anahtar frame olur)"""
+        self.key_gray = None
+        self.key_points = None
+        self.key_matrix = None
+        self.key_pose = None
+        self.check_centers = None
+        self.check_strip = None
+        self.check_points = None
+        self.check_win = None
+        self.static_candidate = False
+    
+    def set_keyframe(self, gray):
+        """gray'i (kümülatif konumuyla) anahtar frame yap"""
+        self.key_gray = gray
+        self.key_points = self.detect_features(gray)
+        # Anahtar frame'den son tahmin edilen frame'e dönüşüm (analiz ölçeği)
+        self.key_matrix = np.array([[1.0, 0.0, 0.0], [0.0, 1.0, 0.0]])
+        self.key_pose = dict(self.cumulative_transform)
+        self.set_check_points(gray, self.key_points)
+        self.static_candidate = True
+        self.metrics.count('keyframes')
+    
+    def patch_strip(self, gray):
+        """check_centers çevresindeki yamalar yan yana tek bir görüntüde"""
+        r = self.check_win // 2 + 4
+        return np.hstack([gray[y - r:y + r + 1, x - r:x + r + 1] for x, y in self.check_centers])
+    
+    def set_check_points(self, gray, points):
+        """Durağanlık ön kontrolü için referans frame'den seyreltilmiş noktalar.
+        
+        LK tüm görüntünün türevlerini hesapladığından ön kontrol yalnızca
+        noktaların çevresindeki yamalardan oluşan şeritte yapılır: maliyeti
+        çözünürlükten bağımsızdır.
+        """
+        self.check_points = None
+        self.check_win = self.lk_params['winSize'][0]
+        r = self.check_win // 2 + 4
+        h, w = gray.shape[:2]
+        if points is None or len(points) == 0 or w <= 2 * r or h <= 2 * r:
+            return
+        step = max(1, len(points) // self.static_points)
+        points = points.reshape(-1, 2)[::step][:self.static_points]
+        # Yama merkezleri görüntü içinde kalır; nokta yamanın ortasında olmayabilir
+        self.check_centers = np.clip(np.rint(points).astype(int), r, [w - 1 - r, h - 1 - r])
+        offsets = self.check_centers - r
+        offsets[:, 0] -= np.arange(len(points)) * (2 * r + 1)
+        self.check_points = (points - offsets).reshape(-1, 1, 2).astype(np.float32)
+        self.check_strip = self.patch_strip(gray)
+    
+    def is_static(self, gray):
+        """Son tahmin edilen frame'den bu yana hareket static_threshold altında mı"""
+        if self.static_threshold is None or self.check_points is None or not self.static_candidate:
+            return False
+        start = time.perf_counter()
+        # Küçük hareket için piramit gerekmez; kayma yamadan büyükse LK
+        # yakınsamaz ve kontrol başarısız olur, bu da tam tahmin demektir
+        moved, status, _ = cv2.calcOpticalFlowPyrLK(
+            self.check_strip, self.patch_strip(gray), self.check_points, None,
+            winSize=(self.check_win, self.check_win), maxLevel=0,
+            criteria=self.lk_params['criteria']
+        )
+        self.metrics.observe('precheck', time.perf_counter() - start)
+        if moved is None or not status.all():
+            return False
+        shift = np.max(np.linalg.norm(moved - self.check_points, axis=2)) / self.analysis_scale
+        return shift < self.static_threshold
+    
+    def keyframe_motion(self, gray, predicted=None):
+        """Anahtar frame'e göre ölçülen konumdan frame'ler arası hareket (yoksa None).
+        
+        Anahtar frame'in değişmesi gerekiyorsa key_gray None yapılır; yeni
+        anahtar frame stabilizasyondan sonra bu frame'den seçilir.
+        """
+        if self.is_static(gray):
+            # Konum son tahminle aynı: kümülatif dönüşüm değişmez
+            self.metrics.count('static_skips')
+            return {'x': 0.0, 'y': 0.0, 'angle': 0.0}
+        
+        motion, curr_points = self.calculate_motion(
+            self.key_gray, gray, self.key_points, predicted, guess=self.key_matrix
+        )
+        self.metrics.count('lk_frames')
+        self.last_tracked = 0 if curr_points is None else len(curr_points)
+        if motion is None:
+            self.key_gray = None
+            self.static_candidate = False
+            return None
+        
+        # Anahtar frame ile bu frame arasındaki dönüşüm
+        s = self.analysis_scale
+        c, n = np.cos(motion['angle']), np.sin(motion['angle'])
+        self.key_matrix = np.array([[c, -n, motion['x'] * s], [n, c, motion['y'] * s]])
+        self.set_check_points(gray, curr_points)
+        
+        h, w = gray.shape[:2]
+        overlap = (max(0.0, w - abs(motion['x'] * s)) * max(0.0, h - abs(motion['y'] * s))) / (w * h)
+        inlier_ratio = len(curr_points) / len(self.key_points)
+        
+        if inlier_ratio < self.keyframe_min_inliers or overlap < self.keyframe_min_overlap:
+            self.key_gray = None
+        
+        pose = {k: self.key_pose[k] + motion[k] for k in ('x', 'y', 'angle')}
+        step = {k: pose[k] - self.cumulative_transform[k] for k in ('x', 'y', 'angle')}
+        self.static_candidate = (self.static_threshold is not None
+                                 and max(abs(step['x']), abs(step['y'])) < 2 * self.static_threshold)
+        return step
+    
+    def to_phase(self, gray):
+        """Faz korelasyonu için küçültülmüş float32 gri görüntü"""
+        if self.phase_scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.phase_scale, fy=self.phase_scale,
+                              interpolation=cv2.INTER_AREA)
+        return gray.astype(np.float32)
+    
+    def phase_motion(self, prev_small, curr_small):
+        """Faz korelasyonu ile öteleme; güvenilmezse None"""
+        start = time.perf_counter()
+        h, w = curr_small.shape
+        half = w // 2
+        window = self.hanning_windows.get((half, h))
+        if window is None:
+            # Pencere kenar süreksizliklerinin FFT'de sahte tepe üretmesini önler
+            window = self.hanning_windows[(half, h)] = cv2.createHanningWindow((half, h), cv2.CV_32F)
+        (lx, ly), left_response = cv2.phaseCorrelate(prev_small[:, :half], curr_small[:, :half], window)
+        (rx, ry), right_response = cv2.phaseCorrelate(prev_small[:, half:2 * half],
+                                                      curr_small[:, half:2 * half], window)
+        self.metrics.observe('phase', time.perf_counter() - start)
         
+        # Tam çözünürlük piksele çevir
+        scale = self.analysis_scale * self.phase_scale
+        if min(left_response, right_response) < self.phase_min_response:
+            self.metrics.count('phase_low_response')
+            return None
+        # Yarımlar farklı ötelenmişse hareket saf öteleme değil
+        if max(abs(rx - lx), abs(ry - ly)) / scale > self.phase_max_disagreement:
+            self.metrics.count('phase_rotation')
+            return None
+        self.metrics.count('phase_frames')
+        return {'x': (lx + rx) / 2 / scale, 'y': (ly + ry) / 2 / scale, 'angle': 0.0}
+    
     def detect_features(self, gray):
         """Özellik noktalarını tespit et"""
+        start = time.perf_counter()
         points = cv2.goodFeaturesToTrack(gray, mask=None, **self.feature_params)
+        self.metrics.observe('detect', time.perf_counter() - start)
         return points
     
-    def calculate_motion(self, prev_gray, curr_gray, prev_points):
-        """Optik akış ile hareket hesapla"""
+    def calculate_motion(self, prev_gray, curr_gray, prev_points, predicted=None, guess=None):
+        """Optik akış ile hareket hesapla (predicted: frame'ler arası başlangıç
+        tahmini, guess: noktaların prev_gray'den beklenen 2x3 dönüşümü)"""
         if prev_points is None or len(prev_points) == 0:
             return None, None
         
         # Lucas-Kanade optik akış
-        curr_points, status, error = cv2.calcOpticalFlowPyrLK(
-            prev_gray, curr_gray, prev_points, None, **self.lk_params
-        )
+        track_start = time.perf_counter()
+        initial = None if guess is None else cv2.transform(prev_points, guess)
+        if predicted is not None:
+            # Noktalar tahmin edilen konumlarından aranmaya başlanır
+            s = self.analysis_scale
+            c, n = np.cos(predicted['angle']), np.sin(predicted['angle'])
+            m = np.array([[c, -n, predicted['x'] * s], [n, c, predicted['y'] * s]])
+            initial = cv2.transform(prev_points if initial is None else initial, m)
+        if initial is not None:
+            initial = initial.astype(np.float32)
+            curr_points, status, error = cv2.calcOpticalFlowPyrLK(
+                prev_gray, curr_gray, prev_points, initial,
+                flags=cv2.OPTFLOW_USE_INITIAL_FLOW, **self.lk_params
+            )
+        else:
+            curr_points, status, error = cv2.calcOpticalFlowPyrLK(
+                prev_gray, curr_gray, prev_points, None, **self.lk_params
+            )
+        self.metrics.observe('track', time.perf_counter() - track_start)
         
         if curr_points is None:
             return None, None
@@ -93,26 +428,30 @@ class ImageStabilizer:
         curr_pts = curr_points[idx]
         
         if len(prev_pts) < 5:
+            self.metrics.count('too_few_points')
             return None, None
         
         # Affine transformasyon matrisini hesapla
         try:
+            estimate_start = time.perf_counter()
             transform_matrix, inliers = cv2.estimateAffinePartial2D(
                 prev_pts, curr_pts, method=cv2.RANSAC, ransacReprojThreshold=3.0
             )
+            self.metrics.observe('estimate', time.perf_counter() - estimate_start)
             
             if transform_matrix is None:
                 return None, None
             
-            # Transformasyon parametrelerini çıkar
-            dx = transform_matrix[0, 2]
-            dy = transform_matrix[1, 2]
+            # Transformasyon parametrelerini çıkar (tam çözünürlük piksel)
+            dx = transform_matrix[0, 2] / self.analysis_scale
+            dy = transform_matrix[1, 2] / self.analysis_scale
             da = np.arctan2(transform_matrix[1, 0], transform_matrix[0, 0])
             
             return {'x': dx, 'y': dy, 'angle': da}, curr_pts[inliers.ravel() == 1]
             
         except Exception as e:
             print(f"Transform hesaplama hatası: {e}")
+            self.metrics.count('estimation_errors')
             return None, None
     
     def apply_stabilization(self, frame, motion):
@@ -123,6 +462,7 @@ class ImageStabilizer:
             return frame, 0.0
         
         # Kümülatif transformasyonu güncelle
+        filter_start = time.perf_counter()
         self.cumulative_transform['x'] += motion['x']
         self.cumulative_transform['y'] += motion['y']
         self.cumulative_transform['angle'] += motion['angle']
@@ -151,52 +491,162 @@ class ImageStabilizer:
         
         # Hareket büyüklüğü
         motion_magnitude = np.sqrt(dx**2 + dy**2)
+        self.last_correction = {'x': dx, 'y': dy, 'angle': da}
         
-        # Transformasyon matrisini oluştur
-        transform_matrix = np.array([
-            [np.cos(da), -np.sin(da), dx],
-            [np.sin(da), np.cos(da), dy]
-        ], dtype=np.float32)
+        # Çıktı tamponu tekrar kullanılır; sonucu saklayacak olan kopyalamalı
+        if self.output_buffer is None or self.output_buffer.shape != frame.shape:
+            self.output_buffer = np.empty_like(frame)
         
         # Görüntüyü transforme et
+        warp_start = time.perf_counter()
+        self.metrics.observe('filter', warp_start - filter_start)
         stabilized = cv2.warpAffine(
-            frame, transform_matrix, (w, h),
+            frame, compensation_matrix(w, h, dx, dy, da), (w, h),
+            dst=self.output_buffer,
             borderMode=cv2.BORDER_REFLECT_101
         )
-        
-        # Crop (kenarları kırp)
-        crop_margin = int(min(w, h) * 0.05)
-        stabilized = stabilized[
-            crop_margin:h-crop_margin,
-            crop_margin:w-crop_margin
-        ]
-        stabilized = cv2.resize(stabilized, (w, h))
+        self.metrics.observe('warp', time.perf_counter() - warp_start)
         
         return stabilized, motion_magnitude
     
-    def process_frame(self, frame):
-        """Frame işle"""
+    def to_gray(self, frame):
+        """Analiz ölçeğinde gri görüntü"""
         gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        if self.analysis_scale != 1.0:
+            gray = cv2.resize(gray, None, fx=self.analysis_scale,
+                              fy=self.analysis_scale,
+                              interpolation=cv2.INTER_AREA)
+        return gray
+    
+    def predicted_motion(self, frame_index):
+        """Önceki işlenen frame'den frame_index'e gyro hareketi (yoksa None)"""
+        if (self.motion_source is None or frame_index is None
+                or self.prev_index is None or frame_index <= self.prev_index):
+            return None
+        # Arada işlenmeyen frame'ler (stabilizasyon kapalıyken) toplanır
+        dx, dy, da = np.sum(self.motion_source[self.prev_index:frame_index], axis=0)
+        return {'x': dx, 'y': dy, 'angle': da}
+    
+    def process_frame(self, frame, frame_index=None):
+        """Frame işle (frame_index: gyro kaydındaki frame numarası)"""
+        start = time.perf_counter()
+        result = self._process_frame(frame, frame_index)
+        self.metrics.observe('total', time.perf_counter() - start)
+        self.metrics.count('frames')
+        return result
+    
+    def _process_frame(self, frame, frame_index):
+        predicted = self.predicted_motion(frame_index)
+        self.last_motion = self.last_correction = self.last_tracked = None
+        
+        if self.motion_source is not None and not self.flow_correction:
+            # Yalnızca gyro: gri dönüşüm ve özellik takibi yok
+            first = self.prev_index is None
+            self.prev_index = frame_index
+            if first:
+                return frame, 0.0
+            self.last_motion = predicted
+            stabilized_frame, motion_magnitude = self.apply_stabilization(frame, predicted)
+            self.motion_history.append(motion_magnitude)
+            return stabilized_frame, motion_magnitude
+        
+        # Gyro tahmini varsa LK onunla başlatılır, faz korelasyonu atlanır
+        phase_enabled = (self.motion_estimator == 'phase' and predicted is None
+                         and self.reference == 'previous')
+        use_phase = phase_enabled and self.phase_wait == 0
+        if phase_enabled and self.phase_wait > 0:
+            self.phase_wait -= 1
+        
+        gray_start = time.perf_counter()
+        gray = self.to_gray(frame)
+        # Bekleme biterken de hesaplanır: sonraki frame'in karşılaştırması için
+        small = self.to_phase(gray) if phase_enabled and self.phase_wait == 0 else None
+        self.metrics.observe('gray', time.perf_counter() - gray_start)
         
         if self.prev_gray is None:
             self.prev_gray = gray
-            self.prev_points = self.detect_features(gray)
+            self.prev_small = small
+            self.prev_index = frame_index
+            if self.reference == 'keyframe':
+                self.set_keyframe(gray)
+            else:
+                # Faz korelasyonunda noktalar yalnızca LK'ya geçilince aranır
+                self.prev_points = None if use_phase else self.detect_features(gray)
             return frame, 0.0
         
+        if self.reference == 'keyframe':
+            return self.process_keyframe(frame, gray, predicted, frame_index)
+        
         # Hareket hesapla
-        motion, curr_points = self.calculate_motion(
-            self.prev_gray, gray, self.prev_points
-        )
+        motion_start = time.perf_counter()
+        motion = curr_points = None
+        if use_phase and self.prev_small is not None:
+            motion = self.phase_motion(self.prev_small, small)
+            if motion is None:
+                self.phase_wait = self.phase_backoff * 2 ** min(self.phase_rejections, 3)
+                self.phase_rejections += 1
+            else:
+                self.phase_rejections = max(0, self.phase_rejections - 1)
+        phase_used = motion is not None
+        if not phase_used:
+            if self.prev_points is None:
+                # Faz korelasyonundan LK'ya geçiş: önceki frame'in noktaları yok
+                self.prev_points = self.detect_features(self.prev_gray)
+            motion, curr_points = self.calculate_motion(
+                self.prev_gray, gray, self.prev_points, predicted
+            )
+            self.metrics.count('lk_frames')
+        self.motion_time_history.append(time.perf_counter() - motion_start)
+        # Takip başarısızsa (gökyüzü, su) gyro tahmini kullanılır
+        if motion is None and predicted is not None:
+            motion = predicted
+            self.metrics.count('gyro_fallback')
+        elif motion is None:
+            # Frame stabilize edilmeden geçer
+            self.metrics.count('no_motion')
+        self.prev_index = frame_index
+        self.last_motion = motion
+        if not phase_used:
+            self.last_tracked = 0 if curr_points is None else len(curr_points)
         
         # Stabilizasyon uygula
         stabilized_frame, motion_magnitude = self.apply_stabilization(frame, motion)
         
         # Yeni özellik noktaları tespit et
-        if curr_points is None or len(curr_points) < 50:
+        if phase_used:
+            # Eski noktalar bu frame'e taşınmadı, gerekirse yeniden aranır
+            self.prev_points = None
+        elif curr_points is None or len(curr_points) < self.redetect_threshold:
             self.prev_points = self.detect_features(gray)
+            self.metrics.count('redetections')
         else:
             self.prev_points = curr_points.reshape(-1, 1, 2)
         
+        self.prev_gray = gray
+        self.prev_small = small
+        self.motion_history.append(motion_magnitude)
+        
+        return stabilized_frame, motion_magnitude
+    
+    def process_keyframe(self, frame, gray, predicted, frame_index):
+        """'keyframe' referansıyla frame işle (ilk frame'den sonra)"""
+        motion_start = time.perf_counter()
+        motion = self.keyframe_motion(gray, predicted)
+        self.motion_time_history.append(time.perf_counter() - motion_start)
+        if motion is None and predicted is not None:
+            motion = predicted
+            self.metrics.count('gyro_fallback')
+        elif motion is None:
+            self.metrics.count('no_motion')
+        self.prev_index = frame_index
+        self.last_motion = motion
+        
+        stabilized_frame, motion_magnitude = self.apply_stabilization(frame, motion)
+        
+        # Yeni anahtar frame, bu frame'in kümülatif konumuyla
+        if self.key_gray is None:
+            self.set_keyframe(gray)
+        
         self.prev_gray = gray
         self.motion_history.append(motion_magnitude)
         
@@ -211,16 +661,165 @@ class ImageStabilizer:
         self.smoothed_transform = {'x': 0.0, 'y': 0.0, 'angle': 0.0}
         self.prev_gray = None
         self.prev_points = None
+        self.prev_small = None
+        self.prev_index = None
+        self.phase_wait = 0
+        self.phase_rejections = 0
+        self.clear_keyframe()
 
 
-def add_info_overlay(frame, fps, motion, stabilization_enabled):
-    """Bilgi overlay'i ekle"""
-    h, w = frame.shape[:2]
-    overlay = frame.copy()
+class MultiStreamStabilizer:
+    """Çok kameralı stabilizatör.
+    
+    Tüm akışların Kalman, kümülatif ve yumuşatılmış durumu (akış, 3) boyutlu
+    NumPy dizilerinde tutulur (sütunlar: x, y, açı) ve her adımda tek bir
+    vektörel işlemle güncellenir. Frame başına işler (gri dönüşüm, özellik
+    takibi, warp) ortak bir thread havuzunda çalışır; OpenCV çağrıları GIL'i
+    bıraktığı için akışlar paralel işlenir. Tek akışta sonuçlar
+    ImageStabilizer ile aynıdır.
+    """
+    
+    # ImageStabilizer'daki Kalman filtreleriyle aynı gürültüler (x, y, açı)
+    PROCESS_NOISE = np.array([0.01, 0.01, 0.001])
+    MEASUREMENT_NOISE = np.array([0.1, 0.1, 0.01])
+    
+    def __init__(self, n_streams, smoothing_factor=0.8, analysis_scale=1.0,
+                 lk_win_size=15, lk_max_level=2, workers=None):
+        self.n_streams = n_streams
+        self.smoothing_factor = smoothing_factor
+        # Özellik tespiti ve optik akış için yalnızca durumsuz metotları kullanılır
+        self.estimator = ImageStabilizer(smoothing_factor, analysis_scale,
+                                         lk_win_size, lk_max_level)
+        self.workers = workers or max(1, min(n_streams, os.cpu_count() or 1))
+        self.pool = ThreadPoolExecutor(max_workers=self.workers)
+        
+        # Adım süreleri (saniye): takip, filtre, warp
+        self.step_times = {'track': deque(maxlen=100), 'filter': deque(maxlen=100),
+                           'warp': deque(maxlen=100)}
+        self.steps = 0
+        self.reset()
+    
+    def reset(self, stream=None):
+        """Bir akışı veya (stream=None) tüm akışları sıfırla"""
+        if stream is None:
+            shape = (self.n_streams, 3)
+            self.kalman_x = np.zeros(shape)
+            self.kalman_P = np.ones(shape)
+            self.cumulative = np.zeros(shape)
+            self.smoothed = np.zeros(shape)
+            self.prev_gray = [None] * self.n_streams
+            self.prev_points = [None] * self.n_streams
+            self.output_buffers = [None] * self.n_streams
+            return
+        self.kalman_x[stream] = 0.0
+        self.kalman_P[stream] = 1.0
+        self.cumulative[stream] = 0.0
+        self.smoothed[stream] = 0.0
+        self.prev_gray[stream] = None
+        self.prev_points[stream] = None
+    
+    def _track(self, stream, frame):
+        """Bir akışın hareketini hesapla (x, y, açı) veya None"""
+        gray = self.estimator.to_gray(frame)
+        if self.prev_gray[stream] is None:
+            self.prev_gray[stream] = gray
+            self.prev_points[stream] = self.estimator.detect_features(gray)
+            return None
+        
+        motion, curr_points = self.estimator.calculate_motion(
+            self.prev_gray[stream], gray, self.prev_points[stream]
+        )
+        if curr_points is None or len(curr_points) < self.estimator.redetect_threshold:
+            self.prev_points[stream] = self.estimator.detect_features(gray)
+        else:
+            self.prev_points[stream] = curr_points.reshape(-1, 1, 2)
+        self.prev_gray[stream] = gray
+        
+        if motion is None:
+            return None
+        return motion['x'], motion['y'], motion['angle']
+    
+    def _update(self, motions, valid):
+        """Geçerli hareketi olan tüm akışların filtrelerini tek adımda güncelle"""
+        rows = np.flatnonzero(valid)
+        self.cumulative[rows] += motions[rows]
+        
+        # Kalman: tahmin + güncelleme (KalmanFilter.update ile aynı)
+        P_pred = self.kalman_P[rows] + self.PROCESS_NOISE
+        K = P_pred / (P_pred + self.MEASUREMENT_NOISE)
+        self.kalman_x[rows] += K * (self.cumulative[rows] - self.kalman_x[rows])
+        self.kalman_P[rows] = (1 - K) * P_pred
+        
+        # Üstel yumuşatma
+        alpha = self.smoothing_factor
+        self.smoothed[rows] = alpha * self.smoothed[rows] + (1 - alpha) * self.kalman_x[rows]
+        
+        return self.cumulative - self.smoothed
+    
+    def _warp(self, stream, frame, compensation):
+        h, w = frame.shape[:2]
+        buffer = self.output_buffers[stream]
+        if buffer is None or buffer.shape != frame.shape:
+            buffer = self.output_buffers[stream] = np.empty_like(frame)
+        dx, dy, da = compensation
+        return cv2.warpAffine(frame, compensation_matrix(w, h, dx, dy, da), (w, h),
+                              dst=buffer, borderMode=cv2.BORDER_REFLECT_101)
+    
+    def process_frames(self, frames):
+        """Her akıştan bir frame işle (yeni frame'i olmayan akış için None).
+        
+        (stabilize frame, hareket büyüklüğü) listesi döner, frame'i olmayan
+        akışlar için None. Çıktı tamponları tekrar kullanılır.
+        """
+        if len(frames) != self.n_streams:
+            raise ValueError(f"{self.n_streams} akış için {len(frames)} frame verildi")
+        active = [s for s, frame in enumerate(frames) if frame is not None]
+        
+        start = time.perf_counter()
+        motions = np.zeros((self.n_streams, 3))
+        valid = np.zeros(self.n_streams, bool)
+        for s, motion in zip(active, self.pool.map(lambda s: self._track(s, frames[s]), active)):
+            if motion is not None:
+                motions[s] = motion
+                valid[s] = True
+        tracked = time.perf_counter()
+        
+        compensation = self._update(motions, valid)
+        magnitudes = np.hypot(compensation[:, 0], compensation[:, 1])
+        filtered = time.perf_counter()
+        
+        warp_streams = [s for s in active if valid[s]]
+        warped = dict(zip(warp_streams, self.pool.map(
+            lambda s: self._warp(s, frames[s], compensation[s]), warp_streams)))
+        done = time.perf_counter()
+        
+        self.step_times['track'].append(tracked - start)
+        self.step_times['filter'].append(filtered - tracked)
+        self.step_times['warp'].append(done - filtered)
+        self.steps += 1
+        
+        results = [None] * self.n_streams
+        for s in active:
+            # Hareket bulunamazsa frame olduğu gibi döner (ImageStabilizer gibi)
+            results[s] = (warped[s], magnitudes[s]) if valid[s] else (frames[s], 0.0)
+        return results
+    
+    def step_ms(self):
+        """Son adımların ortalama süreleri (ms)"""
+        return {name: np.mean(times) * 1000 if times else 0.0
+                for name, times in self.step_times.items()}
     
-    # Yarı saydam panel
-    cv2.rectangle(overlay, (10, 10), (300, 120), (0, 0, 0), -1)
-    frame = cv2.addWeighted(overlay, 0.6, frame, 0.4, 0)
+    def close(self):
+        self.pool.shutdown()
+
+
+def add_info_overlay(frame, fps, motion, stabilization_enabled, latency_ms=None):
+    """Bilgi overlay'ini frame üzerine yerinde çiz"""
+    # Yarı saydam panel: yalnızca panel alanı %40 parlaklığa karartılır
+    # (siyah dikdörtgenle 0.6/0.4 harmanlamanın aynısı), frame kopyalanmaz
+    panel_bottom = 120 if latency_ms is None else 150
+    panel = frame[10:panel_bottom + 1, 10:301]
+    cv2.convertScaleAbs(panel, dst=panel, alpha=0.4)
     
     # Bilgileri yaz
     cv2.putText(frame, f"FPS: {fps:.1f}", (20, 40),
@@ -233,9 +832,54 @@ def add_info_overlay(frame, fps, motion, stabilization_enabled):
     cv2.putText(frame, f"Stabilization: {status}", (20, 100),
                 cv2.FONT_HERSHEY_SIMPLEX, 0.7, color, 2)
     
+    # Yakalama -> ekran gecikmesi (bir önceki frame için ölçülen)
+    if latency_ms is not None:
+        cv2.putText(frame, f"Latency: {latency_ms:.0f} ms", (20, 130),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255, 200, 0), 2)
+    
     return frame
 
 
+class SideBySideCompositor:
+    """Orijinal | stabilize görüntü için önceden ayrılmış tuval.
+    
+    Orijinal frame doğrudan sol yarıya ölçeklenir ve stabilizatöre oradan
+    verilir; stabilizatörün çıktı tamponu sağ yarının kendisidir. Böylece
+    frame başına ne kopya ne de yeni bir çift genişlikte görüntü oluşur.
+    """
+    
+    def __init__(self, width, height):
+        self.size = (width, height)
+        self.canvas = np.zeros((height, 2 * width, 3), np.uint8)
+        self.left = self.canvas[:, :width]
+        self.right = self.canvas[:, width:]
+    
+    def set_original(self, frame):
+        """Kamera frame'ini sol yarıya yaz, sol yarıyı döndür"""
+        if frame.shape[1::-1] == self.size:
+            np.copyto(self.left, frame)
+        else:
+            cv2.resize(frame, self.size, dst=self.left)
+        return self.left
+    
+    def set_stabilized(self, frame):
+        """Stabilize frame'i sağ yarıya yaz (zaten oradaysa bir şey yapmaz)"""
+        if frame is not self.right:
+            np.copyto(self.right, frame)
+    
+    def draw(self, fps, motion, stabilization_enabled, latency_ms=None):
+        """Panelleri ve etiketleri çiz, tuvali döndür"""
+        width, height = self.size
+        # Sol panel orijinal görüntüyü gösterir; stabilize edilmemiştir
+        add_info_overlay(self.left, fps, motion, False)
+        add_info_overlay(self.right, fps, motion, stabilization_enabled, latency_ms)
+        cv2.putText(self.canvas, "ORIGINAL", (10, height - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        cv2.putText(self.canvas, "STABILIZED", (width + 10, height - 10),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        return self.canvas
+
+
 def main():
     """Ana program"""
     print("=" * 60)
@@ -244,15 +888,47 @@ def main():
     print("\nKaynak seçin:")
     print("1. Kamera (Webcam)")
     print("2. Video dosyası")
+    print("3. Ağ yayını (RTSP/UDP/HTTP)")
+    
+    choice = input("\nSeçiminiz (1/2/3): ").strip()
+    video_path = None
+    if choice == '3':
+        video_path = input("Yayın adresi (ör. rtsp://192.168.1.10:8554/live): ").strip()
+    elif choice != '1':
+        video_path = input("Video dosyası yolu: ").strip()
+    network = isNetworkURL(video_path)
     
-    choice = input("\nSeçiminiz (1/2): ").strip()
+    # Gyro kaydı yalnızca video dosyasında: hareket 640x480 frame'ler için hesaplanır
+    motion_source = None
+    if MOTION_SOURCE is not None and video_path is not None and not network:
+        try:
+            motion_source = videoTransforms(video_path, size=(640, 480))
+            print(f"✓ Hareket kaynağı: {MOTION_SOURCE} ({len(motion_source)} frame çifti)")
+        except (IOError, ValueError, ImportError) as e:
+            print(f"✗ Gyro kaydı kullanılamıyor, optik akış kullanılacak: {e}")
+    
+    # Stabilizatörü oluştur
+    stabilizer = ImageStabilizer(smoothing_factor=0.8, motion_source=motion_source,
+                                 flow_correction=MOTION_SOURCE == 'gyro+flow',
+                                 motion_estimator=MOTION_ESTIMATOR, reference=MOTION_REFERENCE,
+                                 static_threshold=STATIC_THRESHOLD)
     
     # Video kaynağını aç
+    net = None
     if choice == '1':
         cap = cv2.VideoCapture(2)
         print("\n✓ Kamera açılıyor...")
+    elif network:
+        # Yayın sağlığı (yeniden bağlanma, takılma, son frame'den beri geçen
+        # süre) stabilizatörün metriklerine eklenir
+        net = cap = NetworkCapture(video_path, transport=NETWORK_TRANSPORT,
+                                   read_timeout_ms=NETWORK_READ_TIMEOUT_MS,
+                                   metrics=stabilizer.metrics)
+        if net.connected:
+            print(f"\n✓ Yayına bağlanıldı: {video_path}")
+        else:
+            print(f"\n✗ Yayına bağlanılamadı, yeniden denenecek: {video_path}")
     else:
-        video_path = input("Video dosyası yolu: ").strip()
         cap = cv2.VideoCapture(video_path)
         print(f"\n✓ Video yükleniyor: {video_path}")
     
@@ -260,12 +936,31 @@ def main():
         print("✗ Hata: Video kaynağı açılamadı!")
         return
     
-    # Stabilizatörü oluştur
-    stabilizer = ImageStabilizer(smoothing_factor=0.8)
+    # Frame'ler arka plandaki bir thread'de okunur. Kamerada ve ağ yayınında
+    # yalnızca en yeni frame tutulur (işlenemeyenler atlanır, gecikme
+    # birikmez); video dosyasında frame atlanmaz, birkaç frame önceden okunur.
+    if video_path is None or network:
+        cap = ThreadedCapture(cap, queue_size=CAMERA_QUEUE_SIZE, drop=True)
+    else:
+        cap = ThreadedCapture(cap, queue_size=FILE_QUEUE_SIZE, drop=False)
+    
+    compositor = SideBySideCompositor(640, 480)
+    # Stabilize frame doğrudan tuvalin sağ yarısına yazılır
+    stabilizer.output_buffer = compositor.right
+    governor = None
+    if FRAME_BUDGET_MS is not None:
+        governor = PerformanceGovernor(stabilizer, budget_ms=FRAME_BUDGET_MS)
+    metrics_server = None
+    if METRICS_PORT is not None:
+        metrics_server = MetricsServer(stabilizer.metrics, METRICS_PORT)
+        host, port = metrics_server.address
+        print(f"✓ Metrikler: http://{host}:{port}/metrics")
     
     # Değişkenler
     stabilization_enabled = True
     fps_list = deque(maxlen=30)
+    latency_list = deque(maxlen=30)
+    latency_all = deque(maxlen=10000)  # son ~5 dakika (30 FPS)
     
     print("\n" + "=" * 60)
     print("KONTROLLER:")
@@ -275,23 +970,36 @@ def main():
     print("  [Q/ESC] - Çıkış")
     print("=" * 60 + "\n")
     
+    frame_index = -1
+    connections = net.connections if net is not None else 0
     while True:
         start_time = time.time()
         
-        ret, frame = cap.read()
+        ret, frame, captured_at = cap.read()
         if not ret:
             print("\n✗ Frame okunamadı veya video bitti!")
             break
+        frame_index += 1
+        if net is not None and net.connections != connections:
+            if connections:
+                # Kopukluk sırasındaki kamera hareketi bilinmiyor
+                stabilizer.reset()
+                print("\n→ Yayına yeniden bağlanıldı, stabilizatör sıfırlandı")
+            connections = net.connections
+        # Frame'i yeniden boyutlandır (doğrudan tuvalin sol yarısına)
+        frame = compositor.set_original(frame)
         
-        # Frame'i yeniden boyutlandır
-        frame = cv2.resize(frame, (640, 480))
-        
-        # Stabilizasyon işle
+        # Stabilizasyon işle (stabilizatör sağ yarıya warp eder)
         if stabilization_enabled:
-            stabilized_frame, motion = stabilizer.process_frame(frame.copy())
+            # Governor yalnızca stabilizasyon süresini görür: imshow, overlay ve
+            # waitKey ayarlarla değişmez, onları ölçmek seviyeyi boşuna düşürür
+            work_start = time.perf_counter()
+            stabilized_frame, motion = stabilizer.process_frame(frame, frame_index)
+            work_ms = (time.perf_counter() - work_start) * 1000
         else:
-            stabilized_frame = frame.copy()
+            stabilized_frame = frame
             motion = 0.0
+        compositor.set_stabilized(stabilized_frame)
         
         # FPS hesapla
         elapsed = time.time() - start_time
@@ -300,25 +1008,23 @@ def main():
         avg_fps = np.mean(fps_list)
         
         # Bilgi overlay'i ekle
-        frame_with_info = add_info_overlay(frame, avg_fps, motion, False)
-        stabilized_with_info = add_info_overlay(
-            stabilized_frame, avg_fps, motion, stabilization_enabled
-        )
-        
-        # Yan yana göster
-        combined = np.hstack([frame_with_info, stabilized_with_info])
-        
-        # Etiketler ekle
-        cv2.putText(combined, "ORIGINAL", (10, combined.shape[0] - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
-        cv2.putText(combined, "STABILIZED", (650, combined.shape[0] - 10),
-                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255, 255, 255), 2)
+        avg_latency = np.mean(latency_list) if latency_list else None
+        # Yan yana göster: paneller ve etiketler tuval üzerine yerinde çizilir
+        combined = compositor.draw(avg_fps, motion, stabilization_enabled, avg_latency)
         
         cv2.imshow('Image Stabilization System', combined)
         
+        # Gecikme: frame'in yakalanmasından ekrana verilmesine kadar
+        latency = (time.perf_counter() - captured_at) * 1000
+        latency_list.append(latency)
+        latency_all.append(latency)
+        
         # Klavye kontrolleri
         key = cv2.waitKey(1) & 0xFF
         
+        if governor is not None and stabilization_enabled:
+            governor.update(work_ms)
+        
         if key == ord('q') or key == 27:  # Q veya ESC
             print("\n✓ Çıkış yapılıyor...")
             break
@@ -342,8 +1048,28 @@ def main():
     print("\n✓ Program sonlandırıldı.")
     print("\nİstatistikler:")
     print(f"  Ortalama FPS: {np.mean(fps_list):.1f}")
+    if latency_all:
+        print(f"  Yakalama -> ekran gecikmesi: ortalama {np.mean(latency_all):.1f} ms, "
+              f"p95 {np.percentile(latency_all, 95):.1f} ms")
+    print(f"  Yakalanan frame: {cap.captured}, atlanan: {cap.dropped}, "
+          f"kaynak FPS: {cap.captureFPS():.1f}")
+    if net is not None:
+        health = net.health()
+        print(f"  Yayın: {health['reconnects']} yeniden bağlanma, {health['stream_losses']} kopma, "
+              f"{health['decode_stalls']} takılma (> {net.stall_ms:.0f} ms)")
     if stabilizer.motion_history:
         print(f"  Ortalama Hareket: {np.mean(stabilizer.motion_history):.2f} px")
+    if stabilizer.motion_time_history:
+        print(f"  Hareket tahmini: {np.mean(stabilizer.motion_time_history) * 1000:.2f} ms/frame "
+              f"(analiz ölçeği {stabilizer.analysis_scale:.2f})")
+    if governor is not None:
+        governor.printSummary()
+    stabilizer.metrics.printSummary(FRAME_BUDGET_MS)
+    if METRICS_JSON is not None:
+        stabilizer.metrics.writeJSON(METRICS_JSON)
+        print(f"\n✓ Metrikler kaydedildi: {METRICS_JSON}")
+    if metrics_server is not None:
+        metrics_server.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,282 @@
+# Output encoders for video_stabilization.py
+#
+# Two backends share the same write(frame) / release() interface:
+#   ffmpeg  raw BGR frames are piped into a local ffmpeg process, which encodes
+#           with a configurable codec, preset, CRF and thread count (libx264
+#           by default: much smaller and usually faster than OpenCV's mp4v)
+#   cv2     cv2.VideoWriter, trying a list of FourCC codes until one opens
+# 'auto' picks ffmpeg when it is on the PATH and knows the codec, and falls back
+# to cv2 otherwise. Every encoder counts the time spent encoding and reports
+# its throughput and the output size.
+#
+#   python encoders.py input.mp4 --frames 300
+# encodes the same frames with several settings and prints a comparison table.
+import argparse
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+import cv2
+
+
+CV2_CODECS = ('mp4v', 'XVID', 'MJPG', 'H264')
+
+
+class Encoder:
+  """Common bookkeeping: frames written, time spent and output size"""
+
+  backend = None
+
+  def __init__(self, path, fps, size):
+    self.path = path
+    self.fps = fps
+    self.size = size
+    self.codec = None
+    self.frames = 0
+    self.seconds = 0.0
+
+  def write(self, frame):
+    start = time.perf_counter()
+    self._write(frame)
+    self.seconds += time.perf_counter() - start
+    self.frames += 1
+
+  def release(self):
+    start = time.perf_counter()
+    self._release()
+    self.seconds += time.perf_counter() - start
+
+  def summary(self):
+    size = os.path.getsize(self.path) if os.path.isfile(self.path) else 0
+    return {
+      'backend': self.backend,
+      'codec': self.codec,
+      'frames': self.frames,
+      'seconds': round(self.seconds, 3),
+      'fps': round(self.frames / self.seconds, 2) if self.seconds > 0 else 0.0,
+      'bytes': size,
+    }
+
+  def printSummary(self):
+    s = self.summary()
+    print(f"\n=== Encoder ({s['backend']}, {s['codec']}) ===")
+    print(f"Frames encoded: {s['frames']} in {s['seconds']:.2f} s ({s['fps']:.1f} FPS)")
+    print(f"Output size: {s['bytes'] / (1 << 20):.2f} MB"
+          + (f" ({s['bytes'] * 8 / 1000 * self.fps / s['frames']:.0f} kbit/s)" if s['frames'] and self.fps > 0 else ""))
+
+
+class Cv2Encoder(Encoder):
+  """cv2.VideoWriter with the first FourCC code that opens"""
+
+  backend = 'cv2'
+
+  def __init__(self, path, fps, size, codecs=CV2_CODECS):
+    super().__init__(path, fps, size)
+    self.writer = None
+    # Try different codecs until one works
+    for codec in codecs:
+      try:
+        writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*codec), fps, size)
+      except cv2.error:
+        continue
+      if writer.isOpened():
+        self.writer = writer
+        self.codec = codec
+        break
+      writer.release()
+    if self.writer is None:
+      raise IOError(f"Could not open cv2.VideoWriter for '{path}' with any of {list(codecs)}")
+
+  def _write(self, frame):
+    self.writer.write(frame)
+
+  def _release(self):
+    self.writer.release()
+
+
+class FFmpegEncoder(Encoder):
+  """Pipes raw BGR frames into an ffmpeg subprocess"""
+
+  backend = 'ffmpeg'
+
+  def __init__(self, path, fps, size, codec='libx264', preset='veryfast', crf=23, threads=0,
+               pix_fmt='yuv420p', ffmpeg='ffmpeg', extra_args=()):
+    super().__init__(path, fps, size)
+    self.codec = codec
+    w, h = size
+    command = [ffmpeg, '-y', '-hide_banner', '-loglevel', 'error',
+               '-f', 'rawvideo', '-pix_fmt', 'bgr24', '-s', f'{w}x{h}', '-r', f'{fps:g}',
+               '-i', '-', '-an', '-c:v', codec]
+    # Presets and CRF only exist for some encoders (x264, x265, ...)
+    if preset is not None:
+      command += ['-preset', str(preset)]
+    if crf is not None:
+      command += ['-crf', str(crf)]
+    if threads is not None:
+      command += ['-threads', str(threads)]
+    if pix_fmt is not None:
+      command += ['-pix_fmt', pix_fmt]
+      # 4:2:0 chroma needs even dimensions
+      if pix_fmt.endswith('420p') and (w % 2 or h % 2):
+        command += ['-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2']
+    command += list(extra_args) + [path]
+
+    self.log = tempfile.TemporaryFile()
+    try:
+      self.process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=self.log)
+    except OSError as e:
+      self.log.close()
+      raise IOError(f"Could not start '{ffmpeg}': {e}")
+
+  def _error(self):
+    self.log.seek(0)
+    return self.log.read().decode(errors='replace').strip()
+
+  def _write(self, frame):
+    if frame.shape[1::-1] != tuple(self.size):
+      raise ValueError(f"Frame size {frame.shape[1::-1]} does not match the encoder size {tuple(self.size)}")
+    try:
+      self.process.stdin.write(memoryview(frame if frame.flags['C_CONTIGUOUS'] else frame.copy()))
+    except (BrokenPipeError, OSError):
+      self.process.wait()
+      raise IOError(f"ffmpeg stopped while encoding '{self.path}': {self._error()}")
+
+  def _release(self):
+    try:
+      self.process.stdin.close()
+    except (BrokenPipeError, OSError):
+      pass
+    code = self.process.wait()
+    error = self._error()
+    self.log.close()
+    if code != 0:
+      raise IOError(f"ffmpeg exited with code {code} for '{self.path}': {error}")
+
+
+_ffmpeg_encoders = {}
+
+
+def ffmpegSupports(codec, ffmpeg='ffmpeg'):
+  """True if the ffmpeg executable exists and lists the codec among its encoders"""
+  if ffmpeg not in _ffmpeg_encoders:
+    listing = ''
+    if shutil.which(ffmpeg):
+      try:
+        listing = subprocess.run([ffmpeg, '-hide_banner', '-encoders'], capture_output=True,
+                                 text=True, timeout=10).stdout
+      except (OSError, subprocess.SubprocessError):
+        pass
+    # Encoder lines look like " V....D libx264   libx264 H.264 ..."
+    _ffmpeg_encoders[ffmpeg] = {line.split()[1] for line in listing.splitlines()
+                                if len(line.split()) > 1 and line.startswith(' V')}
+  return codec in _ffmpeg_encoders[ffmpeg]
+
+
+def openEncoder(path, fps, size, backend='auto', **options):
+  """Open an encoder for `size` = (width, height) frames.
+
+  backend is 'ffmpeg', 'cv2' or 'auto'. 'codecs' (the FourCC list) is the
+  only cv2 option, everything else goes to ffmpeg, so one options dict serves
+  both. 'auto' uses ffmpeg when it supports the requested codec and otherwise
+  falls back to cv2.
+  """
+  ffmpeg_options = {k: v for k, v in options.items() if k != 'codecs'}
+  cv2_options = {k: v for k, v in options.items() if k == 'codecs'}
+  if backend == 'auto':
+    if ffmpegSupports(ffmpeg_options.get('codec', 'libx264'), ffmpeg_options.get('ffmpeg', 'ffmpeg')):
+      return FFmpegEncoder(path, fps, size, **ffmpeg_options)
+    print("ffmpeg not found or codec unavailable, falling back to cv2.VideoWriter")
+    return Cv2Encoder(path, fps, size, **cv2_options)
+  if backend == 'ffmpeg':
+    return FFmpegEncoder(path, fps, size, **ffmpeg_options)
+  if backend == 'cv2':
+    return Cv2Encoder(path, fps, size, **cv2_options)
+  raise ValueError(f"Unknown encoder backend '{backend}', expected 'auto', 'ffmpeg' or 'cv2'")
+
+
+def concatVideos(paths, output_path, ffmpeg='ffmpeg'):
+  """Join videos with identical encoding settings into output_path without re-encoding"""
+  list_path = os.path.splitext(output_path)[0] + '.segments.txt'
+  with open(list_path, 'w') as f:
+    for path in paths:
+      escaped = os.path.abspath(path).replace("'", "'\\''")
+      f.write(f"file '{escaped}'\n")
+  try:
+    result = subprocess.run([ffmpeg, '-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+                             '-i', list_path, '-c', 'copy', output_path], capture_output=True, text=True)
+  except OSError as e:
+    raise IOError(f"Could not start '{ffmpeg}': {e}")
+  finally:
+    os.remove(list_path)
+  if result.returncode != 0:
+    raise IOError(f"ffmpeg could not join {len(paths)} segments into '{output_path}': {result.stderr.strip()}")
+
+
+# Settings compared by default: (backend, options)
+DEFAULT_COMPARISON = [
+  ('cv2', {'codecs': ('mp4v',)}),
+  ('cv2', {'codecs': ('MJPG',)}),
+  ('ffmpeg', {'codec': 'libx264', 'preset': 'ultrafast', 'crf': 23}),
+  ('ffmpeg', {'codec': 'libx264', 'preset': 'veryfast', 'crf': 23}),
+  ('ffmpeg', {'codec': 'libx264', 'preset': 'medium', 'crf': 23}),
+  ('ffmpeg', {'codec': 'libx264', 'preset': 'veryfast', 'crf': 28}),
+  ('ffmpeg', {'codec': 'libx265', 'preset': 'fast', 'crf': 28}),
+]
+
+
+def compareEncoders(frames, fps, directory, configs=DEFAULT_COMPARISON):
+  """Encode the same frames with every (backend, options) pair, returns their summaries"""
+  os.makedirs(directory, exist_ok=True)
+  size = frames[0].shape[1::-1]
+  results = []
+  for k, (backend, options) in enumerate(configs):
+    label = backend + ' ' + ' '.join(f"{name}={value}" for name, value in options.items())
+    extension = '.avi' if options.get('codecs') in (('MJPG',), ('XVID',)) else '.mp4'
+    path = os.path.join(directory, f"encoder_{k}{extension}")
+    try:
+      encoder = openEncoder(path, fps, size, backend, **options)
+      for frame in frames:
+        encoder.write(frame)
+      encoder.release()
+      summary = encoder.summary()
+    except (IOError, ValueError) as e:
+      summary = {'error': str(e).splitlines()[0]}
+    summary['label'] = label
+    results.append(summary)
+  return results
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Compare encoder throughput and output size")
+  parser.add_argument('input', help="video whose frames are encoded")
+  parser.add_argument('--frames', type=int, default=300, help="frames read from the input (default: %(default)s)")
+  parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), 'goruntu_encoders'),
+                      help="where the test outputs are written (default: %(default)s)")
+  args = parser.parse_args(argv)
+
+  cap = cv2.VideoCapture(args.input)
+  fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+  frames = []
+  while len(frames) < args.frames:
+    success, frame = cap.read()
+    if not success:
+      break
+    frames.append(frame)
+  cap.release()
+  if not frames:
+    parser.error(f"could not read frames from '{args.input}'")
+
+  print(f"Encoding {len(frames)} frames of {frames[0].shape[1]}x{frames[0].shape[0]}...")
+  print(f"\n{'encoder':<55}{'FPS':>9}{'MB':>9}{'kbit/s':>9}")
+  for r in compareEncoders(frames, fps, args.work_dir):
+    if 'error' in r:
+      print(f"{r['label']:<55}  failed: {r['error']}")
+      continue
+    kbps = r['bytes'] * 8 / 1000 * fps / r['frames']
+    print(f"{r['label']:<55}{r['fps']:>9.1f}{r['bytes'] / (1 << 20):>9.2f}{kbps:>9.0f}")
+
+
+if __name__ == "__main__":
+  main()
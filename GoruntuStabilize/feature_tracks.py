@@ -0,0 +1,168 @@
+# Persistent feature tracks for the offline stabilizer
+#
+# Instead of detecting 200 new corners on every frame, the points tracked into
+# the current frame are kept and tracked again on the next pair. New corners
+# are only searched in grid cells that lost too many tracks, using a detection
+# mask, so goodFeaturesToTrack runs on a small part of the image (or not at
+# all) on most frames.
+#
+# Tracks whose LK error exceeds max_error, and tracks RANSAC rejects as
+# outliers of the frame motion (prune()), are dropped, so points on moving
+# objects or drifted onto flat patches do not survive and keep their cell
+# from being refilled. Cells that lost tracks to RANSAC wait retry_interval
+# frames before they are refilled, so a moving object is not re-detected on
+# every frame.
+#
+# A predicted motion (gyro+flow) is applied to the tracks as LK's initial
+# flow, so motions larger than the LK pyramid reaches are still followed.
+import numpy as np
+import cv2
+
+
+class TrackManager:
+  """Carries LK feature tracks from frame to frame with grid-based re-detection"""
+
+  def __init__(self, max_corners=200, grid=(4, 4), refill_ratio=0.5, retry_interval=5,
+               quality_level=0.01, min_distance=30, block_size=3, max_error=20.0,
+               win_size=(21, 21), max_level=3):
+    self.max_corners = max_corners
+    self.grid = grid
+    # A cell is refilled once it holds fewer than refill_ratio * its share of corners
+    self.per_cell = max(1, max_corners // (grid[0] * grid[1]))
+    self.min_per_cell = max(1, int(self.per_cell * refill_ratio))
+    # Cells that stay sparse after a detection (e.g. sky) are retried this much later
+    self.retry_interval = retry_interval
+    self.quality_level = quality_level
+    self.min_distance = min_distance
+    self.block_size = block_size
+    self.max_error = max_error
+    self.lk_params = dict(winSize=tuple(win_size), maxLevel=max_level)
+    self.reset()
+
+  def reset(self):
+    # Per-track state, one row per live track
+    self.points = np.empty((0, 2), np.float32)
+    self.ages = np.empty(0, np.int32)
+    self.error_sums = np.empty(0, np.float64)
+    self.retry_at = np.zeros(self.grid[0] * self.grid[1], np.int64)
+    # Run statistics
+    self.frames = 0
+    self.detections = 0
+    self.detected = 0
+    self.lost = 0
+    self.lost_ages = []
+    self.rejected = 0
+    self.error_total = 0.0
+    self.error_count = 0
+
+  def _cellIndex(self, points, shape):
+    rows, cols = self.grid
+    h, w = shape[:2]
+    cx = np.clip((points[:, 0] * cols / w).astype(int), 0, cols - 1)
+    cy = np.clip((points[:, 1] * rows / h).astype(int), 0, rows - 1)
+    return cy * cols + cx
+
+  def _replenish(self, gray):
+    """Detect new corners in the cells that ran low on tracks"""
+    rows, cols = self.grid
+    h, w = gray.shape[:2]
+    counts = np.bincount(self._cellIndex(self.points, gray.shape), minlength=rows * cols)
+    sparse = np.flatnonzero((counts < self.min_per_cell) & (self.retry_at <= self.frames))
+    if len(sparse) == 0:
+      return
+
+    mask = np.zeros((h, w), np.uint8)
+    for cell in sparse:
+      r, c = divmod(cell, cols)
+      mask[r * h // rows:(r + 1) * h // rows, c * w // cols:(c + 1) * w // cols] = 255
+    # Keep new corners away from the tracks we already have
+    for x, y in self.points:
+      cv2.circle(mask, (int(x), int(y)), int(self.min_distance), 0, -1)
+
+    wanted = int(np.sum(self.per_cell - counts[sparse]))
+    new_pts = cv2.goodFeaturesToTrack(gray, maxCorners=wanted, qualityLevel=self.quality_level,
+                                      minDistance=self.min_distance, blockSize=self.block_size,
+                                      mask=mask)
+    self.detections += 1
+    if new_pts is not None:
+      new_pts = new_pts.reshape(-1, 2)
+      self.detected += len(new_pts)
+      self.points = np.vstack([self.points, new_pts])
+      self.ages = np.concatenate([self.ages, np.zeros(len(new_pts), np.int32)])
+      self.error_sums = np.concatenate([self.error_sums, np.zeros(len(new_pts))])
+
+    counts = np.bincount(self._cellIndex(self.points, gray.shape), minlength=rows * cols)
+    still_sparse = sparse[counts[sparse] < self.min_per_cell]
+    self.retry_at[still_sparse] = self.frames + self.retry_interval
+
+  def track(self, prev_gray, curr_gray, predicted=None, scale=1.0):
+    """Track the live points from prev_gray into curr_gray.
+
+    predicted is an optional (dx, dy, da) full resolution motion that seeds
+    LK; scale is the analysis scale of the gray frames. Returns the matching
+    (N, 2) point arrays of the surviving tracks; the tracks then live on in
+    curr_gray coordinates for the next pair.
+    """
+    self.frames += 1
+    self._replenish(prev_gray)
+    if len(self.points) == 0:
+      return self.points, self.points
+
+    prev_pts = self.points.reshape(-1, 1, 2)
+    if predicted is not None:
+      dx, dy, da = predicted
+      m = np.array([[np.cos(da), -np.sin(da), dx * scale],
+                    [np.sin(da),  np.cos(da), dy * scale]])
+      initial = cv2.transform(prev_pts, m).astype(np.float32)
+      curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_pts, initial,
+                                                       flags=cv2.OPTFLOW_USE_INITIAL_FLOW, **self.lk_params)
+    else:
+      curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_pts, None, **self.lk_params)
+    curr_pts = curr_pts.reshape(-1, 2)
+    err = err.ravel()
+
+    h, w = curr_gray.shape[:2]
+    self.shape = (h, w)
+    keep = (status.ravel() == 1)
+    keep &= (curr_pts[:, 0] >= 0) & (curr_pts[:, 0] < w) & (curr_pts[:, 1] >= 0) & (curr_pts[:, 1] < h)
+    if self.max_error is not None:
+      keep &= err <= self.max_error
+
+    self.lost += int(np.count_nonzero(~keep))
+    self.lost_ages.extend(self.ages[~keep].tolist())
+    self.error_total += float(np.sum(err[keep]))
+    self.error_count += int(np.count_nonzero(keep))
+
+    matched_prev = self.points[keep]
+    self.points = curr_pts[keep]
+    self.ages = self.ages[keep] + 1
+    self.error_sums = self.error_sums[keep] + err[keep]
+    return matched_prev, self.points
+
+  def prune(self, inliers):
+    """Drop the tracks of the last track() call that inliers (RANSAC mask) rejects"""
+    keep = np.asarray(inliers, bool).ravel()
+    if len(keep) != len(self.points):
+      raise ValueError(f"Inlier mask of {len(keep)} points for {len(self.points)} tracks")
+    self.rejected += int(np.count_nonzero(~keep))
+    if not keep.all():
+      cells = np.unique(self._cellIndex(self.points[~keep], self.shape))
+      self.retry_at[cells] = np.maximum(self.retry_at[cells], self.frames + self.retry_interval)
+    self.lost += int(np.count_nonzero(~keep))
+    self.lost_ages.extend(self.ages[~keep].tolist())
+    self.points = self.points[keep]
+    self.ages = self.ages[keep]
+    self.error_sums = self.error_sums[keep]
+
+  def printSummary(self):
+    print("\n=== Feature Tracks ===")
+    print(f"Frame pairs tracked: {self.frames}")
+    print(f"Re-detection calls: {self.detections} ({self.detections / max(1, self.frames):.0%} of pairs)")
+    print(f"Corners detected: {self.detected}, tracks lost: {self.lost} "
+          f"({self.rejected} RANSAC outliers), live: {len(self.points)}")
+    if len(self.ages):
+      print(f"Live track age: mean {np.mean(self.ages):.1f}, max {np.max(self.ages)} frames")
+    if self.lost_ages:
+      print(f"Lost track age: mean {np.mean(self.lost_ages):.1f} frames")
+    if self.error_count:
+      print(f"Mean LK error: {self.error_total / self.error_count:.2f}")
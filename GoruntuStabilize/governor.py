@@ -0,0 +1,124 @@
+# Closed-loop performance governor for the real-time stabilizer (deneme.py)
+#
+# The stabilizer's cost per frame depends on a handful of knobs: the number of
+# corners, the LK window and pyramid depth, the analysis resolution and how
+# soon lost points are re-detected. The governor measures the frame times and
+# walks a ladder of quality levels between the configured limits: it steps
+# down (cheaper) while the median frame time is over the budget and back up
+# once there is clear headroom, waiting after every change until its effect
+# can be measured. Every change is printed and kept in `changes`.
+#
+#   governor = PerformanceGovernor(stabilizer, budget_ms=33)
+#   ...
+#   governor.update(frame_ms)   # once per frame
+from collections import deque
+
+import numpy as np
+
+
+# Knob: (best quality, cheapest allowed). The best values are the
+# ImageStabilizer defaults; the cheapest ones are the quality floor.
+DEFAULT_LIMITS = {
+  'max_corners': (200, 60),
+  'lk_win_size': (15, 9),
+  'lk_max_level': (2, 1),
+  'analysis_scale': (1.0, 0.5),
+  'redetect_threshold': (50, 20),
+}
+
+
+def qualityLadder(limits, levels):
+  """Settings for each level, 0 = best quality, levels - 1 = cheapest.
+
+  Every knob moves linearly from its best to its cheapest value, so each step
+  trims all of them a little instead of dropping one all the way.
+  """
+  ladder = []
+  for k in range(levels):
+    t = k / max(1, levels - 1)
+    settings = {}
+    for name, (best, cheapest) in limits.items():
+      value = best + (cheapest - best) * t
+      if name == 'lk_win_size':
+        # LK windows are odd
+        value = int(round(value)) | 1
+      elif name == 'analysis_scale':
+        value = round(value, 3)
+      else:
+        value = int(round(value))
+      settings[name] = value
+    ladder.append(settings)
+  return ladder
+
+
+class PerformanceGovernor:
+  """Keeps the median frame time of a stabilizer within budget_ms.
+
+  The stabilizer needs a configure(**settings) method taking the knobs of
+  DEFAULT_LIMITS (see deneme.ImageStabilizer.configure).
+  """
+
+  def __init__(self, stabilizer, budget_ms=33.0, limits=None, levels=6, window=15,
+               headroom=0.7, cooldown=30, verbose=True):
+    self.stabilizer = stabilizer
+    self.budget_ms = budget_ms
+    self.ladder = qualityLadder(dict(DEFAULT_LIMITS, **(limits or {})), levels)
+    # Frame times over the last `window` frames decide; a step up needs the
+    # median below headroom * budget so the governor does not oscillate
+    self.window = window
+    self.headroom = headroom
+    self.cooldown = cooldown
+    self.verbose = verbose
+    self.frame_times = deque(maxlen=window)
+    self.level = 0
+    self.frames = 0
+    self.wait = 0
+    self.over_budget = 0
+    self.changes = []
+    self.stabilizer.configure(**self.ladder[0])
+
+  def settings(self):
+    return dict(self.ladder[self.level])
+
+  def update(self, frame_ms):
+    """Record one frame time; returns True if the settings were changed"""
+    self.frames += 1
+    self.over_budget += frame_ms > self.budget_ms
+    self.frame_times.append(frame_ms)
+    if self.wait > 0:
+      self.wait -= 1
+      return False
+    if len(self.frame_times) < self.window:
+      return False
+
+    median = float(np.median(self.frame_times))
+    if median > self.budget_ms and self.level < len(self.ladder) - 1:
+      return self._setLevel(self.level + 1, median)
+    if median < self.headroom * self.budget_ms and self.level > 0:
+      return self._setLevel(self.level - 1, median)
+    return False
+
+  def _setLevel(self, level, median):
+    previous = self.ladder[self.level]
+    new = self.ladder[level]
+    changed = {name: (previous[name], new[name]) for name in new if previous[name] != new[name]}
+    self.stabilizer.configure(**new)
+    record = {'frame': self.frames, 'from_level': self.level, 'to_level': level,
+              'median_ms': round(median, 2), 'changed': changed}
+    self.changes.append(record)
+    if self.verbose:
+      direction = 'down' if level > self.level else 'up'
+      details = ', '.join(f"{name} {old}->{value}" for name, (old, value) in changed.items())
+      print(f"[governor] frame {self.frames}: median {median:.1f} ms vs budget {self.budget_ms:.0f} ms, "
+            f"quality {direction} to level {level}/{len(self.ladder) - 1} ({details})")
+    self.level = level
+    # The new settings need a full window of their own frame times
+    self.frame_times.clear()
+    self.wait = self.cooldown
+    return True
+
+  def printSummary(self):
+    print("\n=== Performance governor ===")
+    print(f"Budget: {self.budget_ms:.0f} ms, frames over budget: {self.over_budget} of {self.frames}"
+          + (f" ({self.over_budget / self.frames:.0%})" if self.frames else ""))
+    print(f"Level changes: {len(self.changes)}, final level {self.level}/{len(self.ladder) - 1}: {self.settings()}")
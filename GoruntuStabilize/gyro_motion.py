@@ -0,0 +1,518 @@
+# Gyro / attitude motion source for video_stabilization.py and deneme.py
+#
+# The flight controller logs the body rates (IMU GyrX/GyrY/GyrZ) and the
+# attitude (ATT Roll/Pitch/Yaw) at a much higher rate than the camera records
+# frames. For a camera that mostly rotates (the usual case for drone footage,
+# where the scene is far away) the rotation between two frames fully
+# determines the image motion:
+#
+#   x_{i+1} ~ K C R_rel^T C^T K^-1 x_i
+#
+# with K the camera intrinsics, C the rotation from the flight controller's
+# body axes (front, right, down) to the camera axes (right, down, forward) and
+# R_rel the body rotation from frame i to frame i+1. This homography is reduced
+# to the (dx, dy, da) similarity estimateMotion() returns, so both stabilizers
+# can use it in place of optical flow: no feature tracking on the hot path,
+# and it keeps working over sky or water where LK finds nothing to track.
+#
+# Logs: .csv (see loadCSV), Mission Planner / ArduPilot text .log files and
+# binary .bin logs (the latter need pymavlink). The camera is described by a
+# small JSON file (see CameraModel.load), whose time_offset aligns the log
+# clock with the video.
+#
+#   python gyro_motion.py synth --size 640x480 --frames 300 -o gyro_test
+#   python gyro_motion.py check gyro_test/gyro_640x480_300_0.avi
+import argparse
+import csv
+import json
+import os
+
+import numpy as np
+import cv2
+
+try:
+  from pymavlink import mavutil
+  PYMAVLINK_AVAILABLE = True
+except ImportError:
+  PYMAVLINK_AVAILABLE = False
+
+
+# Camera axes (x right, y down, z forward) expressed in the body axes
+# (x front, y right, z down) for a camera looking straight ahead
+FORWARD_CAMERA = np.array([[0.0, 1.0, 0.0],
+                           [0.0, 0.0, 1.0],
+                           [1.0, 0.0, 0.0]])
+
+
+def rotationMatrices(rotvecs):
+  """Rodrigues' formula for an (N, 3) array of rotation vectors, returns (N, 3, 3)"""
+  rotvecs = np.asarray(rotvecs, np.float64).reshape(-1, 3)
+  angle = np.linalg.norm(rotvecs, axis=1)
+  axis = rotvecs / np.where(angle > 1e-12, angle, 1.0)[:, None]
+  x, y, z = axis.T
+  skew = np.zeros((len(rotvecs), 3, 3))
+  skew[:, 0, 1], skew[:, 0, 2], skew[:, 1, 2] = -z, y, -x
+  skew[:, 1, 0], skew[:, 2, 0], skew[:, 2, 1] = z, -y, x
+  s = np.sin(angle)[:, None, None]
+  c = (1 - np.cos(angle))[:, None, None]
+  return np.eye(3) + s * skew + c * (skew @ skew)
+
+
+def rotationVectors(matrices):
+  """Inverse of rotationMatrices for rotations well below 180 degrees"""
+  matrices = np.asarray(matrices, np.float64).reshape(-1, 3, 3)
+  cos = np.clip((np.trace(matrices, axis1=1, axis2=2) - 1) / 2, -1.0, 1.0)
+  angle = np.arccos(cos)
+  vee = np.stack([matrices[:, 2, 1] - matrices[:, 1, 2],
+                  matrices[:, 0, 2] - matrices[:, 2, 0],
+                  matrices[:, 1, 0] - matrices[:, 0, 1]], axis=1)
+  sin = np.sin(angle)
+  factor = np.where(sin > 1e-9, angle / (2 * np.where(sin > 1e-9, sin, 1.0)), 0.5)
+  return vee * factor[:, None]
+
+
+def eulerMatrices(rpy):
+  """Body-to-earth rotations of (N, 3) roll, pitch, yaw angles (radians, ZYX order)"""
+  rpy = np.asarray(rpy, np.float64).reshape(-1, 3)
+  zeros = np.zeros(len(rpy))
+  rx = rotationMatrices(np.stack([rpy[:, 0], zeros, zeros], axis=1))
+  ry = rotationMatrices(np.stack([zeros, rpy[:, 1], zeros], axis=1))
+  rz = rotationMatrices(np.stack([zeros, zeros, rpy[:, 2]], axis=1))
+  return rz @ ry @ rx
+
+
+class RateLog:
+  """Body rates (rad/s, front-right-down axes) at the given times (s)"""
+
+  def __init__(self, times, rates):
+    order = np.argsort(times, kind='stable')
+    self.times = np.asarray(times, np.float64)[order]
+    self.rates = np.asarray(rates, np.float64).reshape(-1, 3)[order]
+
+  def __len__(self):
+    return len(self.times)
+
+  def rotations(self, frame_times):
+    """Body rotation vectors from each frame time to the next, shape (n-1, 3).
+
+    The rates are integrated with the trapezoidal rule and the rotation over
+    one frame interval is taken as the integral over that interval. The error
+    of this (first order) approximation grows with the square of the rotation
+    per frame, i.e. it stays far below a pixel for camera jitter.
+    """
+    dt = np.diff(self.times)
+    integral = np.zeros((len(self.times), 3))
+    integral[1:] = np.cumsum(0.5 * (self.rates[1:] + self.rates[:-1]) * dt[:, None], axis=0)
+    at_frames = np.stack([np.interp(frame_times, self.times, integral[:, k]) for k in range(3)], axis=1)
+    return np.diff(at_frames, axis=0)
+
+
+class AttitudeLog:
+  """Attitude (roll, pitch, yaw in radians) at the given times (s)"""
+
+  def __init__(self, times, rpy):
+    order = np.argsort(times, kind='stable')
+    self.times = np.asarray(times, np.float64)[order]
+    # Yaw wraps at +-180 degrees, interpolation must not go the long way round
+    self.rpy = np.unwrap(np.asarray(rpy, np.float64).reshape(-1, 3)[order], axis=0)
+
+  def __len__(self):
+    return len(self.times)
+
+  def rotations(self, frame_times):
+    """Body rotation vectors from each frame time to the next, shape (n-1, 3)"""
+    rpy = np.stack([np.interp(frame_times, self.times, self.rpy[:, k]) for k in range(3)], axis=1)
+    attitude = eulerMatrices(rpy)
+    relative = np.transpose(attitude[:-1], (0, 2, 1)) @ attitude[1:]
+    return rotationVectors(relative)
+
+
+def loadCSV(path):
+  """RateLog or AttitudeLog from a CSV file with a header row.
+
+  Columns: 'time' (seconds) or 'time_us' (microseconds), and either the body
+  rates 'gx', 'gy', 'gz' (rad/s, front-right-down) or the attitude 'roll',
+  'pitch', 'yaw' (radians). Other columns are ignored.
+  """
+  with open(path, newline='') as f:
+    rows = list(csv.DictReader(f))
+  if not rows:
+    raise ValueError(f"No samples in '{path}'")
+  columns = {name.strip().lower(): name for name in rows[0]}
+
+  def column(name):
+    return np.array([float(row[columns[name]]) for row in rows])
+
+  if 'time' in columns:
+    times = column('time')
+  elif 'time_us' in columns:
+    times = column('time_us') * 1e-6
+  else:
+    raise ValueError(f"'{path}' has no 'time' or 'time_us' column")
+  if all(name in columns for name in ('gx', 'gy', 'gz')):
+    return RateLog(times, np.stack([column('gx'), column('gy'), column('gz')], axis=1))
+  if all(name in columns for name in ('roll', 'pitch', 'yaw')):
+    return AttitudeLog(times, np.stack([column('roll'), column('pitch'), column('yaw')], axis=1))
+  raise ValueError(f"'{path}' needs gx, gy, gz or roll, pitch, yaw columns")
+
+
+def _dataflashLog(messages):
+  """RateLog from IMU messages (first IMU only), else AttitudeLog from ATT"""
+  imu = [m for m in messages if m['type'] == 'IMU' and int(m.get('I', 0)) == 0]
+  if imu:
+    return RateLog([m['TimeUS'] * 1e-6 for m in imu],
+                   [[m['GyrX'], m['GyrY'], m['GyrZ']] for m in imu])
+  att = [m for m in messages if m['type'] == 'ATT']
+  if att:
+    return AttitudeLog([m['TimeUS'] * 1e-6 for m in att],
+                       np.radians([[m['Roll'], m['Pitch'], m['Yaw']] for m in att]))
+  raise ValueError("The log has neither IMU nor ATT messages")
+
+
+def loadDataflashText(path):
+  """Mission Planner / ArduPilot text log ("FMT, ..." and "IMU, ..." lines)"""
+  formats = {}
+  messages = []
+  with open(path, errors='replace') as f:
+    for line in f:
+      fields = [field.strip() for field in line.split(',')]
+      if len(fields) < 2:
+        continue
+      if fields[0] == 'FMT' and len(fields) >= 6:
+        # FMT, type, length, name, format, column names...
+        formats[fields[3]] = fields[5:]
+      elif fields[0] in ('IMU', 'ATT') and fields[0] in formats:
+        names = formats[fields[0]]
+        try:
+          values = {name: float(value) for name, value in zip(names, fields[1:])}
+        except ValueError:
+          continue
+        values['type'] = fields[0]
+        messages.append(values)
+  return _dataflashLog(messages)
+
+
+def loadDataflashBinary(path):
+  """ArduPilot .bin log through pymavlink"""
+  if not PYMAVLINK_AVAILABLE:
+    raise ImportError("Reading .bin logs needs pymavlink (pip install pymavlink), "
+                      "or convert the log to text with Mission Planner")
+  log = mavutil.mavlink_connection(path)
+  messages = []
+  while True:
+    message = log.recv_match(type=['IMU', 'ATT'])
+    if message is None:
+      break
+    values = message.to_dict()
+    values['type'] = message.get_type()
+    messages.append(values)
+  return _dataflashLog(messages)
+
+
+def loadMotionLog(path):
+  """RateLog or AttitudeLog of a .csv, text .log or .bin file"""
+  extension = os.path.splitext(path)[1].lower()
+  if extension == '.csv':
+    return loadCSV(path)
+  if extension == '.log':
+    return loadDataflashText(path)
+  if extension == '.bin':
+    return loadDataflashBinary(path)
+  raise ValueError(f"Unknown motion log type '{extension}', expected .csv, .log or .bin")
+
+
+class CameraModel:
+  """Pinhole intrinsics, mounting and clock offset of the camera.
+
+  time_offset is the log time (s) at which the first video frame was taken.
+  mount_rpy_deg rotates the camera against the body axes, e.g. (0, -30, 0)
+  for a camera tilted 30 degrees down.
+  """
+
+  def __init__(self, width, height, fx=None, fy=None, cx=None, cy=None, hfov_deg=90.0,
+               mount_rpy_deg=(0.0, 0.0, 0.0), time_offset=0.0):
+    self.size = (width, height)
+    if fx is None:
+      fx = width / 2 / np.tan(np.radians(hfov_deg) / 2)
+    fy = fx if fy is None else fy
+    cx = width / 2 if cx is None else cx
+    cy = height / 2 if cy is None else cy
+    self.K = np.array([[fx, 0.0, cx], [0.0, fy, cy], [0.0, 0.0, 1.0]])
+    self.mount_rpy_deg = tuple(mount_rpy_deg)
+    mount = eulerMatrices(np.radians(mount_rpy_deg))[0]
+    # Camera axes from body axes
+    self.camera_from_body = FORWARD_CAMERA @ mount.T
+    self.time_offset = time_offset
+
+  @classmethod
+  def load(cls, path, width, height):
+    """Camera from a JSON file with any of the constructor's keyword arguments"""
+    with open(path) as f:
+      config = json.load(f)
+    unknown = set(config) - {'fx', 'fy', 'cx', 'cy', 'hfov_deg', 'mount_rpy_deg', 'time_offset',
+                             'width', 'height'}
+    if unknown:
+      raise ValueError(f"Unknown camera settings in '{path}': {sorted(unknown)}")
+    camera = cls(config.get('width', width), config.get('height', height),
+                 **{k: v for k, v in config.items() if k not in ('width', 'height')})
+    return camera.resized(width, height)
+
+  def resized(self, width, height):
+    """The same camera for frames resized to width x height"""
+    sx, sy = width / self.size[0], height / self.size[1]
+    if sx == 1 and sy == 1:
+      return self
+    return CameraModel(width, height, self.K[0, 0] * sx, self.K[1, 1] * sy, self.K[0, 2] * sx,
+                       self.K[1, 2] * sy, mount_rpy_deg=self.mount_rpy_deg, time_offset=self.time_offset)
+
+  def save(self, path):
+    config = {'width': self.size[0], 'height': self.size[1], 'fx': self.K[0, 0], 'fy': self.K[1, 1],
+              'cx': self.K[0, 2], 'cy': self.K[1, 2], 'mount_rpy_deg': list(self.mount_rpy_deg),
+              'time_offset': self.time_offset}
+    with open(path, 'w') as f:
+      json.dump(config, f, indent=2)
+
+  def homographies(self, body_rotvecs):
+    """Image homographies (N, 3, 3) of the body rotations from one frame to the next"""
+    c = self.camera_from_body
+    camera_rotations = c @ rotationMatrices(body_rotvecs) @ c.T
+    return self.K @ np.transpose(camera_rotations, (0, 2, 1)) @ np.linalg.inv(self.K)
+
+
+def similarityMotion(homographies, size, grid=5):
+  """(dx, dy, da) rows of the least-squares similarity closest to each homography.
+
+  Fitted on a grid of points over the frame, in the form estimateMotion()
+  returns (rotation about the image origin, translation in pixels).
+  """
+  w, h = size
+  xs, ys = np.meshgrid(np.linspace(0, w - 1, grid), np.linspace(0, h - 1, grid))
+  points = np.stack([xs.ravel(), ys.ravel(), np.ones(grid * grid)])
+  mapped = homographies @ points
+  mapped = mapped[:, :2] / mapped[:, 2:3]
+
+  src = points[:2]
+  src_mean = src.mean(axis=1, keepdims=True)
+  dst_mean = mapped.mean(axis=2, keepdims=True)
+  sx, sy = src - src_mean
+  dx_, dy_ = (mapped - dst_mean).transpose(1, 0, 2)
+  norm = np.sum(sx ** 2 + sy ** 2)
+  # Closed-form least squares for x' = a x - b y + tx, y' = b x + a y + ty
+  a = np.sum(sx * dx_ + sy * dy_, axis=1) / norm
+  b = np.sum(sx * dy_ - sy * dx_, axis=1) / norm
+  tx = dst_mean[:, 0, 0] - (a * src_mean[0, 0] - b * src_mean[1, 0])
+  ty = dst_mean[:, 1, 0] - (b * src_mean[0, 0] + a * src_mean[1, 0])
+  return np.stack([tx, ty, np.arctan2(b, a)], axis=1)
+
+
+def defaultLogPath(video_path):
+  return os.path.splitext(video_path)[0] + '.gyro.csv'
+
+
+def defaultCameraPath(video_path):
+  return os.path.splitext(video_path)[0] + '.camera.json'
+
+
+def videoTransforms(video_path, log_path=None, camera_path=None, timestamps=None, size=None):
+  """Frame-to-frame (dx, dy, da) of a video from its motion log, shape (n_frames-1, 3).
+
+  log_path and camera_path default to <video>.gyro.csv and <video>.camera.json
+  (a 90 degree camera without offsets if there is no camera file).
+  timestamps are the frame times in ms (e.g. from a SeekIndex, right for
+  variable frame rate), otherwise frame i is taken at i / FPS. With size the
+  motion is computed for frames resized to that (width, height).
+  """
+  cap = cv2.VideoCapture(video_path)
+  if not cap.isOpened():
+    raise IOError(f"Could not open video '{video_path}'")
+  width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+  height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+  fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+  n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+  cap.release()
+
+  log = loadMotionLog(log_path or defaultLogPath(video_path))
+  camera_path = camera_path or defaultCameraPath(video_path)
+  if os.path.isfile(camera_path):
+    camera = CameraModel.load(camera_path, width, height)
+  else:
+    camera = CameraModel(width, height)
+  if size is not None:
+    camera = camera.resized(*size)
+
+  if timestamps is not None:
+    times = (np.asarray(timestamps, np.float64) - timestamps[0]) / 1000
+  else:
+    times = np.arange(n_frames) / fps
+  rotations = log.rotations(times + camera.time_offset)
+  return similarityMotion(camera.homographies(rotations), camera.size)
+
+
+def syntheticRates(duration, rate_hz, seed=0):
+  """Body rates of a slow sweep with high-frequency shake, sampled at rate_hz"""
+  rng = np.random.default_rng(seed)
+  t = np.arange(0, duration, 1 / rate_hz)
+  rates = np.zeros((len(t), 3))
+  # Slow yaw and pitch sweeps (rad/s)
+  rates[:, 2] = 0.15 * np.cos(2 * np.pi * t / 8.0)
+  rates[:, 1] = 0.05 * np.cos(2 * np.pi * t / 13.0)
+  # Shake: white noise low-passed to ~15 Hz, on all three axes
+  kernel = np.exp(-0.5 * (np.arange(-10, 11) / (rate_hz / (2 * np.pi * 15))) ** 2)
+  kernel /= kernel.sum()
+  for k, amplitude in enumerate((0.6, 0.5, 0.5)):
+    noise = rng.normal(0, amplitude, len(t) + len(kernel) - 1)
+    rates[:, k] += np.convolve(noise, kernel, mode='valid')[:len(t)]
+  return t, rates
+
+
+def makeGyroVideo(directory, width, height, n_frames, fps=30.0, rate_hz=200.0, hfov_deg=70.0,
+                  time_offset=0.25, gyro_noise=0.005, sky=0.4, seed=0):
+  """Render a video of a rotating camera and write its gyro log.
+
+  The scene is infinitely far away, so every frame is an exact homography of
+  the reference view. The top `sky` fraction of the reference view (and
+  everything above it) has no texture, where optical flow finds nothing to
+  track. Writes <name>.avi,
+  <name>.gyro.csv (log clock shifted by time_offset, with gyro noise),
+  <name>.camera.json and <name>.truth.npz with the true frame-to-frame motion.
+  Returns the video path.
+  """
+  name = f"gyro_{width}x{height}_{n_frames}_{seed}"
+  video_path = os.path.join(directory, name + '.avi')
+  os.makedirs(directory, exist_ok=True)
+  rng = np.random.default_rng(seed + 1)
+
+  camera = CameraModel(width, height, hfov_deg=hfov_deg, time_offset=time_offset)
+  duration = time_offset + n_frames / fps + 1.0
+  t, rates = syntheticRates(duration, rate_hz, seed)
+
+  # Exact orientations at the frame times: fine integration of the true rates
+  frame_times = time_offset + np.arange(n_frames) / fps
+  substeps = 20
+  fine_t = np.arange(0, duration, 1 / (rate_hz * substeps))
+  fine_rates = np.stack([np.interp(fine_t, t, rates[:, k]) for k in range(3)], axis=1)
+  steps = rotationMatrices(fine_rates * (1 / (rate_hz * substeps)))
+  attitude = np.eye(3)
+  orientations = []
+  next_frame = 0
+  for k, step in enumerate(steps):
+    while next_frame < n_frames and fine_t[k] >= frame_times[next_frame]:
+      orientations.append(attitude.copy())
+      next_frame += 1
+    attitude = attitude @ step
+  orientations = np.array(orientations[:n_frames])
+
+  # Scene: texture in the reference camera's image plane, large enough for the sweep
+  margin = int(0.6 * max(width, height))
+  tw, th = width + 2 * margin, height + 2 * margin
+  noise = (rng.random((th // 4, tw // 4)) * 255).astype(np.uint8)
+  texture = cv2.cvtColor(cv2.resize(noise, (tw, th), interpolation=cv2.INTER_CUBIC), cv2.COLOR_GRAY2BGR)
+  for _ in range(tw * th // 3000):
+    x, y, size = int(rng.integers(0, tw)), int(rng.integers(0, th)), int(rng.integers(4, 30))
+    cv2.rectangle(texture, (x, y), (x + size, y + size), tuple(int(c) for c in rng.integers(0, 256, 3)), -1)
+  texture[:margin + int(height * sky)] = (235, 200, 150)
+
+  c = camera.camera_from_body
+  k_inv = np.linalg.inv(camera.K)
+  offset = np.array([[1.0, 0.0, -margin], [0.0, 1.0, -margin], [0.0, 0.0, 1.0]])
+  out = cv2.VideoWriter(video_path, cv2.VideoWriter_fourcc(*'MJPG'), fps, (width, height))
+  if not out.isOpened():
+    raise IOError(f"Could not open video writer for '{video_path}'")
+  frame = np.empty((height, width, 3), np.uint8)
+  homographies = []
+  for r in orientations:
+    # Reference view pixel -> frame pixel
+    h_frame = camera.K @ c @ r.T @ c.T @ k_inv
+    homographies.append(h_frame)
+    cv2.warpPerspective(texture, h_frame @ offset, (width, height), dst=frame,
+                        borderMode=cv2.BORDER_REFLECT_101)
+    out.write(frame)
+  out.release()
+
+  homographies = np.array(homographies)
+  relative = homographies[1:] @ np.linalg.inv(homographies[:-1])
+  np.savez(os.path.splitext(video_path)[0] + '.truth.npz', motion=similarityMotion(relative, (width, height)))
+
+  noisy = rates + rng.normal(0, gyro_noise, rates.shape)
+  with open(defaultLogPath(video_path), 'w', newline='') as f:
+    writer = csv.writer(f)
+    writer.writerow(['time', 'gx', 'gy', 'gz'])
+    for time_s, (gx, gy, gz) in zip(t, noisy):
+      writer.writerow([f"{time_s:.6f}", f"{gx:.6f}", f"{gy:.6f}", f"{gz:.6f}"])
+  camera.save(defaultCameraPath(video_path))
+  return video_path
+
+
+def checkVideo(video_path, log_path=None, camera_path=None):
+  """Compare the gyro motion (and optical flow) of a video with its .truth.npz"""
+  import video_stabilization as vs
+
+  gyro = videoTransforms(video_path, log_path, camera_path)
+  cap = cv2.VideoCapture(video_path)
+  flow = []
+  failed = 0
+  _, prev = cap.read()
+  prev_gray = vs.analysisGray(prev)
+  while True:
+    success, curr = cap.read()
+    if not success:
+      break
+    curr_gray = vs.analysisGray(curr)
+    transform, n_tracked = vs.estimateMotion(prev_gray, curr_gray)
+    failed += transform is None or n_tracked < vs.GYRO_FLOW_MIN_POINTS
+    flow.append(transform if transform is not None else [0, 0, 0])
+    prev_gray = curr_gray
+  cap.release()
+  flow = np.array(flow)
+
+  truth_path = os.path.splitext(video_path)[0] + '.truth.npz'
+  print(f"{len(gyro)} frame pairs, optical flow found too few points on {failed}")
+  if not os.path.isfile(truth_path):
+    diff = np.hypot(*(gyro[:len(flow), :2] - flow[:, :2]).T)
+    print(f"Gyro vs optical flow: mean {np.mean(diff):.3f} px, median {np.median(diff):.3f} px")
+    return
+  truth = np.load(truth_path)['motion']
+  print(f"\n{'source':<14}{'err px':>9}{'p95 px':>9}{'err deg':>9}")
+  for name, motion in (('gyro', gyro), ('optical flow', flow)):
+    n = min(len(motion), len(truth))
+    err = np.hypot(*(motion[:n, :2] - truth[:n, :2]).T)
+    err_deg = np.degrees(np.abs(motion[:n, 2] - truth[:n, 2]))
+    print(f"{name:<14}{np.mean(err):>9.3f}{np.percentile(err, 95):>9.3f}{np.mean(err_deg):>9.4f}")
+
+
+def parseSize(text):
+  try:
+    w, h = text.lower().split('x')
+    return int(w), int(h)
+  except ValueError:
+    raise argparse.ArgumentTypeError(f"expected WIDTHxHEIGHT, got '{text}'")
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Gyro motion source: synthetic test data and checks")
+  commands = parser.add_subparsers(dest='command', required=True)
+  synth = commands.add_parser('synth', help="render a rotating-camera video with a matching gyro CSV")
+  synth.add_argument('--size', type=parseSize, default=(640, 480), metavar='WxH')
+  synth.add_argument('--frames', type=int, default=300)
+  synth.add_argument('--fps', type=float, default=30.0)
+  synth.add_argument('--rate', type=float, default=200.0, help="gyro sample rate in Hz")
+  synth.add_argument('--time-offset', type=float, default=0.25, help="log time of the first frame (s)")
+  synth.add_argument('--sky', type=float, default=0.4, help="textureless fraction at the top of the view")
+  synth.add_argument('--seed', type=int, default=0)
+  synth.add_argument('-o', '--output-dir', default='gyro_test')
+  check = commands.add_parser('check', help="compare gyro motion with optical flow and the ground truth")
+  check.add_argument('video')
+  check.add_argument('--log', default=None, help="motion log (default: <video>.gyro.csv)")
+  check.add_argument('--camera', default=None, help="camera JSON (default: <video>.camera.json)")
+  args = parser.parse_args(argv)
+
+  if args.command == 'synth':
+    path = makeGyroVideo(args.output_dir, *args.size, args.frames, args.fps, args.rate,
+                         time_offset=args.time_offset, sky=args.sky, seed=args.seed)
+    print(f"Written '{path}' with '{defaultLogPath(path)}' and '{defaultCameraPath(path)}'")
+  else:
+    checkVideo(args.video, args.log, args.camera)
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,88 @@
+# Sidecar cache for the motion analysis pass of video_stabilization.py
+#
+# The per-frame (dx, dy, da) transforms and tracked point counts only depend
+# on the input video and the motion estimation settings. They are stored in a
+# small .npz file whose name carries a hash of both, so changing the smoothing
+# or border settings re-renders straight from the cache.
+import hashlib
+import json
+import os
+
+import numpy as np
+
+
+# Bump when the meaning of the stored arrays changes
+CACHE_VERSION = 1
+
+# Bytes hashed from the input: size plus evenly spaced samples of the content.
+# Hashing whole flight recordings would cost as much as decoding them.
+SAMPLE_COUNT = 16
+SAMPLE_SIZE = 1 << 20
+
+
+def fileFingerprint(path):
+  """Hash of the file size and sampled content"""
+  size = os.path.getsize(path)
+  digest = hashlib.sha1(str(size).encode())
+  with open(path, 'rb') as f:
+    if size <= SAMPLE_COUNT * SAMPLE_SIZE:
+      digest.update(f.read())
+    else:
+      step = (size - SAMPLE_SIZE) // (SAMPLE_COUNT - 1)
+      for k in range(SAMPLE_COUNT):
+        f.seek(k * step)
+        digest.update(f.read(SAMPLE_SIZE))
+  return digest.hexdigest()
+
+
+def cacheKey(path, params):
+  """Key for an input file and the motion settings (a JSON-serialisable dict)"""
+  payload = json.dumps({'version': CACHE_VERSION, 'file': fileFingerprint(path), 'params': params},
+                       sort_keys=True)
+  return hashlib.sha1(payload.encode()).hexdigest()
+
+
+def cachePath(path, key, cache_dir=None):
+  directory = cache_dir if cache_dir is not None else os.path.dirname(os.path.abspath(path))
+  name = os.path.splitext(os.path.basename(path))[0]
+  return os.path.join(directory, f"{name}.motion_{key[:16]}.npz")
+
+
+def loadMotion(path, params, cache_dir=None):
+  """Return (transforms, tracked) from the sidecar, or None if there is none.
+
+  tracked is None when the motion did not come from image tracking (gyro).
+  """
+  if not os.path.isfile(path):
+    return None
+  key = cacheKey(path, params)
+  sidecar = cachePath(path, key, cache_dir)
+  if not os.path.isfile(sidecar):
+    return None
+  try:
+    with np.load(sidecar) as data:
+      if str(data['key']) != key:
+        return None
+      return data['transforms'], data['tracked'] if 'tracked' in data.files else None
+  except (OSError, KeyError, ValueError) as e:
+    print(f"Warning: ignoring unreadable motion cache '{sidecar}': {e}")
+    return None
+
+
+def saveMotion(path, params, transforms, tracked, cache_dir=None):
+  """Write the sidecar and return its path (None if the input is not a file)"""
+  if not os.path.isfile(path):
+    return None
+  key = cacheKey(path, params)
+  sidecar = cachePath(path, key, cache_dir)
+  if cache_dir is not None:
+    os.makedirs(cache_dir, exist_ok=True)
+  # Write to a temporary file first so an interrupted run leaves no broken cache
+  tmp = sidecar + '.tmp.npz'
+  arrays = {'transforms': np.asarray(transforms, np.float32)}
+  if tracked is not None:
+    arrays['tracked'] = np.asarray(tracked, np.int32)
+  np.savez_compressed(tmp, key=np.array(key), params=np.array(json.dumps(params, sort_keys=True)),
+                      **arrays)
+  os.replace(tmp, sidecar)
+  return sidecar
@@ -0,0 +1,202 @@
+# Network video source for the real-time stabilizer (deneme.py)
+#
+# The aircraft's camera arrives over RTSP / UDP / HTTP (see VlcStream/readme.md).
+# Watching it through a VLC re-stream adds that player's network caching on
+# top of the downlink. NetworkCapture opens the URL directly with OpenCV's
+# FFmpeg backend and FFmpeg's input buffering turned off, and looks like a
+# cv2.VideoCapture, so ThreadedCapture can keep only the newest frame:
+#
+#   cap = ThreadedCapture(NetworkCapture('rtsp://192.168.1.10:8554/live'), queue_size=1)
+#
+# When the stream is lost (the read times out or fails) read() does not
+# return an end of stream: it reconnects with exponential backoff and carries
+# on with the first frame of the new connection. Reconnects, failed connection
+# attempts, decode stalls (reads slower than stall_ms) and the time since the
+# last frame are kept in a StageMetrics (stage_metrics.py), so they appear in
+# the stabilizer's JSON / Prometheus metrics when that one is passed in.
+import os
+import threading
+import time
+from urllib.parse import urlsplit
+
+import cv2
+
+from stage_metrics import StageMetrics
+
+
+NETWORK_SCHEMES = ('rtsp', 'rtsps', 'rtp', 'udp', 'tcp', 'srt', 'rtmp', 'http', 'https')
+
+# FFmpeg demuxer options: no input buffering, frames handed over as soon as
+# they are decoded, short stream probing so connecting (and reconnecting)
+# does not wait for seconds of video
+LOW_LATENCY_OPTIONS = (
+  ('fflags', 'nobuffer'),
+  ('flags', 'low_delay'),
+  ('max_delay', '0'),
+  ('reorder_queue_size', '0'),
+  ('probesize', '500000'),
+  ('analyzeduration', '500000'),
+)
+
+# The FFmpeg backend reads its options from the environment while opening
+_options_lock = threading.Lock()
+
+EVENTS = ('stream_frames', 'stream_losses', 'reconnects', 'failed_connects', 'decode_stalls')
+
+
+def isNetworkURL(source):
+  """True for rtsp://, udp://, http:// ... URLs"""
+  return isinstance(source, str) and urlsplit(source).scheme.lower() in NETWORK_SCHEMES
+
+
+def captureOptions(url, transport=None):
+  """OPENCV_FFMPEG_CAPTURE_OPTIONS value for url ('key;value|key;value')"""
+  options = list(LOW_LATENCY_OPTIONS)
+  scheme = urlsplit(url).scheme.lower()
+  if scheme in ('rtsp', 'rtsps') and transport is not None:
+    # udp: lowest latency; tcp: no losses and passes NAT / firewalls
+    options.append(('rtsp_transport', transport))
+  elif scheme == 'udp':
+    # A late reader must not end the stream
+    options.append(('overrun_nonfatal', '1'))
+  return '|'.join(f"{key};{value}" for key, value in options)
+
+
+def openNetworkCapture(url, transport=None, open_timeout_ms=5000, read_timeout_ms=2000):
+  """cv2.VideoCapture of url with low-latency FFmpeg options (check isOpened())"""
+  params = [cv2.CAP_PROP_OPEN_TIMEOUT_MSEC, open_timeout_ms,
+            cv2.CAP_PROP_READ_TIMEOUT_MSEC, read_timeout_ms]
+  with _options_lock:
+    previous = os.environ.get('OPENCV_FFMPEG_CAPTURE_OPTIONS')
+    os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = captureOptions(url, transport)
+    try:
+      cap = cv2.VideoCapture(url, cv2.CAP_FFMPEG, params)
+    finally:
+      if previous is None:
+        del os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS']
+      else:
+        os.environ['OPENCV_FFMPEG_CAPTURE_OPTIONS'] = previous
+  # Ignored by most backends, but keeps any that honour it from queueing
+  cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)
+  return cap
+
+
+class NetworkCapture:
+  """Reconnecting cv2.VideoCapture look-alike for a network stream.
+
+  read() returns (success, frame) and only fails once the capture is closed
+  or max_retries connection attempts in a row have failed (None: never give
+  up). Retries wait backoff[0] seconds, doubling up to backoff[1].
+  """
+
+  def __init__(self, url, transport=None, open_timeout_ms=5000, read_timeout_ms=2000,
+               stall_ms=500.0, backoff=(0.5, 8.0), max_retries=None, metrics=None):
+    self.url = url
+    self.transport = transport
+    self.open_timeout_ms = open_timeout_ms
+    self.read_timeout_ms = read_timeout_ms
+    self.stall_ms = stall_ms
+    self.backoff = backoff
+    self.max_retries = max_retries
+    self.metrics = metrics if metrics is not None else StageMetrics(stages=('stream_read',))
+    for event in EVENTS:
+      self.metrics.count(event, 0)
+    self.metrics.gauge('seconds_since_frame', self.secondsSinceFrame)
+    self.metrics.gauge('stream_connected', lambda: float(self.connected))
+    self.cap = None
+    self.connected = False
+    self.connections = 0
+    self.retries = 0
+    self.last_frame_at = None
+    self.started = time.monotonic()
+    self._closed = threading.Event()
+    self._fresh = False
+    # First attempt right away; if the downlink is not up yet read() keeps trying
+    self._connect()
+
+  def _connect(self):
+    if self.connections or self.retries:
+      delay = min(self.backoff[1], self.backoff[0] * 2 ** min(self.retries, 16))
+      if self._closed.wait(delay):
+        return False
+    cap = openNetworkCapture(self.url, self.transport, self.open_timeout_ms, self.read_timeout_ms)
+    if self._closed.is_set():
+      # Released while connecting
+      cap.release()
+      return False
+    if not cap.isOpened():
+      cap.release()
+      self.retries += 1
+      self.metrics.count('failed_connects')
+      return False
+    if self.connections:
+      self.metrics.count('reconnects')
+    self.cap = cap
+    self._fresh = True
+    self.connected = True
+    self.connections += 1
+    self.retries = 0
+    return True
+
+  def _disconnect(self):
+    if self.cap is not None:
+      self.cap.release()
+    self.cap = None
+    self.connected = False
+
+  def read(self):
+    while not self._closed.is_set():
+      if self.max_retries is not None and self.retries >= self.max_retries:
+        break
+      if self.cap is None and not self._connect():
+        continue
+      start = time.perf_counter()
+      success, frame = self.cap.read()
+      elapsed = time.perf_counter() - start
+      if success:
+        self.metrics.observe('stream_read', elapsed)
+        self.metrics.count('stream_frames')
+        # The first read of a connection waits for a key frame, not a stall
+        if elapsed * 1000 > self.stall_ms and not self._fresh:
+          self.metrics.count('decode_stalls')
+        self._fresh = False
+        self.last_frame_at = time.monotonic()
+        return True, frame
+      # Read timeout or end of stream: the sender restarts, so reconnect
+      self.metrics.count('stream_losses')
+      self._disconnect()
+    return False, None
+
+  def secondsSinceFrame(self):
+    """Seconds since the last frame (since the start before the first one)"""
+    return time.monotonic() - (self.last_frame_at if self.last_frame_at is not None else self.started)
+
+  def health(self):
+    """Stream health: connection state, reconnects, decode stalls, time since the last frame"""
+    events = self.metrics.summary()['events']
+    health = {'connected': self.connected, 'seconds_since_frame': round(self.secondsSinceFrame(), 3)}
+    health.update({event: events[event] for event in EVENTS})
+    return health
+
+  def isOpened(self):
+    return not self._closed.is_set()
+
+  def get(self, prop):
+    return self.cap.get(prop) if self.cap is not None else 0.0
+
+  def interrupt(self):
+    """Make a read() that is waiting to reconnect return (False, None)"""
+    self._closed.set()
+
+  def release(self):
+    self._closed.set()
+    self._disconnect()
+
+  def printSummary(self):
+    health = self.health()
+    print("\n=== Network stream ===")
+    print(f"{self.url}: {'connected' if health['connected'] else 'disconnected'}, "
+          f"last frame {health['seconds_since_frame']:.1f} s ago")
+    print(f"Frames: {health['stream_frames']}, stream losses: {health['stream_losses']}, "
+          f"reconnects: {health['reconnects']}, failed connects: {health['failed_connects']}, "
+          f"decode stalls (> {self.stall_ms:.0f} ms): {health['decode_stalls']}")
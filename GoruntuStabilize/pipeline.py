@@ -0,0 +1,216 @@
+# Threaded stage pipeline used by video_stabilization.py
+#
+# The source (decode) runs on its own thread, every stage runs on one or more
+# worker threads and the sink (encode) runs on the calling thread. Stages are
+# joined by bounded queues so a slow stage applies back pressure instead of
+# letting frames pile up in memory. OpenCV releases the GIL inside its calls,
+# so decode, compute and encode really overlap.
+import heapq
+import queue
+import threading
+import time
+
+
+class _Done:
+  """End-of-stream marker passed down the queues"""
+
+
+_DONE = _Done()
+
+
+class StageStats:
+  """Time a stage spent working, waiting for input and waiting for output"""
+
+  def __init__(self, name, workers):
+    self.name = name
+    self.workers = workers
+    self.items = 0
+    self.busy = 0.0
+    self.starved = 0.0
+    self.blocked = 0.0
+    self.lock = threading.Lock()
+
+  def add(self, busy=0.0, starved=0.0, blocked=0.0, items=0):
+    with self.lock:
+      self.busy += busy
+      self.starved += starved
+      self.blocked += blocked
+      self.items += items
+
+
+class Stage:
+  """A pipeline step: fn(item) -> item, or None to drop the item.
+
+  Items travel as (index, value) pairs. A stage with ordered=True sees its
+  inputs in index order, which is needed for stateful steps and only
+  possible with a single worker.
+  """
+
+  def __init__(self, name, fn, workers=1, ordered=False):
+    if ordered and workers != 1:
+      raise ValueError(f"Ordered stage '{name}' must have exactly one worker")
+    self.name = name
+    self.fn = fn
+    self.workers = workers
+    self.ordered = ordered
+
+
+class _Reorder:
+  """Releases (index, value) pairs in index order"""
+
+  def __init__(self):
+    self.heap = []
+    self.next_index = 0
+
+  def push(self, index, value):
+    heapq.heappush(self.heap, (index, value))
+    ready = []
+    while self.heap and self.heap[0][0] == self.next_index:
+      ready.append(heapq.heappop(self.heap))
+      self.next_index += 1
+    return ready
+
+
+class Pipeline:
+  """Runs source -> stages -> sink with bounded queues in between"""
+
+  def __init__(self, source, stages, sink, queue_size=8, sink_name='encode', source_name='decode'):
+    self.source = source
+    self.stages = stages
+    self.sink = sink
+    self.queue_size = queue_size
+    self.stats = ([StageStats(source_name, 1)]
+                  + [StageStats(s.name, s.workers) for s in stages]
+                  + [StageStats(sink_name, 1)])
+    self.error = None
+    self.failed = threading.Event()
+    self.wall_time = 0.0
+
+  def _get(self, q, stats):
+    start = time.perf_counter()
+    while True:
+      try:
+        item = q.get(timeout=0.1)
+        break
+      except queue.Empty:
+        if self.failed.is_set():
+          item = _DONE
+          break
+    stats.add(starved=time.perf_counter() - start)
+    return item
+
+  def _put(self, q, item, stats):
+    start = time.perf_counter()
+    while not self.failed.is_set():
+      try:
+        q.put(item, timeout=0.1)
+        break
+      except queue.Full:
+        continue
+    stats.add(blocked=time.perf_counter() - start)
+
+  def _fail(self, e):
+    if self.error is None:
+      self.error = e
+    self.failed.set()
+
+  def _runSource(self, out_q, n_consumers):
+    stats = self.stats[0]
+    try:
+      iterator = iter(self.source)
+      index = 0
+      while not self.failed.is_set():
+        start = time.perf_counter()
+        try:
+          value = next(iterator)
+        except StopIteration:
+          break
+        stats.add(busy=time.perf_counter() - start, items=1)
+        self._put(out_q, (index, value), stats)
+        index += 1
+    except Exception as e:
+      self._fail(e)
+    for _ in range(n_consumers):
+      self._put(out_q, _DONE, stats)
+
+  def _runWorker(self, stage, stats, in_q, out_q, n_consumers, finished):
+    reorder = _Reorder() if stage.ordered else None
+    try:
+      while True:
+        item = self._get(in_q, stats)
+        if item is _DONE:
+          break
+        ready = reorder.push(*item) if reorder else [item]
+        for index, value in ready:
+          if value is _DONE:
+            self._put(out_q, (index, _DONE), stats)
+            continue
+          start = time.perf_counter()
+          result = stage.fn(value)
+          stats.add(busy=time.perf_counter() - start, items=1)
+          # Dropped items still travel as markers so ordered consumers don't stall
+          self._put(out_q, (index, _DONE if result is None else result), stats)
+    except Exception as e:
+      self._fail(e)
+    # The last worker of a stage closes the stream for the next one
+    with finished['lock']:
+      finished['count'] += 1
+      last = finished['count'] == stage.workers
+    if last:
+      for _ in range(n_consumers):
+        self._put(out_q, _DONE, stats)
+
+  def run(self):
+    """Run until the source is exhausted, returns the per-stage statistics"""
+    start = time.perf_counter()
+    queues = [queue.Queue(maxsize=self.queue_size) for _ in range(len(self.stages) + 1)]
+    consumers = [s.workers for s in self.stages] + [1]
+
+    threads = [threading.Thread(target=self._runSource, args=(queues[0], consumers[0]), daemon=True)]
+    for k, stage in enumerate(self.stages):
+      finished = {'lock': threading.Lock(), 'count': 0}
+      for _ in range(stage.workers):
+        threads.append(threading.Thread(
+          target=self._runWorker,
+          args=(stage, self.stats[k + 1], queues[k], queues[k + 1], consumers[k + 1], finished),
+          daemon=True))
+    for t in threads:
+      t.start()
+
+    # The sink consumes in index order on the calling thread (cv2.imshow must
+    # stay on the main thread on some platforms)
+    stats = self.stats[-1]
+    reorder = _Reorder()
+    try:
+      while True:
+        item = self._get(queues[-1], stats)
+        if item is _DONE:
+          break
+        for index, value in reorder.push(*item):
+          if value is _DONE:
+            continue
+          t0 = time.perf_counter()
+          self.sink(index, value)
+          stats.add(busy=time.perf_counter() - t0, items=1)
+    except Exception as e:
+      self._fail(e)
+
+    for t in threads:
+      t.join()
+    self.wall_time = time.perf_counter() - start
+    if self.error is not None:
+      raise self.error
+    return self.stats
+
+  def printSummary(self, title):
+    """Print how long each stage worked, starved (no input) and blocked (output full)"""
+    print(f"\n=== Pipeline: {title} ({self.wall_time:.2f} s) ===")
+    print(f"{'stage':<10}{'workers':>8}{'items':>8}{'busy s':>9}{'starved s':>11}{'blocked s':>11}{'util':>7}")
+    bottleneck = None
+    for s in self.stats:
+      util = s.busy / (s.workers * self.wall_time) if self.wall_time > 0 else 0.0
+      if bottleneck is None or util > bottleneck[1]:
+        bottleneck = (s.name, util)
+      print(f"{s.name:<10}{s.workers:>8}{s.items:>8}{s.busy:>9.2f}{s.starved:>11.2f}{s.blocked:>11.2f}{util:>7.0%}")
+    if bottleneck:
+      print(f"Bottleneck: {bottleneck[0]}")
@@ -0,0 +1,289 @@
+# Keyframe seek index for input videos
+#
+# cap.set(cv2.CAP_PROP_POS_FRAMES, i) converts the frame number to a timestamp
+# with the nominal FPS, so on many containers it decodes from the start or
+# lands a few frames off. The index is built once by demuxing the video without
+# decoding it (OpenCV's raw stream mode) and stores the presentation timestamp
+# of every frame and which frames are keyframes in a sidecar next to the video.
+#
+# IndexedCapture.seek(i) then jumps to the nearest keyframe at or before i,
+# identifies the frame it actually landed on by its timestamp and decodes
+# forward to i, so random access is frame accurate and costs at most one GOP.
+#
+#   python seek_index.py flight.mp4 --check 20
+import argparse
+import os
+import time
+
+import numpy as np
+import cv2
+
+from motion_cache import fileFingerprint
+
+
+# Bump when the stored arrays change meaning
+INDEX_VERSION = 1
+
+# Timestamps closer than this (ms) belong to the same frame
+TIMESTAMP_TOLERANCE = 0.5
+
+
+class SeekIndex:
+  """Presentation timestamps (ms) of every frame and the keyframe numbers.
+
+  keyframes is None when the container gave no keyframe flags; seeks then
+  try the target frame itself and fall back to the start of the video.
+  """
+
+  def __init__(self, timestamps, keyframes, fps, fingerprint=None):
+    self.timestamps = np.asarray(timestamps, np.float64)
+    self.keyframes = None if keyframes is None else np.asarray(keyframes, np.int64)
+    self.fps = fps
+    self.fingerprint = fingerprint
+
+  def __len__(self):
+    return len(self.timestamps)
+
+  def frameAt(self, msec):
+    """Frame number with this timestamp, or None"""
+    i = int(np.searchsorted(self.timestamps, msec - TIMESTAMP_TOLERANCE))
+    if i < len(self.timestamps) and abs(self.timestamps[i] - msec) <= TIMESTAMP_TOLERANCE:
+      return i
+    return None
+
+  def seekPoints(self, frame_idx):
+    """Frames to try seeking to for frame_idx, nearest first"""
+    if self.keyframes is None:
+      return [frame_idx, 0] if frame_idx > 0 else [0]
+    k = int(np.searchsorted(self.keyframes, frame_idx, side='right'))
+    return [int(f) for f in self.keyframes[:k][::-1]] or [0]
+
+  def printSummary(self):
+    duration = (self.timestamps[-1] - self.timestamps[0]) / 1000 if len(self) else 0.0
+    print(f"Frames: {len(self)}, duration {duration:.2f} s, nominal FPS {self.fps:.2f}")
+    if self.keyframes is None:
+      print("Keyframes: unknown (no keyframe flags from this backend)")
+    elif len(self.keyframes):
+      gaps = np.diff(np.append(self.keyframes, len(self)))
+      print(f"Keyframes: {len(self.keyframes)}, GOP mean {np.mean(gaps):.1f}, max {np.max(gaps)} frames")
+
+
+def scanVideo(path):
+  """Build a SeekIndex by demuxing the whole video once"""
+  cap = cv2.VideoCapture(path)
+  if not cap.isOpened():
+    raise IOError(f"Could not open video '{path}'")
+  fps = cap.get(cv2.CAP_PROP_FPS)
+
+  # Raw mode hands out packets without decoding them, with their keyframe flag
+  raw = cap.set(cv2.CAP_PROP_FORMAT, -1)
+  timestamps = []
+  flags = []
+  while cap.grab():
+    timestamps.append(cap.get(cv2.CAP_PROP_POS_MSEC))
+    flags.append(bool(cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME)) if raw else False)
+  cap.release()
+
+  # Packets come in decode order; with B-frames that is not the display order
+  timestamps = np.array(timestamps, np.float64)
+  order = np.argsort(timestamps, kind='stable')
+  keyframes = None
+  if raw:
+    frame_of_packet = np.empty(len(order), np.int64)
+    frame_of_packet[order] = np.arange(len(order))
+    keyframes = np.sort(frame_of_packet[np.array(flags, bool)])
+  return SeekIndex(timestamps[order], keyframes, fps, fileFingerprint(path))
+
+
+def indexPath(path, cache_dir=None):
+  directory = cache_dir if cache_dir is not None else os.path.dirname(os.path.abspath(path))
+  name = os.path.splitext(os.path.basename(path))[0]
+  return os.path.join(directory, f"{name}.seekindex.npz")
+
+
+def saveIndex(path, index, cache_dir=None):
+  sidecar = indexPath(path, cache_dir)
+  if cache_dir is not None:
+    os.makedirs(cache_dir, exist_ok=True)
+  # Write to a temporary file first so an interrupted run leaves no broken index
+  tmp = sidecar + '.tmp.npz'
+  np.savez_compressed(tmp, version=INDEX_VERSION, fingerprint=np.array(index.fingerprint),
+                      timestamps=index.timestamps, fps=index.fps,
+                      keyframes=index.keyframes if index.keyframes is not None else np.zeros(0, np.int64),
+                      has_keyframes=index.keyframes is not None)
+  os.replace(tmp, sidecar)
+  return sidecar
+
+
+def loadIndex(path, cache_dir=None, build=True):
+  """SeekIndex of a video file from its sidecar, scanning (and saving) it if needed.
+
+  Returns None if there is no valid sidecar and build is False.
+  """
+  sidecar = indexPath(path, cache_dir)
+  fingerprint = fileFingerprint(path)
+  if os.path.isfile(sidecar):
+    try:
+      with np.load(sidecar) as data:
+        if int(data['version']) == INDEX_VERSION and str(data['fingerprint']) == fingerprint:
+          keyframes = data['keyframes'] if bool(data['has_keyframes']) else None
+          return SeekIndex(data['timestamps'], keyframes, float(data['fps']), fingerprint)
+    except (OSError, KeyError, ValueError) as e:
+      print(f"Warning: ignoring unreadable seek index '{sidecar}': {e}")
+  if not build:
+    return None
+  start = time.time()
+  index = scanVideo(path)
+  saveIndex(path, index, cache_dir)
+  print(f"Seek index for '{path}' built in {time.time() - start:.2f} s "
+        f"({len(index)} frames, {'?' if index.keyframes is None else len(index.keyframes)} keyframes)")
+  return index
+
+
+class IndexedCapture:
+  """cv2.VideoCapture with frame accurate seek(frame_idx) through a SeekIndex"""
+
+  def __init__(self, path, index=None, cache_dir=None):
+    self.path = path
+    self.index = index if index is not None else loadIndex(path, cache_dir)
+    self.cap = cv2.VideoCapture(path)
+    if not self.cap.isOpened():
+      raise IOError(f"Could not open video '{path}'")
+    # Number of the frame the next read() returns
+    self.position = 0
+    # Target frame decoded by seek(), handed out by the next read()
+    self.pending = None
+    # Frames decoded only to get to a seek target
+    self.skipped = 0
+    self.seeks = 0
+
+  def get(self, prop):
+    return self.cap.get(prop)
+
+  def read(self):
+    if self.pending is not None:
+      frame, self.pending = self.pending, None
+      self.position += 1
+      return True, frame
+    success, frame = self.cap.read()
+    if success:
+      self.position += 1
+    return success, frame
+
+  def _skip(self):
+    if self.pending is not None:
+      self.pending = None
+    else:
+      self.cap.grab()
+    self.position += 1
+    self.skipped += 1
+
+  def _decodeFrom(self, point, frame_idx):
+    """Seek to point and grab up to frame_idx, True once frame_idx is decoded"""
+    if point == 0:
+      # The start of the stream needs no seek at all
+      self.cap.release()
+      self.cap = cv2.VideoCapture(self.path)
+    else:
+      self.cap.set(cv2.CAP_PROP_POS_FRAMES, point)
+    # The timestamp tells which frame the seek really landed on
+    while self.cap.grab():
+      landed = self.index.frameAt(self.cap.get(cv2.CAP_PROP_POS_MSEC))
+      if landed is None or landed > frame_idx:
+        return False
+      if landed == frame_idx:
+        success, self.pending = self.cap.retrieve()
+        return success
+      self.skipped += 1
+    return False
+
+  def seek(self, frame_idx):
+    """Position the capture so the next read() returns frame frame_idx"""
+    if not 0 <= frame_idx < len(self.index):
+      raise IndexError(f"Frame {frame_idx} out of range (0-{len(self.index) - 1})")
+    self.seeks += 1
+    if frame_idx == self.position:
+      return
+
+    # Reading on is cheaper than seeking when no keyframe lies in between
+    points = self.index.seekPoints(frame_idx)
+    if self.position < frame_idx and points[0] <= self.position:
+      while self.position < frame_idx:
+        self._skip()
+      return
+
+    self.pending = None
+    # An inexact seek that overshoots is retried from the keyframe before
+    for point in points:
+      if self._decodeFrom(point, frame_idx):
+        self.position = frame_idx
+        return
+    raise IOError(f"Could not seek to frame {frame_idx} of '{self.path}'")
+
+  def release(self):
+    self.cap.release()
+
+
+def checkSeeks(path, index, count, seed=0):
+  """Seek to random frames and compare them with a sequential decode"""
+  rng = np.random.default_rng(seed)
+  targets = np.sort(rng.choice(len(index), size=min(count, len(index)), replace=False))
+  wanted = set(int(t) for t in targets)
+  reference = {}
+  cap = cv2.VideoCapture(path)
+  for i in range(int(targets[-1]) + 1):
+    success, frame = cap.read()
+    if not success:
+      break
+    if i in wanted:
+      reference[i] = frame
+  cap.release()
+
+  capture = IndexedCapture(path, index)
+  indexed = {'time': 0.0, 'wrong': 0}
+  plain = {'time': 0.0, 'wrong': 0}
+  for target in rng.permutation(targets):
+    target = int(target)
+    start = time.perf_counter()
+    capture.seek(target)
+    _, frame = capture.read()
+    indexed['time'] += time.perf_counter() - start
+    indexed['wrong'] += not np.array_equal(frame, reference.get(target))
+
+    cap = cv2.VideoCapture(path)
+    start = time.perf_counter()
+    cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+    _, frame = cap.read()
+    plain['time'] += time.perf_counter() - start
+    plain['wrong'] += not np.array_equal(frame, reference.get(target))
+    cap.release()
+  capture.release()
+
+  n = len(targets)
+  print(f"\n{'method':<22}{'ms/seek':>9}{'wrong':>7}")
+  print(f"{'IndexedCapture.seek':<22}{indexed['time'] * 1000 / n:>9.2f}{indexed['wrong']:>7}")
+  print(f"{'CAP_PROP_POS_FRAMES':<22}{plain['time'] * 1000 / n:>9.2f}{plain['wrong']:>7}")
+  print(f"Frames decoded only to reach a target: {capture.skipped / n:.1f} per seek")
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Build the keyframe seek index of a video")
+  parser.add_argument('video')
+  parser.add_argument('--cache-dir', default=None, help="sidecar directory (default: next to the video)")
+  parser.add_argument('--rebuild', action='store_true', help="scan again even if a valid sidecar exists")
+  parser.add_argument('--check', type=int, default=0, metavar='N',
+                      help="verify N random seeks against a sequential decode")
+  args = parser.parse_args(argv)
+
+  if args.rebuild:
+    index = scanVideo(args.video)
+    print(f"Seek index saved to '{saveIndex(args.video, index, args.cache_dir)}'")
+  else:
+    index = loadIndex(args.video, args.cache_dir)
+  index.printSummary()
+  if args.check > 0:
+    checkSeeks(args.video, index, args.check)
+
+
+if __name__ == "__main__":
+  main()
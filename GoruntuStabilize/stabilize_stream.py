@@ -0,0 +1,72 @@
+# Library API shared by both stabilizers: frames in, stabilized frames out
+#
+# stabilizeStream() reads any iterable of BGR frames, or of (frame, timestamp)
+# pairs, exactly once and yields a StreamFrame (video_stabilization.py) per
+# input frame with the stabilized image and the frame's motion metadata.
+# Nothing is shown, written or read from disk, so one decoded stream can feed
+# detection, streaming and recording in the same process:
+#
+#   for out in stabilizeStream(captureFrames('flight.mp4'), mode='lookahead'):
+#     detections = detector(out.stabilized)
+#     writer.write(out.stabilized)
+#
+# mode='lookahead' is the kernel smoothing of video_stabilization.py
+# (SMOOTHING_METHOD, SMOOTHING_RADIUS, DOUBLE_SMOOTHING, ANALYSIS_SCALE, ...,
+# as set with applySettings) and yields every frame lookaheadDelay() frames
+# late; it is what STREAMING_MODE renders. mode='causal' is the Kalman filter
+# of deneme.ImageStabilizer, the live stabilizer: every frame comes out before
+# the next one is read.
+import numpy as np
+import cv2
+
+import video_stabilization as vs
+from deneme import ImageStabilizer
+
+
+MODES = ('lookahead', 'causal')
+
+
+def captureFrames(source):
+  """(frame, timestamp in ms) pairs of a video path, camera index or cv2.VideoCapture"""
+  cap = source if isinstance(source, cv2.VideoCapture) else cv2.VideoCapture(source)
+  if not cap.isOpened():
+    raise IOError(f"Could not open video source {source!r}")
+  try:
+    while True:
+      success, frame = cap.read()
+      if not success:
+        return
+      yield frame, cap.get(cv2.CAP_PROP_POS_MSEC)
+  finally:
+    if cap is not source:
+      cap.release()
+
+
+def lookaheadDelay():
+  """Output delay in frames of mode='lookahead' with the current settings"""
+  return vs.streamDelay()
+
+
+def _causal(frames, stabilizer):
+  def vector(motion):
+    return np.zeros(3) if motion is None else np.array([motion['x'], motion['y'], motion['angle']])
+
+  for index, (frame, timestamp) in enumerate(vs.timestampedFrames(frames)):
+    stabilized, _ = stabilizer.process_frame(frame, index)
+    yield vs.StreamFrame(index, timestamp, frame, stabilized, vector(stabilizer.last_motion),
+                         vector(stabilizer.last_correction), stabilizer.last_tracked)
+
+
+def stabilizeStream(frames, mode='lookahead', stabilizer=None):
+  """Generator of StreamFrames for an iterable of frames or (frame, timestamp) pairs.
+
+  stabilizer is the ImageStabilizer used in causal mode (default settings if
+  None), e.g. one with a gyro motion_source; its output buffer is reused.
+  """
+  if mode not in MODES:
+    raise ValueError(f"Unknown stream mode '{mode}', expected one of {MODES}")
+  if mode == 'causal':
+    return _causal(frames, stabilizer if stabilizer is not None else ImageStabilizer())
+  if stabilizer is not None:
+    raise ValueError("stabilizer is only used in causal mode")
+  return vs.streamStabilized(frames, tracker=vs.createTracker())
@@ -0,0 +1,198 @@
+# Per-stage latency histograms and event counters (deneme.ImageStabilizer)
+#
+# The stabilizer times each step of process_frame (gray conversion, LK
+# tracking, RANSAC estimation, re-detection, filtering, warping) into
+# streaming histograms with fixed, log-spaced buckets: memory does not grow
+# with the run length and p50 / p95 / p99 are read from the buckets to within
+# a few percent. Fallbacks such as frames without a motion estimate and
+# re-detections are counted alongside, and gauges such as the time since the
+# last network frame (network_source.py) are read when reported. The numbers
+# go to a JSON file or to a Prometheus text endpoint:
+#
+#   metrics = stabilizer.metrics
+#   server = MetricsServer(metrics, port=9108)   # GET /metrics, /metrics.json
+#   ...
+#   metrics.printSummary(budget_ms=33)
+#   metrics.writeJSON('metrics.json')
+import bisect
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+
+# Bucket upper bounds in seconds: 4 per octave from 10 us to ~10 s, i.e. each
+# bucket is ~19% wide. The Prometheus export uses every 4th bound (one per
+# octave), whose cumulative counts are exact.
+BUCKET_BOUNDS = [1e-5 * 2 ** (k / 4) for k in range(81)]
+EXPORT_BOUNDS = BUCKET_BOUNDS[::4]
+QUANTILES = (0.5, 0.95, 0.99)
+
+
+class LatencyHistogram:
+  """Streaming histogram of durations in seconds"""
+
+  def __init__(self):
+    # One bucket per bound plus the overflow bucket
+    self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+    self.count = 0
+    self.total = 0.0
+    self.max = 0.0
+
+  def observe(self, seconds):
+    self.counts[bisect.bisect_left(BUCKET_BOUNDS, seconds)] += 1
+    self.count += 1
+    self.total += seconds
+    if seconds > self.max:
+      self.max = seconds
+
+  def quantile(self, q):
+    """Estimated q-quantile in seconds, interpolated within its bucket"""
+    if self.count == 0:
+      return 0.0
+    rank = q * self.count
+    seen = 0
+    for k, n in enumerate(self.counts):
+      if n and seen + n >= rank:
+        if k == len(BUCKET_BOUNDS):
+          return self.max
+        lower = BUCKET_BOUNDS[k - 1] if k > 0 else 0.0
+        upper = BUCKET_BOUNDS[k]
+        value = lower + (upper - lower) * (rank - seen) / n
+        return min(value, self.max)
+      seen += n
+    return self.max
+
+  def cumulative(self, bounds):
+    """Number of samples <= each of the given bucket bounds"""
+    cumulative = np.cumsum(self.counts[:-1])
+    return [int(cumulative[BUCKET_BOUNDS.index(bound)]) for bound in bounds]
+
+
+class StageMetrics:
+  """Latency histograms per stage, event counters and gauges, safe to update from several threads"""
+
+  def __init__(self, stages=(), events=()):
+    # Registered names keep their order in the reports, even before the first sample
+    self.stages = {name: LatencyHistogram() for name in stages}
+    self.events = {name: 0 for name in events}
+    self.gauges = {}
+    self.started = time.time()
+    self._lock = threading.Lock()
+
+  def observe(self, stage, seconds):
+    with self._lock:
+      histogram = self.stages.get(stage)
+      if histogram is None:
+        histogram = self.stages[stage] = LatencyHistogram()
+      histogram.observe(seconds)
+
+  def count(self, event, n=1):
+    with self._lock:
+      self.events[event] = self.events.get(event, 0) + n
+
+  def gauge(self, name, read):
+    """Report read() (a number) as name every time the metrics are read"""
+    with self._lock:
+      self.gauges[name] = read
+
+  def readGauges(self):
+    with self._lock:
+      gauges = list(self.gauges.items())
+    return {name: float(read()) for name, read in gauges}
+
+  def summary(self):
+    """Counts, mean, p50 / p95 / p99 and max (ms) of every stage, the event counters and gauges"""
+    gauges = {name: round(value, 4) for name, value in self.readGauges().items()}
+    with self._lock:
+      stages = {}
+      for name, h in self.stages.items():
+        stats = {'count': h.count, 'mean_ms': round(h.total * 1000 / h.count, 4) if h.count else 0.0}
+        for q in QUANTILES:
+          stats[f"p{round(q * 100)}_ms"] = round(h.quantile(q) * 1000, 4)
+        stats['max_ms'] = round(h.max * 1000, 4)
+        stages[name] = stats
+      return {'uptime_s': round(time.time() - self.started, 3), 'stages': stages, 'events': dict(self.events),
+              'gauges': gauges}
+
+  def writeJSON(self, path):
+    with open(path, 'w') as f:
+      json.dump(self.summary(), f, indent=2)
+
+  def prometheusText(self, prefix='stabilizer'):
+    """Metrics in the Prometheus text exposition format"""
+    gauges = self.readGauges()
+    lines = [f"# HELP {prefix}_stage_seconds Time spent in each stage of a frame",
+             f"# TYPE {prefix}_stage_seconds histogram"]
+    with self._lock:
+      for name, h in self.stages.items():
+        for bound, n in zip(EXPORT_BOUNDS, h.cumulative(EXPORT_BOUNDS)):
+          lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="{bound:.6g}"}} {n}')
+        lines.append(f'{prefix}_stage_seconds_bucket{{stage="{name}",le="+Inf"}} {h.count}')
+        lines.append(f'{prefix}_stage_seconds_sum{{stage="{name}"}} {h.total:.9g}')
+        lines.append(f'{prefix}_stage_seconds_count{{stage="{name}"}} {h.count}')
+      lines += [f"# HELP {prefix}_stage_quantile_seconds Estimated quantiles of the stage times",
+                f"# TYPE {prefix}_stage_quantile_seconds gauge"]
+      for name, h in self.stages.items():
+        for q in QUANTILES:
+          lines.append(f'{prefix}_stage_quantile_seconds{{stage="{name}",quantile="{q}"}} {h.quantile(q):.9g}')
+      lines += [f"# HELP {prefix}_events_total Fallbacks and other counted events",
+                f"# TYPE {prefix}_events_total counter"]
+      for name, n in self.events.items():
+        lines.append(f'{prefix}_events_total{{event="{name}"}} {n}')
+    for name, value in gauges.items():
+      lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value:.9g}"]
+    return '\n'.join(lines) + '\n'
+
+  def printSummary(self, budget_ms=None):
+    summary = self.summary()
+    print("\n=== Stage latency (ms) ===")
+    header = f"{'stage':<10}{'count':>8}{'mean':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}"
+    if budget_ms:
+      header += f"{'p95/budget':>12}"
+    print(header)
+    for name, s in summary['stages'].items():
+      row = (f"{name:<10}{s['count']:>8}{s['mean_ms']:>9.2f}{s['p50_ms']:>9.2f}{s['p95_ms']:>9.2f}"
+             f"{s['p99_ms']:>9.2f}{s['max_ms']:>9.2f}")
+      if budget_ms:
+        row += f"{s['p95_ms'] / budget_ms:>12.0%}"
+      print(row)
+    print("Events: " + ', '.join(f"{name} {n}" for name, n in summary['events'].items()))
+    if summary['gauges']:
+      print("Gauges: " + ', '.join(f"{name} {value:g}" for name, value in summary['gauges'].items()))
+
+
+class MetricsServer:
+  """Serves /metrics (Prometheus text) and /metrics.json on a background thread"""
+
+  def __init__(self, metrics, port, host='127.0.0.1', prefix='stabilizer'):
+    class Handler(BaseHTTPRequestHandler):
+      def do_GET(self):
+        if self.path == '/metrics':
+          body, content_type = metrics.prometheusText(prefix), 'text/plain; version=0.0.4'
+        elif self.path == '/metrics.json':
+          body, content_type = json.dumps(metrics.summary()), 'application/json'
+        else:
+          self.send_error(404)
+          return
+        data = body.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+      def log_message(self, format, *args):
+        # Scrapes would flood the console
+        pass
+
+    self.server = ThreadingHTTPServer((host, port), Handler)
+    self.address = self.server.server_address
+    self.thread = threading.Thread(target=self.server.serve_forever, name='metrics', daemon=True)
+    self.thread.start()
+
+  def close(self):
+    self.server.shutdown()
+    self.server.server_close()
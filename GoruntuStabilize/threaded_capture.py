@@ -0,0 +1,122 @@
+# Background capture thread for the real-time stabilizer (deneme.py)
+#
+# cap.read() on the display thread means that while a frame is processed the
+# camera driver queues up further frames, so every read returns an older frame
+# and the latency keeps growing. ThreadedCapture reads on its own thread and
+# keeps only the newest queue_size frames (one by default): the consumer always
+# gets the freshest frame, and frames it was too slow for are dropped and
+# counted instead of delaying everything after them.
+#
+# For video files dropping frames is rarely wanted; with drop=False the reader
+# waits for free room instead (plain read-ahead).
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+
+class ThreadedCapture:
+  """Reads a cv2.VideoCapture on a background thread.
+
+  read() returns (success, frame, captured_at), where captured_at is the
+  time.perf_counter() value right after the frame was decoded, so the caller
+  can measure capture-to-display latency.
+  """
+
+  def __init__(self, cap, queue_size=1, drop=True):
+    if queue_size < 1:
+      raise ValueError("queue_size must be at least 1")
+    self.cap = cap
+    self.queue_size = queue_size
+    self.drop = drop
+    self._frames = deque()
+    self._cond = threading.Condition()
+    self._stop = threading.Event()
+    self._finished = False
+    self._released = False
+    # Statistics
+    self.captured = 0
+    self.dropped = 0
+    self.delivered = 0
+    self.intervals = deque(maxlen=120)
+    self._last_capture = None
+    self.thread = threading.Thread(target=self._run, name='capture', daemon=True)
+    self.thread.start()
+
+  def _run(self):
+    try:
+      while not self._stop.is_set():
+        success, frame = self.cap.read()
+        captured_at = time.perf_counter()
+        if not success:
+          break
+        with self._cond:
+          if self.drop:
+            if len(self._frames) >= self.queue_size:
+              self._frames.popleft()
+              self.dropped += 1
+          else:
+            while len(self._frames) >= self.queue_size and not self._stop.is_set():
+              self._cond.wait(0.1)
+          if self._last_capture is not None:
+            self.intervals.append(captured_at - self._last_capture)
+          self._last_capture = captured_at
+          self._frames.append((frame, captured_at))
+          self.captured += 1
+          self._cond.notify_all()
+    finally:
+      with self._cond:
+        self._finished = True
+        self._cond.notify_all()
+        # release() gave up waiting for us: the capture is ours to release
+        release = self._stop.is_set() and not self._released
+        self._released = self._released or release
+      if release:
+        self.cap.release()
+
+  def read(self, timeout=None):
+    """Oldest kept frame, waiting for one if needed; (False, None, None) at the end"""
+    with self._cond:
+      self._cond.wait_for(lambda: self._frames or self._finished, timeout)
+      if not self._frames:
+        return False, None, None
+      frame, captured_at = self._frames.popleft()
+      self._cond.notify_all()
+    self.delivered += 1
+    return True, frame, captured_at
+
+  def isOpened(self):
+    return self.cap.isOpened()
+
+  def get(self, prop):
+    return self.cap.get(prop)
+
+  def captureFPS(self):
+    """Rate at which the source delivers frames, averaged over the last intervals"""
+    with self._cond:
+      intervals = list(self.intervals)
+    return 1.0 / np.mean(intervals) if intervals and np.mean(intervals) > 0 else 0.0
+
+  def release(self):
+    self._stop.set()
+    with self._cond:
+      self._cond.notify_all()
+    # A reconnecting source (network_source.NetworkCapture) may be waiting to retry
+    if hasattr(self.cap, 'interrupt'):
+      self.cap.interrupt()
+    # The reader may be inside cap.read(); it stops after that frame. A stalled
+    # network read can outlast the join, and releasing the capture under a
+    # running read() crashes the FFmpeg backend, so then the reader releases it
+    self.thread.join(timeout=2.0)
+    with self._cond:
+      release = not self.thread.is_alive() and not self._released
+      self._released = self._released or release
+    if release:
+      self.cap.release()
+
+  def printSummary(self):
+    print("\n=== Capture ===")
+    print(f"Frames captured: {self.captured}, delivered: {self.delivered}, dropped: {self.dropped}"
+          + (f" ({self.dropped / self.captured:.0%})" if self.captured else ""))
+    print(f"Capture rate: {self.captureFPS():.1f} FPS")
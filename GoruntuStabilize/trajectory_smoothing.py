@@ -0,0 +1,362 @@
+# Trajectory smoothing engine for video_stabilization.py
+#
+# Every smoother takes the whole (N, 3) camera trajectory (x, y, angle) and
+# returns a smoothed array of the same shape:
+#
+#   smoothTrajectory(trajectory, method, radius, passes, **options)
+#
+# 'moving_average' and 'gaussian' are the edge padded centered filters the
+# stabilizer always used. Box filters run as O(N) running sums whatever the
+# radius, cascaded gaussian passes are folded into one kernel and applied with
+# an FFT over all three columns at once. 'kalman' is a fixed-interval
+# Rauch-Tung-Striebel smoother with a constant-velocity model and 'l1' solves
+# for the L1-optimal camera path (static, constant-velocity and
+# constant-acceleration segments) within a crop bound.
+from collections import deque
+
+import numpy as np
+
+# The L1 path is a linear program, solved with scipy when it is installed
+try:
+  from scipy import sparse
+  from scipy.optimize import linprog
+  SCIPY_AVAILABLE = True
+except ImportError:
+  SCIPY_AVAILABLE = False
+
+
+SMOOTHERS = {}
+
+
+def registerSmoother(name):
+  """Decorator adding a smoother(trajectory, radius, passes, **options) to SMOOTHERS"""
+  def decorator(fn):
+    SMOOTHERS[name] = fn
+    return fn
+  return decorator
+
+
+def smoothTrajectory(trajectory, method='gaussian', radius=50, passes=1, **options):
+  """Smooth an (N, 3) trajectory with one of the registered SMOOTHERS"""
+  if method not in SMOOTHERS:
+    raise ValueError(f"Unknown smoothing method '{method}', available: {', '.join(sorted(SMOOTHERS))}")
+  trajectory = np.asarray(trajectory, dtype=np.float64)
+  if len(trajectory) == 0:
+    return trajectory.copy()
+  return SMOOTHERS[method](trajectory, radius, passes, **options)
+
+
+# ---------------------------------------------------------------------------
+# Kernel filters
+
+def boxKernel(radius):
+  window_size = 2 * radius + 1
+  return np.ones(window_size) / window_size
+
+
+def gaussianKernel(radius):
+  """Normalized gaussian kernel of size 2 * radius + 1"""
+  window_size = 2 * radius + 1
+  sigma = window_size / 6.0  # 3-sigma rule
+  x = np.arange(window_size) - radius
+  gaussian_kernel = np.exp(-(x**2) / (2 * sigma**2))
+  return gaussian_kernel / np.sum(gaussian_kernel)
+
+
+def kernelCascade(method, radius, passes=1):
+  """Kernels that reproduce a kernel smoother when applied one after another.
+
+  Each kernel is applied as an edge padded centered convolution, which is
+  also how StreamingSmoother applies them.
+  """
+  if method == 'moving_average':
+    return [boxKernel(radius)] * passes
+  if method == 'gaussian':
+    kernel = gaussianKernel(radius)
+    combined = kernel
+    for _ in range(passes - 1):
+      combined = np.convolve(combined, kernel)
+    return [combined]
+  raise ValueError(f"'{method}' is not a kernel smoother")
+
+
+def _edgePad(trajectory, radius):
+  return np.pad(trajectory, ((radius, radius), (0, 0)), 'edge')
+
+
+def _fftSize(n):
+  return 1 << max(0, int(n - 1).bit_length())
+
+
+def _convolveColumns(padded, kernel):
+  """'valid' convolution of every column with a symmetric kernel, via FFT"""
+  n, k = len(padded), len(kernel)
+  size = _fftSize(n + k - 1)
+  spectrum = np.fft.rfft(padded, size, axis=0) * np.fft.rfft(kernel, size)[:, None]
+  return np.fft.irfft(spectrum, size, axis=0)[k - 1:n]
+
+
+def _runningMean(trajectory, radius):
+  """Centered, edge padded moving average in O(N) with a running sum"""
+  window_size = 2 * radius + 1
+  # Work relative to the first sample to keep the running sum small
+  origin = trajectory[0]
+  padded = _edgePad(trajectory - origin, radius)
+  sums = np.concatenate([np.zeros((1, trajectory.shape[1])), np.cumsum(padded, axis=0)])
+  return (sums[window_size:] - sums[:-window_size]) / window_size + origin
+
+
+@registerSmoother('moving_average')
+def movingAverageSmoother(trajectory, radius, passes=1):
+  smoothed = trajectory
+  for _ in range(passes):
+    smoothed = _runningMean(smoothed, radius)
+  return smoothed
+
+
+@registerSmoother('gaussian')
+def gaussianSmoother(trajectory, radius, passes=1):
+  # Cascaded passes are a single convolution with the combined kernel
+  kernel, = kernelCascade('gaussian', radius, passes)
+  kernel_radius = (len(kernel) - 1) // 2
+  return _convolveColumns(_edgePad(trajectory, kernel_radius), kernel)
+
+
+class StreamingSmoother:
+  """Causal version of the kernel smoothers for a stream of trajectory samples.
+
+  Each stage is the same centered, edge padded convolution that the batch
+  smoother applies, so the output for sample i is available once `delay`
+  later samples have been pushed (or the stream has ended). Only the last
+  2 * radius + 1 samples of every stage are kept in memory.
+  """
+
+  def __init__(self, kernels):
+    self.kernels = [np.asarray(k, dtype=np.float64) for k in kernels]
+    self.radii = [(len(k) - 1) // 2 for k in self.kernels]
+    self.stages = len(self.kernels)
+    self.windows = [deque(maxlen=len(k)) for k in self.kernels]
+    self.delay = sum(self.radii)
+
+  def _push(self, stage, value):
+    """Feed a sample into a stage and return whatever it emits"""
+    window = self.windows[stage]
+    if not window:
+      # Edge padding at the start of the curve
+      window.extend([value] * self.radii[stage])
+    window.append(value)
+    if len(window) < window.maxlen:
+      return []
+    out = np.dot(self.kernels[stage], np.array(window))
+    if stage + 1 == self.stages:
+      return [out]
+    return self._push(stage + 1, out)
+
+  def push(self, value):
+    """Add the next trajectory sample, returns the smoothed samples now ready"""
+    return self._push(0, np.asarray(value, dtype=np.float64))
+
+  def _flush(self, stage):
+    window = self.windows[stage]
+    if not window:
+      return []
+    out = []
+    # Edge padding at the end of the curve
+    last = window[-1]
+    for _ in range(self.radii[stage]):
+      window.append(last)
+      if len(window) < window.maxlen:
+        continue
+      emitted = np.dot(self.kernels[stage], np.array(window))
+      if stage + 1 == self.stages:
+        out.append(emitted)
+      else:
+        out.extend(self._push(stage + 1, emitted))
+    if stage + 1 < self.stages:
+      out.extend(self._flush(stage + 1))
+    return out
+
+  def flush(self):
+    """End of stream, returns the remaining smoothed samples"""
+    return self._flush(0)
+
+
+# ---------------------------------------------------------------------------
+# Fixed-interval Kalman (RTS) smoother
+
+def _linearRecursion(A, u, x0):
+  """x[k] = A @ x[k-1] + u[k] for all k, with x[-1] = x0.
+
+  u is (n, 2, C) and x0 is (2, C). For a stable A the response is an FIR
+  filter of the decaying powers of A (truncated below double precision),
+  applied to all columns at once with an FFT.
+  """
+  n = len(u)
+  rho = np.max(np.abs(np.linalg.eigvals(A)))
+  if n == 0:
+    return u.copy()
+  if rho >= 1.0:
+    x = np.empty_like(u)
+    prev = x0
+    for k in range(n):
+      prev = A @ prev + u[k]
+      x[k] = prev
+    return x
+
+  length = n if rho == 0 else min(n, int(np.ceil(np.log(1e-17) / np.log(rho))) + 2)
+  powers = np.empty((length + 1, 2, 2))
+  powers[0] = np.eye(2)
+  for j in range(1, length + 1):
+    powers[j] = A @ powers[j - 1]
+
+  # Convolve along the last axis: powers as (2, 2, length), inputs as (2, C, n)
+  size = _fftSize(n + length - 1)
+  h = np.fft.rfft(powers[:length].transpose(1, 2, 0), size, axis=-1)
+  v = np.fft.rfft(u.transpose(1, 2, 0), size, axis=-1)
+  spectrum = h[:, 0, None, :] * v[0] + h[:, 1, None, :] * v[1]
+  x = np.fft.irfft(spectrum, size, axis=-1)[..., :n].transpose(2, 0, 1)
+  # Decaying contribution of the initial state
+  m = min(n, length)
+  x[:m] += np.einsum('kri,ic->krc', powers[1:m + 1], x0)
+  return x
+
+
+@registerSmoother('kalman')
+def rtsSmoother(trajectory, radius, passes=1, process_noise=None, measurement_noise=1.0, tolerance=1e-14):
+  """Rauch-Tung-Striebel smoother with a constant-velocity model per column.
+
+  `radius` sets the smoothing time constant in frames (process noise
+  measurement_noise / radius**4) unless process_noise is given. The
+  covariances do not depend on the data and converge after a few dozen
+  frames, the rest of the recursion is a linear time-invariant filter.
+  """
+  n, columns = trajectory.shape
+  r = measurement_noise
+  q = process_noise if process_noise is not None else r / max(1, radius) ** 4
+  F = np.array([[1.0, 1.0], [0.0, 1.0]])
+  H = np.array([1.0, 0.0])
+  Q = q * np.array([[0.25, 0.5], [0.5, 1.0]])
+  I = np.eye(2)
+
+  # Covariance recursion until the gains are constant
+  P_pred = np.diag([r, 1e6 * r])
+  gains, smoother_gains = [], []
+  P_filt_prev = None
+  steady = n
+  for k in range(n):
+    K = P_pred @ H / (H @ P_pred @ H + r)
+    P_filt = (I - np.outer(K, H)) @ P_pred
+    P_next = F @ P_filt @ F.T + Q
+    C = P_filt @ F.T @ np.linalg.inv(P_next)
+    if gains and np.max(np.abs(K - gains[-1])) < tolerance and np.max(np.abs(P_filt - P_filt_prev)) < tolerance * r:
+      steady = k
+      break
+    gains.append(K)
+    smoother_gains.append(C)
+    P_filt_prev, P_pred = P_filt, P_next
+  K_ss, C_ss = gains[-1], smoother_gains[-1]
+
+  z = trajectory
+  x_filt = np.empty((n, 2, columns))
+
+  # Forward filter, exact over the transient...
+  x_pred = np.vstack([z[0], np.zeros(columns)])
+  for k in range(steady):
+    x = x_pred + np.outer(gains[k], z[k] - x_pred[0])
+    x_filt[k] = x
+    x_pred = F @ x
+  # ...then x[k] = (I - K H) F x[k-1] + K z[k]
+  if steady < n:
+    A = (I - np.outer(K_ss, H)) @ F
+    u = K_ss[None, :, None] * z[steady:, None, :]
+    x_filt[steady:] = _linearRecursion(A, u, x_filt[steady - 1])
+
+  # Backward pass: xs[k] = (I - C F) xf[k] + C xs[k+1], starting from xs[n-1] = xf[n-1]
+  x_smooth = np.empty_like(x_filt)
+  x_smooth[-1] = x_filt[-1]
+  start = max(steady, 0)
+  if start < n - 1:
+    B = I - C_ss @ F
+    u = np.einsum('ri,kic->krc', B, x_filt[start:n - 1][::-1])
+    x_smooth[start:n - 1] = _linearRecursion(C_ss, u, x_filt[-1])[::-1]
+  for k in range(min(start, n - 1) - 1, -1, -1):
+    C = smoother_gains[k]
+    x_smooth[k] = x_filt[k] + C @ (x_smooth[k + 1] - F @ x_filt[k])
+
+  return x_smooth[:, 0, :]
+
+
+# ---------------------------------------------------------------------------
+# L1-optimal camera path
+
+def _l1Problem(n, weights):
+  """Cost vector and inequality constraints of the L1 path LP for n frames"""
+  identity = sparse.identity(n, format='csr')
+  diffs = []
+  D = identity
+  for _ in range(3):
+    D = (D[1:] - D[:-1]).tocsr()
+    diffs.append(D)
+  m = [d.shape[0] for d in diffs]
+  n_vars = n + sum(m)
+
+  # Variables: path p, then one slack per row of D1, D2 and D3
+  cost = np.concatenate([np.zeros(n)] + [np.full(k, w) for k, w in zip(m, weights)])
+  blocks = []
+  offset = 0
+  for k, d in enumerate(diffs):
+    slack = sparse.csr_matrix((np.ones(m[k]), (np.arange(m[k]), n + offset + np.arange(m[k]))),
+                              shape=(m[k], n_vars))
+    path = sparse.hstack([d, sparse.csr_matrix((m[k], n_vars - n))])
+    # -e <= D p <= e
+    blocks += [path - slack, -path - slack]
+    offset += m[k]
+  A_ub = sparse.vstack(blocks).tocsc()
+  return cost, A_ub, np.zeros(A_ub.shape[0])
+
+
+@registerSmoother('l1')
+def l1Smoother(trajectory, radius, passes=1, bounds=(30.0, 30.0, 0.02), weights=(10.0, 1.0, 100.0),
+               window=240, overlap=60):
+  """L1-optimal camera path (Grundmann et al.) solved as linear programs.
+
+  Minimises w1*|D1 p| + w2*|D2 p| + w3*|D3 p| per column while keeping the
+  path within `bounds` (x px, y px, angle rad) of the original trajectory,
+  which is the margin the border crop can hide. The LP cost grows faster
+  than linearly, so long inputs are solved in overlapping windows; each
+  window starts from the last three frames of the previous one so position,
+  velocity and acceleration stay continuous. `radius` is not used.
+  """
+  if not SCIPY_AVAILABLE:
+    raise ImportError("The 'l1' smoother needs scipy: pip install scipy")
+  n = len(trajectory)
+  if n < 4:
+    return trajectory.copy()
+
+  problems = {}
+  smoothed = np.empty_like(trajectory)
+  keep = max(1, window - overlap)
+  start = 0
+  while start < n:
+    # Re-solve the last three kept frames, pinned to their values
+    pinned = min(3, start)
+    lo = start - pinned
+    hi = n if n - lo <= window + keep // 2 else lo + window
+    length = hi - lo
+    if length not in problems:
+      problems[length] = _l1Problem(length, weights)
+    cost, A_ub, b_ub = problems[length]
+    n_slack = A_ub.shape[1] - length
+
+    for c in range(trajectory.shape[1]):
+      lower = trajectory[lo:hi, c] - bounds[c]
+      upper = trajectory[lo:hi, c] + bounds[c]
+      lower[:pinned] = upper[:pinned] = smoothed[lo:start, c]
+      var_bounds = np.column_stack([np.concatenate([lower, np.zeros(n_slack)]),
+                                    np.concatenate([upper, np.full(n_slack, np.inf)])])
+      result = linprog(cost, A_ub=A_ub, b_ub=b_ub, bounds=var_bounds, method='highs')
+      path = result.x[:length] if result.success else trajectory[lo:hi, c]
+      smoothed[start:hi, c] = path[pinned:]
+
+    start = hi if hi == n else start + keep
+  return smoothed
@@ -0,0 +1,227 @@
+# Interactive smoothing tuner for video_stabilization.py
+#
+# The motion is analysed once (or loaded from the motion cache) and the camera
+# trajectory is kept in memory. Trackbars change the smoothing method, radius,
+# double smoothing and border zoom; every change only re-smooths the trajectory
+# (milliseconds) and re-renders the frame under the cursor. The window shows
+# the original and stabilized frame above the raw (gray) and smoothed (color)
+# x, y and angle curves.
+#
+# Results are cached per (method, radius, double), so dragging back over
+# settings already seen does not smooth again. The slow 'l1' linear program is
+# left out of the method slider unless it is the configured SMOOTHING_METHOD.
+#
+# Keys: a / d step one frame, e exports the settings to JSON, q or ESC quits.
+# The exported file can be passed to the batch run:
+#
+#   python tune_smoothing.py flight.mp4 --export tuned.json
+#   python batch_stabilize.py flights/ --config tuned.json
+import argparse
+import json
+
+import numpy as np
+import cv2
+
+import video_stabilization as vs
+from seek_index import IndexedCapture
+from trajectory_smoothing import SMOOTHERS, smoothTrajectory
+
+
+WINDOW = "Smoothing tuner"
+
+# Trackbar ranges
+MAX_RADIUS = 300
+BORDER_RANGE = (100, 130)  # percent
+
+# Smoothers too slow to re-run on every trackbar step (seconds per change)
+SLOW_METHODS = ('l1',)
+
+PLOT_HEIGHT = 80  # per curve
+CURVE_COLORS = [(0, 200, 255), (0, 255, 0), (255, 128, 0)]
+
+
+class SmoothingTuner:
+  """Holds the trajectory and renders previews for a set of smoothing settings"""
+
+  def __init__(self, path, transforms, preview_width=1280):
+    self.path = path
+    self.transforms = np.asarray(transforms, np.float64)
+    self.trajectory = np.cumsum(self.transforms, axis=0)
+    self.methods = sorted(m for m in SMOOTHERS if m not in SLOW_METHODS or m == vs.SMOOTHING_METHOD)
+    self.settings = {
+      'SMOOTHING_METHOD': vs.SMOOTHING_METHOD,
+      'SMOOTHING_RADIUS': vs.SMOOTHING_RADIUS,
+      'DOUBLE_SMOOTHING': vs.DOUBLE_SMOOTHING,
+      'BORDER_SCALE': vs.BORDER_SCALE,
+    }
+
+    self.cap = IndexedCapture(path, cache_dir=vs.MOTION_CACHE_DIR)
+    w = int(self.cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+    h = int(self.cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+    self.frame_size = (w, h)
+    # The preview is rendered side by side within preview_width
+    self.renderer = None
+    self._border = None
+    self.max_width = preview_width
+    self.frame_index = None
+    self.frame = None
+
+    self.smoothed = None
+    self.transforms_smooth = None
+    self.plot = None
+    self._smoothed_for = None
+    self._cache = {}
+    self.smooth_ms = 0.0
+
+  def _smoothingKey(self):
+    return (self.settings['SMOOTHING_METHOD'], self.settings['SMOOTHING_RADIUS'],
+            self.settings['DOUBLE_SMOOTHING'])
+
+  def update(self, **settings):
+    """Apply new settings, re-smoothing and re-plotting only when needed"""
+    self.settings.update(settings)
+    if self._smoothed_for != self._smoothingKey():
+      key = self._smoothingKey()
+      if key not in self._cache:
+        method, radius, double = key
+        # The configured extra options belong to the configured method only
+        options = vs.SMOOTHING_OPTIONS if method == vs.SMOOTHING_METHOD else {}
+        start = cv2.getTickCount()
+        smoothed = smoothTrajectory(self.trajectory, method, radius, 2 if double else 1, **options)
+        self._cache[key] = (smoothed, (cv2.getTickCount() - start) * 1000 / cv2.getTickFrequency())
+      self.smoothed, self.smooth_ms = self._cache[key]
+      self.transforms_smooth = self.transforms + (self.smoothed - self.trajectory)
+      self._smoothed_for = self._smoothingKey()
+      self.plot = None
+    if self._border != self.settings['BORDER_SCALE']:
+      w, h = self.frame_size
+      self.renderer = vs.FrameRenderer(w, h, 'side_by_side', self.settings['BORDER_SCALE'],
+                                       max_width=self.max_width)
+      self._border = self.settings['BORDER_SCALE']
+
+  def frameAt(self, index):
+    """Decoded frame `index`, kept while the cursor stays on it"""
+    if index != self.frame_index:
+      self.cap.seek(index)
+      success, frame = self.cap.read()
+      if not success:
+        return self.frame
+      self.frame_index, self.frame = index, frame
+    return self.frame
+
+  def _plotBase(self, width):
+    """Raw and smoothed curves, redrawn only after the smoothing changed"""
+    n = len(self.trajectory)
+    plot = np.zeros((3 * PLOT_HEIGHT, width, 3), np.uint8)
+    # At most two samples per pixel column
+    samples = np.unique(np.linspace(0, n - 1, min(n, 2 * width)).astype(int))
+    xs = (samples * (width - 1) / max(1, n - 1)).astype(np.int32)
+    labels = ['x (px)', 'y (px)', 'angle (rad)']
+    for k in range(3):
+      top = k * PLOT_HEIGHT
+      raw, smooth = self.trajectory[samples, k], self.smoothed[samples, k]
+      lo, hi = min(raw.min(), smooth.min()), max(raw.max(), smooth.max())
+      span = hi - lo if hi > lo else 1.0
+
+      def toY(values):
+        return (top + PLOT_HEIGHT - 4 - (values - lo) / span * (PLOT_HEIGHT - 8)).astype(np.int32)
+
+      cv2.polylines(plot, [np.stack([xs, toY(raw)], axis=1)], False, (110, 110, 110), 1)
+      cv2.polylines(plot, [np.stack([xs, toY(smooth)], axis=1)], False, CURVE_COLORS[k], 1)
+      cv2.line(plot, (0, top), (width, top), (60, 60, 60), 1)
+      cv2.putText(plot, labels[k], (5, top + 15), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (200, 200, 200), 1)
+    return plot
+
+  def compose(self, index):
+    """Preview image of frame `index` with the current settings"""
+    index = int(np.clip(index, 0, len(self.transforms_smooth) - 1))
+    frame = self.frameAt(index)
+    view = self.renderer.render(frame, *self.transforms_smooth[index]).copy()
+    width = view.shape[1]
+    if self.plot is None or self.plot.shape[1] != width:
+      self.plot = self._plotBase(width)
+
+    plot = self.plot.copy()
+    x = int(index * (width - 1) / max(1, len(self.trajectory) - 1))
+    cv2.line(plot, (x, 0), (x, plot.shape[0]), (255, 255, 255), 1)
+
+    s = self.settings
+    text = (f"{s['SMOOTHING_METHOD']}  r={s['SMOOTHING_RADIUS']}  double={'on' if s['DOUBLE_SMOOTHING'] else 'off'}"
+            f"  border={s['BORDER_SCALE']:.2f}  frame {index}  ({self.smooth_ms:.1f} ms)")
+    cv2.putText(view, text, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (0, 0, 0), 3, cv2.LINE_AA)
+    cv2.putText(view, text, (10, 20), cv2.FONT_HERSHEY_SIMPLEX, 0.45, (255, 255, 255), 1, cv2.LINE_AA)
+    return np.vstack([view, plot])
+
+  def export(self, path):
+    """Write the current settings as a --config file for batch_stabilize.py"""
+    settings = dict(self.settings)
+    if settings['SMOOTHING_METHOD'] == vs.SMOOTHING_METHOD and vs.SMOOTHING_OPTIONS:
+      settings['SMOOTHING_OPTIONS'] = vs.SMOOTHING_OPTIONS
+    with open(path, 'w') as f:
+      json.dump(settings, f, indent=2)
+    return settings
+
+  def release(self):
+    self.cap.release()
+
+
+def runWindow(tuner, export_path):
+  """Trackbar loop; returns when the window is closed"""
+  n = len(tuner.transforms_smooth)
+  s = tuner.settings
+  noop = lambda value: None
+  cv2.namedWindow(WINDOW, cv2.WINDOW_AUTOSIZE)
+  cv2.createTrackbar('frame', WINDOW, 0, max(1, n - 1), noop)
+  cv2.createTrackbar('radius', WINDOW, int(np.clip(s['SMOOTHING_RADIUS'], 1, MAX_RADIUS)), MAX_RADIUS, noop)
+  cv2.createTrackbar('method', WINDOW, tuner.methods.index(s['SMOOTHING_METHOD']), len(tuner.methods) - 1, noop)
+  cv2.createTrackbar('double', WINDOW, int(bool(s['DOUBLE_SMOOTHING'])), 1, noop)
+  cv2.createTrackbar('border %', WINDOW, int(np.clip(round(s['BORDER_SCALE'] * 100), *BORDER_RANGE)),
+                     BORDER_RANGE[1], noop)
+
+  shown = None
+  while True:
+    state = tuple(cv2.getTrackbarPos(name, WINDOW) for name in ('frame', 'radius', 'method', 'double', 'border %'))
+    if state != shown:
+      frame, radius, method, double, border = state
+      tuner.update(SMOOTHING_METHOD=tuner.methods[method], SMOOTHING_RADIUS=max(1, radius),
+                   DOUBLE_SMOOTHING=bool(double), BORDER_SCALE=max(BORDER_RANGE[0], border) / 100)
+      cv2.imshow(WINDOW, tuner.compose(frame))
+      shown = state
+
+    key = cv2.waitKey(30) & 0xFF
+    if key in (ord('q'), 27) or cv2.getWindowProperty(WINDOW, cv2.WND_PROP_VISIBLE) < 1:
+      break
+    elif key in (ord('a'), ord('d')):
+      step = 1 if key == ord('d') else -1
+      cv2.setTrackbarPos('frame', WINDOW, int(np.clip(shown[0] + step, 0, n - 1)))
+    elif key == ord('e'):
+      settings = tuner.export(export_path)
+      print(f"Settings exported to '{export_path}': {settings}")
+  cv2.destroyWindow(WINDOW)
+
+
+def main(argv=None):
+  parser = argparse.ArgumentParser(description="Tune the trajectory smoothing with an instant preview")
+  parser.add_argument('video', nargs='?', default=vs.INPUT_PATH)
+  parser.add_argument('--export', default='smoothing_settings.json',
+                      help="where the e key writes the settings (default: %(default)s)")
+  parser.add_argument('--preview-width', type=int, default=1280, help="maximum preview width")
+  args = parser.parse_args(argv)
+
+  cap = cv2.VideoCapture(args.video)
+  if not cap.isOpened():
+    parser.error(f"could not open '{args.video}'")
+  # The motion cache makes the second tuning session of a video start instantly
+  transforms, _, _ = vs.loadOrAnalyseMotion(cap, args.video)
+  cap.release()
+
+  tuner = SmoothingTuner(args.video, transforms, args.preview_width)
+  tuner.update()
+  try:
+    runWindow(tuner, args.export)
+  finally:
+    tuner.release()
+
+
+if __name__ == "__main__":
+  main()
@@ -1,309 +1,1175 @@
 # Import numpy and OpenCV
 import numpy as np
 import cv2
+import hashlib
 import os
+import shutil
+import threading
 import time
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from itertools import chain
 
+from encoders import concatVideos, openEncoder
+from feature_tracks import TrackManager
+from gyro_motion import defaultCameraPath, defaultLogPath, videoTransforms
+from motion_cache import fileFingerprint, loadMotion, saveMotion
+from pipeline import Pipeline, Stage
+from seek_index import IndexedCapture, loadIndex
+from trajectory_smoothing import StreamingSmoother, kernelCascade, smoothTrajectory
 
-def movingAverage(curve, radius): 
-  window_size = 2 * radius + 1
-  # Define the filter 
-  f = np.ones(window_size)/window_size 
-  # Add padding to the boundaries 
-  curve_pad = np.lib.pad(curve, (radius, radius), 'edge') 
-  # Apply convolution 
-  curve_smoothed = np.convolve(curve_pad, f, mode='same') 
-  # Remove padding 
-  curve_smoothed = curve_smoothed[radius:-radius]
-  # return smoothed curve
-  return curve_smoothed
-
-def gaussianSmooth(curve, radius):
-  """Gaussian smoothing for better stability"""
-  window_size = 2 * radius + 1
-  # Create gaussian kernel
-  sigma = window_size / 6.0  # 3-sigma rule
-  x = np.arange(window_size) - radius
-  gaussian_kernel = np.exp(-(x**2) / (2 * sigma**2))
-  gaussian_kernel = gaussian_kernel / np.sum(gaussian_kernel)
-  
-  # Add padding to the boundaries 
-  curve_pad = np.lib.pad(curve, (radius, radius), 'edge') 
-  # Apply convolution 
-  curve_smoothed = np.convolve(curve_pad, gaussian_kernel, mode='same') 
-  # Remove padding 
-  curve_smoothed = curve_smoothed[radius:-radius]
-  return curve_smoothed 
-
-def smooth(trajectory): 
-  smoothed_trajectory = np.copy(trajectory) 
-  # Filter the x, y and angle curves
-  for i in range(3):
-    if SMOOTHING_METHOD == 'gaussian':
-      smoothed_trajectory[:,i] = gaussianSmooth(trajectory[:,i], radius=SMOOTHING_RADIUS)
-    else:
-      smoothed_trajectory[:,i] = movingAverage(trajectory[:,i], radius=SMOOTHING_RADIUS)
-
-  return smoothed_trajectory
-
-def fixBorder(frame):
-  s = frame.shape
-  # Scale the image 4% without moving the center
-  T = cv2.getRotationMatrix2D((s[1]/2, s[0]/2), 0, 1.04)
-  frame = cv2.warpAffine(frame, T, (s[1], s[0]))
-  return frame
 
 def drawFPS(frame, fps, position):
   """Draw FPS information on frame"""
   fps_text = f"FPS: {fps:.1f}"
-  
+
   # Create background rectangle for better visibility
   font = cv2.FONT_HERSHEY_SIMPLEX
   font_scale = 0.7
   thickness = 2
-  
+
   # Get text size
   (text_width, text_height), baseline = cv2.getTextSize(fps_text, font, font_scale, thickness)
-  
+
   # Draw background rectangle
-  cv2.rectangle(frame, 
+  cv2.rectangle(frame,
                 (position[0] - 5, position[1] - text_height - 5),
                 (position[0] + text_width + 5, position[1] + baseline + 5),
                 (0, 0, 0), -1)
-  
+
   # Draw FPS text
   cv2.putText(frame, fps_text, position, font, font_scale, (0, 255, 0), thickness)
-  
-  return frame
 
+  return frame
 
-# The larger the more stable the video, but less reactive to sudden panning
-# Increased from 50 to 100 for better stability
-SMOOTHING_RADIUS=50
+def analysisGray(frame, scale=1.0):
+  """Gray version of the frame at the motion analysis scale"""
+  gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+  if scale != 1.0:
+    gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+  return gray
 
-# Smoothing method: 'moving_average' or 'gaussian'
-# Gaussian provides smoother results but may be less responsive
-SMOOTHING_METHOD = 'gaussian'  # Change to 'moving_average' if needed
+def trackFeatures(prev_gray, curr_gray, scale=1.0, predicted=None):
+  """Detect corners in prev_gray and track them into curr_gray.
 
-# Apply double smoothing for extra stability (set to True for maximum stability)
-DOUBLE_SMOOTHING = True
-
-# FPS display settings
-SHOW_FPS = True  # Set to False to hide FPS
-FPS_POSITION = (10, 30)  # (x, y) position for FPS text 
-
-# Read input video
-cap = cv2.VideoCapture(r'C:\Users\TOM\Documents\Projeler\AybuHavk\GoruntuStabilize\deneme.mp4') 
- 
-# Get frame count
-n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT)) 
- 
-# Get width and height of video stream
-w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)) 
-h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-
-# Get frames per second (fps)
-fps = cap.get(cv2.CAP_PROP_FPS)
- 
-# Define the codec for output video - try multiple codecs for better compatibility
-codecs_to_try = ['mp4v', 'XVID', 'MJPG', 'H264']
-fourcc = None
-out = None
-
-# Set up output video with proper dimensions
-output_width = 2 * w
-output_height = h
-
-# Try different codecs until one works
-for codec in codecs_to_try:
-    try:
-        fourcc = cv2.VideoWriter_fourcc(*codec)
-        out = cv2.VideoWriter('video_out.mp4', fourcc, fps, (output_width, output_height))
-        if out.isOpened():
-            print(f"Successfully initialized video writer with codec: {codec}")
-            break
-        else:
-            out.release()
-            out = None
-    except:
-        continue
-
-# Check if VideoWriter was initialized successfully
-if out is None or not out.isOpened():
-    print("Error: Could not open video writer with any codec")
-    print("Tried codecs:", codecs_to_try)
-    exit()
-
-# Read first frame
-_, prev = cap.read() 
- 
-# Convert frame to grayscale
-prev_gray = cv2.cvtColor(prev, cv2.COLOR_BGR2GRAY) 
-
-# Pre-define transformation-store array
-transforms = np.zeros((n_frames-1, 3), np.float32) 
-
-for i in range(n_frames-2):
+  With a predicted (dx, dy, da) transform (full resolution, e.g. from the gyro)
+  LK starts every point at its predicted position instead of where it was.
+  Returns the matching (N, 2) point arrays, or None when no features were found.
+  """
   # Detect feature points in previous frame
   prev_pts = cv2.goodFeaturesToTrack(prev_gray,
                                      maxCorners=200,
                                      qualityLevel=0.01,
-                                     minDistance=30,
+                                     minDistance=max(1, 30 * scale),
                                      blockSize=3)
-   
-  # Read next frame
-  success, curr = cap.read() 
-  if not success: 
-    break 
-
-  # Convert to grayscale
-  curr_gray = cv2.cvtColor(curr, cv2.COLOR_BGR2GRAY) 
 
-  # If no features found, skip to next frame
+  # If no features found, there is nothing to track
   if prev_pts is None:
-    prev_gray = curr_gray
-    print("Frame: " + str(i) + "/" + str(n_frames) + " -  Tracked points : 0 (no features)")
-    continue
+    return None, None
 
   # Calculate optical flow (i.e. track feature points)
-  curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_pts, None) 
+  if predicted is not None:
+    dx, dy, da = predicted
+    m = transformMatrix(dx * scale, dy * scale, da)[:2]
+    initial = cv2.transform(prev_pts, m).astype(np.float32)
+    curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_pts, initial,
+                                                     winSize=LK_WIN_SIZE, maxLevel=LK_MAX_LEVEL,
+                                                     flags=cv2.OPTFLOW_USE_INITIAL_FLOW)
+  else:
+    curr_pts, status, err = cv2.calcOpticalFlowPyrLK(prev_gray, curr_gray, prev_pts, None,
+                                                     winSize=LK_WIN_SIZE, maxLevel=LK_MAX_LEVEL)
 
   # Sanity check
-  assert prev_pts.shape == curr_pts.shape 
+  assert prev_pts.shape == curr_pts.shape
 
   # Filter only valid points
   idx = np.where(status==1)[0]
   prev_pts = prev_pts[idx]
   curr_pts = curr_pts[idx]
 
-  # Find transformation matrix using OpenCV 4+ API
   # estimateAffinePartial2D expects shape (N,2)
-  prev_pts_2d = prev_pts.reshape(-1, 2)
-  curr_pts_2d = curr_pts.reshape(-1, 2)
+  return prev_pts.reshape(-1, 2), curr_pts.reshape(-1, 2)
+
+def estimateMotion(prev_gray, curr_gray, scale=1.0, tracker=None, predicted=None):
+  """Estimate the (dx, dy, da) motion between two gray frames.
+
+  The frames may be downscaled by `scale` (see analysisGray), the returned
+  translation is always in full resolution pixels. With a TrackManager the
+  tracks are carried over from the previous pair instead of detecting new
+  corners every time. Returns the transform and the number of tracked points,
+  or None as the transform when no features were found in prev_gray.
+
+  A predicted transform (gyro+flow) seeds the tracking and is returned as it
+  is when fewer than GYRO_FLOW_MIN_POINTS points could be tracked.
+  """
+  if tracker is not None:
+    prev_pts_2d, curr_pts_2d = tracker.track(prev_gray, curr_gray, predicted, scale)
+    if len(prev_pts_2d) == 0:
+      prev_pts_2d = None
+  else:
+    prev_pts_2d, curr_pts_2d = trackFeatures(prev_gray, curr_gray, scale, predicted)
+
+  if predicted is not None and (prev_pts_2d is None or len(prev_pts_2d) < GYRO_FLOW_MIN_POINTS):
+    return list(predicted), 0 if prev_pts_2d is None else len(prev_pts_2d)
+  # Corners found but (almost) none tracked, e.g. over a featureless sky
+  if prev_pts_2d is None or len(prev_pts_2d) < 2:
+    return None, 0
+
+  # Find transformation matrix using OpenCV 4+ API
   m, inliers = cv2.estimateAffinePartial2D(prev_pts_2d, curr_pts_2d)
+  # Outliers (moving objects, drifted tracks) are not carried to the next pair
+  if tracker is not None and inliers is not None:
+    tracker.prune(inliers)
   # Fallback to identity if estimation fails
   if m is None:
     m = np.array([[1, 0, 0], [0, 1, 0]], dtype=np.float32)
-   
-  # Extract traslation
-  dx = m[0,2]
-  dy = m[1,2]
+
+  # Extract traslation (back to full resolution pixels)
+  dx = m[0,2] / scale
+  dy = m[1,2] / scale
 
   # Extract rotation angle
   da = np.arctan2(m[1,0], m[0,0])
-   
-  # Store transformation
-  transforms[i] = [dx,dy,da]
-   
-  # Move to next frame
-  prev_gray = curr_gray
-
-  print("Frame: " + str(i) +  "/" + str(n_frames) + " -  Tracked points : " + str(len(prev_pts)))
-
-# Compute trajectory using cumulative sum of transformations
-trajectory = np.cumsum(transforms, axis=0) 
- 
-# Create variable to store smoothed trajectory
-smoothed_trajectory = smooth(trajectory)
-
-# Apply double smoothing for extra stability if enabled
-if DOUBLE_SMOOTHING:
-    print("Applying double smoothing for maximum stability...")
-    smoothed_trajectory = smooth(smoothed_trajectory) 
-
-# Calculate difference in smoothed_trajectory and trajectory
-difference = smoothed_trajectory - trajectory
- 
-# Calculate newer transformation array
-transforms_smooth = transforms + difference
-
-# Reset stream to first frame 
-cap.set(cv2.CAP_PROP_POS_FRAMES, 0) 
-
-# FPS calculation variables
-fps_start_time = time.time()
-frame_count = 0
-
-# Write n_frames-1 transformed frames
-for i in range(n_frames-2):
-  # Read next frame
-  success, frame = cap.read() 
-  if not success:
-    break
-
-  # Extract transformations from the new transformation array
-  dx = transforms_smooth[i,0]
-  dy = transforms_smooth[i,1]
-  da = transforms_smooth[i,2]
-
-  # Reconstruct transformation matrix accordingly to new values
-  m = np.zeros((2,3), np.float32)
-  m[0,0] = np.cos(da)
-  m[0,1] = -np.sin(da)
-  m[1,0] = np.sin(da)
-  m[1,1] = np.cos(da)
-  m[0,2] = dx
-  m[1,2] = dy
-
-  # Apply affine wrapping to the given frame
-  frame_stabilized = cv2.warpAffine(frame, m, (w,h))
-
-  # Fix border artifacts
-  frame_stabilized = fixBorder(frame_stabilized) 
-
-  # Write the frame to the file
-  frame_out = cv2.hconcat([frame, frame_stabilized])
-
-  # If the image is too big, resize it.
-  if(frame_out.shape[1] > 1920): 
-    frame_out = cv2.resize(frame_out, (frame_out.shape[1]//2, frame_out.shape[0]//2));
-  
-  # Ensure frame dimensions match VideoWriter expectations
-  if frame_out.shape[:2] != (output_height, output_width):
-    frame_out = cv2.resize(frame_out, (output_width, output_height))
-  
-  # Calculate and display FPS
-  if SHOW_FPS:
-    frame_count += 1
-    current_time = time.time()
-    elapsed_time = current_time - fps_start_time
-    
-    if elapsed_time > 0:
-      current_fps = frame_count / elapsed_time
-      frame_out = drawFPS(frame_out, current_fps, FPS_POSITION)
-  
-  cv2.imshow("Before and After", frame_out)
-  cv2.waitKey(10)
-  
-  # Write frame with error checking
-  success = out.write(frame_out)
+
+  return [dx, dy, da], len(prev_pts_2d)
+
+def transformMatrix(dx, dy, da):
+  """3x3 matrix of the (dx, dy, da) similarity transform"""
+  return np.array([[np.cos(da), -np.sin(da), dx],
+                   [np.sin(da),  np.cos(da), dy],
+                   [0, 0, 1]])
+
+
+class FrameRenderer:
+  """Builds output frames with a single warp into reused buffers.
+
+  The stabilizing transform, the border zoom and the downscale of oversized
+  side-by-side frames are folded into one matrix, so each output frame costs
+  one warpAffine (plus a copy or resize of the original view).
+  Frame i is rendered into buffer i % buffers; a buffer must be written out
+  before it comes round again.
+  """
+
+  def __init__(self, w, h, layout='side_by_side', border_scale=1.04, max_width=1920, buffers=1):
+    if layout not in ('side_by_side', 'stabilized'):
+      raise ValueError(f"Unknown output layout '{layout}'")
+    self.layout = layout
+    self.frame_size = (w, h)
+    # If the side-by-side image is too big, render it at half size
+    side_by_side = layout == 'side_by_side'
+    self.scale = 0.5 if side_by_side and 2 * w > max_width else 1.0
+    self.view_size = (int(w * self.scale), int(h * self.scale))
+    view_w, view_h = self.view_size
+    self.size = (2 * view_w if side_by_side else view_w, view_h)
+    self.buffers = [np.zeros((self.size[1], self.size[0], 3), np.uint8) for _ in range(buffers)]
+
+    # Scale the image around its center to hide the borders, then to the view size
+    zoom = cv2.getRotationMatrix2D((w/2, h/2), 0, border_scale)
+    self.post = np.diag([self.scale, self.scale, 1.0]) @ np.vstack([zoom, [0, 0, 1]])
+
+  def render(self, frame, dx, dy, da, index=0):
+    """Warp a frame with the smoothed transform into the next output buffer"""
+    buffer = self.buffers[index % len(self.buffers)]
+    m = (self.post @ transformMatrix(dx, dy, da))[:2]
+    view_w, _ = self.view_size
+
+    if self.layout == 'stabilized':
+      cv2.warpAffine(frame, m, self.view_size, dst=buffer)
+      return buffer
+
+    # Original on the left, stabilized on the right, written in place
+    if self.scale == 1.0:
+      np.copyto(buffer[:, :view_w], frame)
+    else:
+      cv2.resize(frame, self.view_size, dst=buffer[:, :view_w], interpolation=cv2.INTER_AREA)
+    cv2.warpAffine(frame, m, self.view_size, dst=buffer[:, view_w:])
+    return buffer
+
+
+# The larger the more stable the video, but less reactive to sudden panning
+# Increased from 50 to 100 for better stability
+SMOOTHING_RADIUS=50
+
+# Smoothing method: 'moving_average', 'gaussian', 'kalman' (RTS smoother) or
+# 'l1' (L1-optimal camera path, needs scipy). See trajectory_smoothing.py.
+# Gaussian provides smoother results but may be less responsive
+SMOOTHING_METHOD = 'gaussian'  # Change to 'moving_average' if needed
+
+# Extra keyword arguments for the smoother, e.g. {'bounds': (40, 40, 0.02)} for 'l1'
+SMOOTHING_OPTIONS = {}
+
+# Apply double smoothing for extra stability (set to True for maximum stability)
+# Only used by the kernel methods ('moving_average' and 'gaussian')
+DOUBLE_SMOOTHING = True
+
+# Streaming mode decodes every frame once and emits stabilized frames after a
+# fixed delay (SMOOTHING_RADIUS, doubled with DOUBLE_SMOOTHING, plus one frame).
+# Needed for live feeds where CAP_PROP_FRAME_COUNT is unknown.
+STREAMING_MODE = False
+
+# Pipeline mode runs decode, gray conversion, motion estimation, warping and
+# encoding as separate stages joined by bounded queues (two-pass flow only).
+# The run summary shows how long each stage was busy, starved and blocked.
+PIPELINE_MODE = False
+PIPELINE_WORKERS = {'gray': 1, 'motion': 2, 'warp': 2}
+PIPELINE_QUEUE_SIZE = 8
+
+# Motion is estimated on frames downscaled by this factor (e.g. 0.5 or 0.25),
+# warping still happens at full resolution. Much cheaper on 1080p/4K footage.
+ANALYSIS_SCALE = 1.0
+
+# Lucas-Kanade search window and number of pyramid levels above the analysis
+# image (OpenCV's defaults). LK builds both pyramids of every pair itself; a
+# smaller window or fewer levels is cheaper per frame but follows less motion
+# between two frames, so keep enough levels at small ANALYSIS_SCALE.
+LK_WIN_SIZE = (21, 21)
+LK_MAX_LEVEL = 3
+
+# Source of the frame-to-frame motion: 'flow' (optical flow), 'gyro' (camera
+# rotation from the flight controller's gyro or attitude log, no feature
+# tracking at all) or 'gyro+flow' (gyro prediction refined by optical flow,
+# falling back to the gyro where fewer than GYRO_FLOW_MIN_POINTS points could
+# be tracked, e.g. over sky or water). See gyro_motion.py for the log formats.
+# Two-pass mode only; streaming mode always uses optical flow.
+MOTION_SOURCE = 'flow'
+MOTION_LOG = None     # .csv, text .log or .bin; None: <video>.gyro.csv
+CAMERA_CONFIG = None  # intrinsics, mounting and time_offset JSON; None: <video>.camera.json
+GYRO_FLOW_MIN_POINTS = 20
+
+# Keep feature tracks alive between frames and only re-detect corners in grid
+# cells that ran low on tracks, instead of 200 new corners on every frame.
+# Motion estimation becomes sequential (one motion worker in pipeline mode).
+PERSISTENT_TRACKS = False
+TRACK_GRID = (4, 4)  # (rows, cols)
+# Tracks whose LK error (mean absolute difference over the window) exceeds
+# this are dropped, as are the tracks RANSAC rejects as outliers
+TRACK_MAX_ERROR = 20.0
+
+# Motion analysis of a video file runs in this many processes, each one seeking
+# to its own segment of at least MOTION_SEGMENT_PAIRS frame pairs. Segments
+# overlap by one frame and the result is identical to a serial run. Ignored
+# with PERSISTENT_TRACKS, whose tracks carry over from one pair to the next.
+MOTION_WORKERS = 1
+MOTION_SEGMENT_PAIRS = 500
+
+# Segment workers seek through a keyframe index (seek_index.py) built once per
+# video and stored next to it (or in MOTION_CACHE_DIR). Frame accurate even
+# where CAP_PROP_POS_FRAMES lands on the wrong frame, e.g. variable frame rate.
+SEEK_INDEX = True
+
+# The second pass is split into this many time segments, rendered and encoded
+# in parallel processes (at least RENDER_SEGMENT_FRAMES frames each) and joined
+# without re-encoding. Needs ffmpeg for the join; two-pass mode only.
+RENDER_WORKERS = 1
+RENDER_SEGMENT_FRAMES = 300
+
+# Store the motion analysis (transforms and tracked point counts) in a .npz
+# sidecar keyed by the input file and the settings above, so re-rendering with
+# other smoothing or border settings skips optical flow entirely.
+MOTION_CACHE = True
+MOTION_CACHE_DIR = None  # None: next to the input video (also used for the seek index)
+
+# Number of frame pairs from the start of the input used to report the
+# speed/accuracy of ANALYSIS_SCALE against full resolution (0 disables)
+SCALE_REPORT_PAIRS = 30
+
+# Output layout: 'side_by_side' (original | stabilized) or 'stabilized' only,
+# which halves the pixels sent to the encoder
+OUTPUT_LAYOUT = 'side_by_side'
+
+# Zoom applied around the center to hide the black borders left by the warp
+BORDER_SCALE = 1.04
+
+# Encoder: 'auto' (ffmpeg if it is on the PATH, otherwise cv2.VideoWriter),
+# 'ffmpeg' or 'cv2'. See encoders.py; 'codecs' is the FourCC list for cv2,
+# the other options are passed to ffmpeg. A faster preset or a higher CRF
+# trades file size or quality for encoding speed.
+ENCODER = 'auto'
+ENCODER_OPTIONS = {'codec': 'libx264', 'preset': 'veryfast', 'crf': 23, 'threads': 0}
+
+# FPS display settings
+SHOW_FPS = True  # Set to False to hide FPS
+FPS_POSITION = (10, 30)  # (x, y) position for FPS text
+
+# Preview window (cv2.imshow + waitKey, at least 10 ms per frame) and the
+# per-frame progress lines. batch_stabilize.py turns both off.
+SHOW_PREVIEW = True
+LOG_FRAMES = True
+
+INPUT_PATH = r'C:\Users\TOM\Documents\Projeler\AybuHavk\GoruntuStabilize\deneme.mp4'
+OUTPUT_PATH = 'video_out.mp4'
+
+
+def applySettings(settings):
+  """Override the settings above by name, e.g. {'ANALYSIS_SCALE': 0.5}"""
+  for name, value in settings.items():
+    if not name.isupper() or name not in globals():
+      raise KeyError(f"Unknown setting '{name}'")
+    globals()[name] = value
+
+
+def logFrame(i, n_frames, n_tracked):
+  """Per-frame progress line, n_tracked is None when no features were found"""
+  if not LOG_FRAMES:
+    return
+  total = "/" + str(n_frames) if n_frames is not None else ""
+  points = "0 (no features)" if n_tracked is None else str(n_tracked)
+  print("Frame: " + str(i) + total + " -  Tracked points : " + points)
+
+
+def createTracker():
+  """TrackManager for one pass over a video, or None for per-frame detection"""
+  if not PERSISTENT_TRACKS:
+    return None
+  return TrackManager(max_corners=200, grid=TRACK_GRID,
+                      min_distance=max(1, 30 * ANALYSIS_SCALE), block_size=3,
+                      max_error=TRACK_MAX_ERROR, win_size=LK_WIN_SIZE, max_level=LK_MAX_LEVEL)
+
+
+def openWriter(path, fps, output_width, output_height):
+  """Open the ENCODER backend for the output, None if no encoder could be opened"""
+  try:
+    out = openEncoder(path, fps, (output_width, output_height), ENCODER, **ENCODER_OPTIONS)
+  except (IOError, ValueError) as e:
+    print(f"Error: Could not open video encoder: {e}")
+    return None
+  print(f"Successfully initialized {out.backend} encoder with codec: {out.codec}")
+  return out
+
+
+class FrameOutput:
+  """Shows, annotates and writes output frames while tracking FPS"""
+
+  def __init__(self, out, output_width, output_height):
+    self.out = out
+    self.output_width = output_width
+    self.output_height = output_height
+    self.fps_start_time = time.time()
+    self.frame_count = 0
+
+  def write(self, frame_out, i):
+    # Ensure frame dimensions match VideoWriter expectations
+    if frame_out.shape[:2] != (self.output_height, self.output_width):
+      frame_out = cv2.resize(frame_out, (self.output_width, self.output_height))
+
+    self.frame_count += 1
+
+    # Calculate and display FPS
+    if SHOW_FPS:
+      current_time = time.time()
+      elapsed_time = current_time - self.fps_start_time
+
+      if elapsed_time > 0:
+        current_fps = self.frame_count / elapsed_time
+        frame_out = drawFPS(frame_out, current_fps, FPS_POSITION)
+
+    if SHOW_PREVIEW:
+      cv2.imshow("Before and After", frame_out)
+      cv2.waitKey(10)
+
+    self.out.write(frame_out)
+
+  def printStatistics(self):
+    # Calculate and display final FPS statistics
+    if SHOW_FPS:
+      total_time = time.time() - self.fps_start_time
+      average_fps = self.frame_count / total_time if total_time > 0 else 0
+      print(f"\n=== FPS Statistics ===")
+      print(f"Total frames processed: {self.frame_count}")
+      print(f"Total processing time: {total_time:.2f} seconds")
+      print(f"Average FPS: {average_fps:.2f}")
+
+
+def smoothTransforms(transforms):
+  """Smooth the camera trajectory and return the corrected per-frame transforms"""
+  # Compute trajectory using cumulative sum of transformations
+  trajectory = np.cumsum(transforms, axis=0)
+
+  # Apply double smoothing for extra stability if enabled
+  passes = 2 if DOUBLE_SMOOTHING else 1
+  if DOUBLE_SMOOTHING and SMOOTHING_METHOD in ('moving_average', 'gaussian'):
+      print("Applying double smoothing for maximum stability...")
+
+  # Create variable to store smoothed trajectory
+  start = time.perf_counter()
+  smoothed_trajectory = smoothTrajectory(trajectory, SMOOTHING_METHOD, SMOOTHING_RADIUS, passes,
+                                         **SMOOTHING_OPTIONS)
+  print(f"Smoothing ({SMOOTHING_METHOD}): {(time.perf_counter() - start) * 1000:.1f} ms "
+        f"for {len(trajectory)} frames")
+
+  # Calculate difference in smoothed_trajectory and trajectory
+  difference = smoothed_trajectory - trajectory
+
+  # Calculate newer transformation array
+  transforms_smooth = transforms + difference
+
+  return transforms_smooth
+
+
+def analyseMotion(cap, n_frames, predicted=None):
+  """First pass: estimate the motion between every pair of consecutive frames.
+
+  predicted holds a transform per frame pair to seed the tracking with
+  (gyro+flow). Returns the (n_frames-1, 3) transforms array and the tracked
+  point counts.
+  """
+  # Read first frame
+  _, prev = cap.read()
+
+  # Convert frame to grayscale
+  prev_gray = analysisGray(prev, ANALYSIS_SCALE)
+
+  # Pre-define transformation-store array
+  transforms = np.zeros((n_frames-1, 3), np.float32)
+  tracked = np.zeros(n_frames-1, np.int32)
+
+  tracker = createTracker()
+
+  for i in range(n_frames-2):
+    # Read next frame
+    success, curr = cap.read()
+    if not success:
+      break
+
+    # Convert to grayscale
+    curr_gray = analysisGray(curr, ANALYSIS_SCALE)
+
+    transform, n_tracked = estimateMotion(prev_gray, curr_gray, ANALYSIS_SCALE, tracker,
+                                          predicted[i] if predicted is not None else None)
+
+    # If no features found, skip to next frame
+    if transform is None:
+      prev_gray = curr_gray
+      logFrame(i, n_frames, None)
+      continue
+
+    # Store transformation
+    transforms[i] = transform
+    tracked[i] = n_tracked
+
+    # Move to next frame
+    prev_gray = curr_gray
+
+    logFrame(i, n_frames, n_tracked)
+
+  if tracker is not None:
+    tracker.printSummary()
+
+  return transforms, tracked
+
+
+def renderVideo(cap, output, renderer, transforms_smooth, n_frames):
+  """Second pass: warp every frame with its smoothed transform"""
+  # Write n_frames-1 transformed frames
+  for i in range(n_frames-2):
+    # Read next frame
+    success, frame = cap.read()
+    if not success:
+      break
+
+    # Extract transformations from the new transformation array
+    dx = transforms_smooth[i,0]
+    dy = transforms_smooth[i,1]
+    da = transforms_smooth[i,2]
+
+    output.write(renderer.render(frame, dx, dy, da, i), i)
+
+
+def readFrames(cap, count):
+  """Yield up to count frames from the capture"""
+  for _ in range(count):
+    success, frame = cap.read()
+    if not success:
+      break
+    yield frame
+
+
+def analyseMotionPipelined(cap, n_frames):
+  """analyseMotion() with decode, gray conversion and motion as pipeline stages"""
+  transforms = np.zeros((n_frames-1, 3), np.float32)
+  tracked = np.zeros(n_frames-1, np.int32)
+
+  # Pairs consecutive gray frames, must see them in order
+  prev = {'gray': None}
+  def pairFrames(gray):
+    prev_gray, prev['gray'] = prev['gray'], gray
+    return None if prev_gray is None else (prev_gray, gray)
+
+  def storeMotion(index, result):
+    # Pipeline index 0 is the first frame, which has no pair
+    i = index - 1
+    transform, n_tracked = result
+    if transform is None:
+      logFrame(i, n_frames, None)
+      return
+    transforms[i] = transform
+    tracked[i] = n_tracked
+    logFrame(i, n_frames, n_tracked)
+
+  # Persistent tracks need the pairs in order, on a single worker
+  tracker = createTracker()
+  if tracker is not None:
+    motion_stage = Stage('motion', lambda pair: estimateMotion(*pair, ANALYSIS_SCALE, tracker), 1, ordered=True)
+  else:
+    motion_stage = Stage('motion', lambda pair: estimateMotion(*pair, ANALYSIS_SCALE), PIPELINE_WORKERS['motion'])
+
+  analysis = Pipeline(
+    readFrames(cap, n_frames-1),
+    [Stage('gray', lambda frame: analysisGray(frame, ANALYSIS_SCALE), PIPELINE_WORKERS['gray']),
+     Stage('pair', pairFrames, 1, ordered=True),
+     motion_stage],
+    storeMotion, queue_size=PIPELINE_QUEUE_SIZE, sink_name='store')
+  analysis.run()
+  analysis.printSummary('motion analysis')
+  if tracker is not None:
+    tracker.printSummary()
+
+  return transforms, tracked
+
+
+def frameDigest(frame):
+  return hashlib.sha1(frame.tobytes()).hexdigest() if frame is not None else None
+
+
+def seekIndex(path):
+  """Keyframe seek index of a video file for the segment workers, or None"""
+  if not SEEK_INDEX:
+    return None
+  try:
+    return loadIndex(path, MOTION_CACHE_DIR)
+  except IOError as e:
+    print(f"Warning: no seek index for '{path}': {e}")
+    return None
+
+
+def openAt(path, start, index=None):
+  """Capture whose next read() returns frame start, seeking through the index if given"""
+  if index is not None:
+    cap = IndexedCapture(path, index)
+    try:
+      cap.seek(start)
+      return cap
+    except (IndexError, IOError):
+      # Let the segment checks of the caller sort it out
+      cap.release()
+  cap = cv2.VideoCapture(path)
+  if start > 0:
+    cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+  return cap
+
+
+def analyseSegment(path, start, stop, scale, cv_threads=1, index=None):
+  """Estimate the motion of the frame pairs start..stop-1 of a video file.
+
+  Runs in a worker process that opens and seeks its own capture (frame
+  accurate with a SeekIndex). Besides the
+  transforms and tracked point counts it returns the number of pairs that
+  could be read and digests of the first and last decoded frame, so that
+  neighbouring segments can be checked to agree on their shared frame.
+  """
+  cv2.setNumThreads(cv_threads)
+  cap = openAt(path, start, index)
+
+  transforms = np.zeros((stop - start, 3), np.float32)
+  tracked = np.zeros(stop - start, np.int32)
+
+  success, prev = cap.read()
   if not success:
-    print(f"Warning: Failed to write frame {i}")
-
-# Release video and ensure proper cleanup
-cap.release()
-
-# Ensure all frames are written before releasing
-out.release()
-
-# Calculate and display final FPS statistics
-if SHOW_FPS:
-    total_time = time.time() - fps_start_time
-    average_fps = frame_count / total_time if total_time > 0 else 0
-    print(f"\n=== FPS Statistics ===")
-    print(f"Total frames processed: {frame_count}")
-    print(f"Total processing time: {total_time:.2f} seconds")
-    print(f"Average FPS: {average_fps:.2f}")
-
-# Verify video file was created successfully
-if os.path.exists('video_out.mp4'):
-    file_size = os.path.getsize('video_out.mp4')
-    if file_size > 0:
-        print(f"Video successfully saved as 'video_out.mp4' ({file_size} bytes)")
+    cap.release()
+    return transforms, tracked, 0, None, None
+  first = frameDigest(prev)
+  prev_gray = analysisGray(prev, scale)
+  last = prev
+
+  pairs = 0
+  for k in range(stop - start):
+    success, curr = cap.read()
+    if not success:
+      break
+    curr_gray = analysisGray(curr, scale)
+
+    # Same steps as analyseMotion, pairs without features stay zero
+    transform, n_tracked = estimateMotion(prev_gray, curr_gray, scale)
+    if transform is not None:
+      transforms[k] = transform
+      tracked[k] = n_tracked
+
+    prev_gray = curr_gray
+    last = curr
+    pairs += 1
+
+  cap.release()
+  return transforms, tracked, pairs, first, frameDigest(last)
+
+
+def analyseMotionParallel(cap, path, n_frames):
+  """First pass split into segments that are analysed in MOTION_WORKERS processes.
+
+  Falls back to analyseMotion on cap when the segments disagree on their
+  shared frames, i.e. when seeking is not frame accurate for this file.
+  """
+  start_time = time.time()
+  # Same pairs as the serial pass, which stops one pair short
+  n_pairs = max(0, n_frames-2)
+  n_segments = max(1, min(MOTION_WORKERS * 4, n_pairs // max(1, MOTION_SEGMENT_PAIRS)))
+  bounds = np.linspace(0, n_pairs, n_segments + 1).astype(int)
+  cv_threads = max(1, (os.cpu_count() or 1) // MOTION_WORKERS)
+  index = seekIndex(path)
+
+  results = [None] * n_segments
+  # Spawned workers (Windows) start from the module defaults, not from our settings
+  with ProcessPoolExecutor(max_workers=min(MOTION_WORKERS, n_segments), initializer=applySettings,
+                           initargs=(currentSettings(),)) as pool:
+    futures = {pool.submit(analyseSegment, path, int(bounds[k]), int(bounds[k+1]), ANALYSIS_SCALE,
+                           cv_threads, index): k
+               for k in range(n_segments)}
+    for future in as_completed(futures):
+      k = futures[future]
+      results[k] = future.result()
+      if LOG_FRAMES:
+        print(f"Segment {k + 1}/{n_segments}: frames {bounds[k]}-{bounds[k+1]} - "
+              f"Mean tracked points : {np.mean(results[k][1]) if len(results[k][1]) else 0:.1f}")
+
+  # Every segment must end on the frame the next one started from
+  for k in range(n_segments - 1):
+    _, _, pairs, _, last = results[k]
+    if pairs != bounds[k+1] - bounds[k] or last != results[k+1][3]:
+      print(f"Warning: segment {k + 1} does not line up with segment {k + 2} "
+            f"(inexact seeking), analysing motion serially")
+      return analyseMotion(cap, n_frames)
+
+  transforms = np.zeros((n_frames-1, 3), np.float32)
+  tracked = np.zeros(n_frames-1, np.int32)
+  for k in range(n_segments):
+    transforms[bounds[k]:bounds[k+1]] = results[k][0]
+    tracked[bounds[k]:bounds[k+1]] = results[k][1]
+
+  print(f"Motion analysis: {n_pairs} pairs in {n_segments} segments on {MOTION_WORKERS} processes"
+        f"{' (seek index)' if index is not None else ''}, "
+        f"{time.time() - start_time:.2f} s")
+  return transforms, tracked
+
+
+def renderVideoPipelined(cap, output, renderer, transforms_smooth, n_frames):
+  """renderVideo() with decode, warp and encode as pipeline stages"""
+  # Frame i reuses the output buffer of frame i - buffers. The encoder can fall
+  # behind by more than the queues hold (it reorders the warped frames), so a
+  # frame is only decoded once the one using the same buffer has been written.
+  free_buffers = threading.Semaphore(len(renderer.buffers))
+
+  def frames():
+    for item in enumerate(readFrames(cap, n_frames-2)):
+      while not free_buffers.acquire(timeout=0.1):
+        if render.failed.is_set():
+          return
+      yield item
+
+  def write(index, frame_out):
+    output.write(frame_out, index)
+    free_buffers.release()
+
+  # Frames carry their index, so the warp workers can run out of order
+  render = Pipeline(
+    frames(),
+    [Stage('warp', lambda item: renderer.render(item[1], *transforms_smooth[item[0]], item[0]),
+           PIPELINE_WORKERS['warp'])],
+    write,
+    queue_size=PIPELINE_QUEUE_SIZE)
+  render.run()
+  render.printSummary('render')
+
+
+def motionLogPaths(input_path):
+  """Motion log and camera config (None: default camera) for the gyro motion sources"""
+  camera_path = CAMERA_CONFIG or defaultCameraPath(input_path)
+  return MOTION_LOG or defaultLogPath(input_path), camera_path if os.path.isfile(camera_path) else None
+
+
+def motionParameters(input_path=None):
+  """Settings that change the result of the motion analysis pass"""
+  params = {
+    'analysis_scale': ANALYSIS_SCALE,
+    'persistent_tracks': PERSISTENT_TRACKS,
+    'track_grid': list(TRACK_GRID) if PERSISTENT_TRACKS else None,
+    'track_max_error': TRACK_MAX_ERROR if PERSISTENT_TRACKS else None,
+    'features': [200, 0.01, 30, 3],
+    'lk': [*LK_WIN_SIZE, LK_MAX_LEVEL],
+  }
+  if MOTION_SOURCE != 'flow':
+    # Editing the log or the camera file must invalidate the cached motion
+    log_path, camera_path = motionLogPaths(input_path)
+    params['source'] = [MOTION_SOURCE, GYRO_FLOW_MIN_POINTS]
+    params['motion_log'] = fileFingerprint(log_path) if os.path.isfile(log_path) else None
+    params['camera'] = fileFingerprint(camera_path) if camera_path else None
+  return params
+
+
+def gyroMotion(input_path, n_frames):
+  """Frame-to-frame transforms of the video from its motion log"""
+  log_path, camera_path = motionLogPaths(input_path)
+  if not os.path.isfile(log_path):
+    raise IOError(f"MOTION_SOURCE '{MOTION_SOURCE}' needs a motion log, '{log_path}' does not exist")
+  # Frame times from the seek index are right for variable frame rate too
+  index = seekIndex(input_path)
+  timestamps = index.timestamps if index is not None and len(index) == n_frames else None
+  transforms = videoTransforms(input_path, log_path, camera_path, timestamps)
+  print(f"Motion from '{log_path}'" + (f" with camera '{camera_path}'" if camera_path else " (default camera)"))
+  return transforms[:n_frames-1].astype(np.float32)
+
+
+def loadOrAnalyseMotion(cap, input_path):
+  """Frame-to-frame transforms from the motion cache, or from a first pass over cap.
+
+  Returns the transforms, the tracked point counts (None for gyro-only
+  motion, which tracks no image features) and the frame count.
+  """
+  # Get frame count
+  n_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+
+  # Re-renders with other smoothing settings reuse the stored motion
+  cached = loadMotion(input_path, motionParameters(input_path), MOTION_CACHE_DIR) if MOTION_CACHE else None
+  if cached is not None and len(cached[0]) == n_frames-1:
+    transforms, tracked = cached
+    if MOTION_SOURCE == 'gyro':
+      # Older caches stored zero counts for gyro-only motion
+      tracked = None
+    print(f"Loaded motion analysis from cache ({len(transforms)} transforms)")
+  else:
+    if MOTION_SOURCE == 'gyro':
+      transforms = gyroMotion(input_path, n_frames)
+      tracked = None
+    elif MOTION_SOURCE == 'gyro+flow':
+      # Sequential: every pair needs its own prediction
+      transforms, tracked = analyseMotion(cap, n_frames, gyroMotion(input_path, n_frames))
+    elif MOTION_WORKERS > 1 and not PERSISTENT_TRACKS and os.path.isfile(input_path):
+      transforms, tracked = analyseMotionParallel(cap, input_path, n_frames)
+    elif PIPELINE_MODE:
+      transforms, tracked = analyseMotionPipelined(cap, n_frames)
     else:
-        print("Warning: Video file is empty")
-else:
-    print("Error: Video file was not created")
+      transforms, tracked = analyseMotion(cap, n_frames)
+    if MOTION_CACHE:
+      path = saveMotion(input_path, motionParameters(input_path), transforms, tracked, MOTION_CACHE_DIR)
+      if path is not None:
+        print(f"Motion analysis saved to '{path}'")
+
+  return transforms, tracked, n_frames
+
+
+def analyseTwoPass(cap, input_path):
+  """First pass over the whole video (or the motion cache) followed by smoothing.
+
+  Returns the smoothed transforms, the tracked point count of every analysed
+  frame pair (None without image tracking) and the frame count.
+  """
+  transforms, tracked, n_frames = loadOrAnalyseMotion(cap, input_path)
+  transforms_smooth = smoothTransforms(transforms)
+
+  # The first pass stops one pair short, the last entry is never filled
+  if tracked is not None:
+    tracked = tracked[:max(0, n_frames-2)]
+  return transforms_smooth, tracked, n_frames
+
+
+def renderTwoPass(cap, output, renderer, transforms_smooth, n_frames):
+  """Second pass: rewind and render every frame into output"""
+  # Reset stream to first frame
+  cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+
+  if PIPELINE_MODE:
+    renderVideoPipelined(cap, output, renderer, transforms_smooth, n_frames)
+  else:
+    renderVideo(cap, output, renderer, transforms_smooth, n_frames)
+
+
+def renderInSegments(input_path):
+  """True if the second pass can be split over RENDER_WORKERS processes"""
+  if RENDER_WORKERS <= 1 or not os.path.isfile(input_path):
+    return False
+  ffmpeg = ENCODER_OPTIONS.get('ffmpeg', 'ffmpeg')
+  if shutil.which(ffmpeg) is None:
+    print(f"RENDER_WORKERS > 1 needs '{ffmpeg}' to join the segments, rendering in one process")
+    return False
+  return True
+
+
+def currentSettings():
+  """The settings above as a dict, for applySettings in worker processes"""
+  return {name: value for name, value in globals().items() if name.isupper()}
+
+
+def renderSegment(input_path, segment_path, start, transforms_smooth, fps, settings, cv_threads=1, index=None):
+  """Render and encode frames start.. into their own file (worker process).
+
+  transforms_smooth holds the rows of this segment only. Frame start-1 is
+  decoded too; its digest and the digest of the last rendered frame let the
+  caller check that the segments line up. Returns the frames written, both
+  digests and the encoder summary.
+  """
+  applySettings(settings)
+  cv2.setNumThreads(cv_threads)
+  cap = openAt(input_path, max(0, start - 1), index)
+  w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+  h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+  renderer = FrameRenderer(w, h, OUTPUT_LAYOUT, BORDER_SCALE)
+  out = openWriter(segment_path, fps, *renderer.size)
+  if out is None:
+    cap.release()
+    raise IOError(f"Could not open video writer for '{segment_path}'")
+  output = FrameOutput(out, *renderer.size)
+
+  lead = None
+  if start > 0:
+    success, frame = cap.read()
+    lead = frameDigest(frame) if success else None
+
+  last = None
+  for k, (dx, dy, da) in enumerate(transforms_smooth):
+    success, frame = cap.read()
+    if not success:
+      break
+    output.write(renderer.render(frame, dx, dy, da, start + k), start + k)
+    last = frame
+
+  cap.release()
+  out.release()
+  return output.frame_count, lead, frameDigest(last), out.summary()
+
+
+def renderVideoSegments(input_path, output_path, transforms_smooth, n_frames, fps):
+  """Second pass split into segments rendered and encoded in RENDER_WORKERS processes.
+
+  Every segment is a separate file starting with a keyframe; they are joined
+  into output_path without re-encoding. Returns a summary like
+  Encoder.summary(), or None when the segments do not line up (inexact
+  seeking) and the caller should render serially.
+  """
+  start_time = time.time()
+  # Same frames as renderVideo
+  n_render = max(0, n_frames-2)
+  n_segments = max(1, min(RENDER_WORKERS, n_render // max(1, RENDER_SEGMENT_FRAMES)))
+  bounds = np.linspace(0, n_render, n_segments + 1).astype(int)
+  root, ext = os.path.splitext(output_path)
+  paths = [f"{root}.segment{k}{ext}" for k in range(n_segments)]
+
+  # Workers have no window to show the preview in
+  settings = currentSettings()
+  settings['SHOW_PREVIEW'] = False
+  cv_threads = max(1, (os.cpu_count() or 1) // RENDER_WORKERS)
+  index = seekIndex(input_path)
+
+  results = [None] * n_segments
+  try:
+    with ProcessPoolExecutor(max_workers=n_segments) as pool:
+      futures = {pool.submit(renderSegment, input_path, paths[k], int(bounds[k]),
+                             transforms_smooth[bounds[k]:bounds[k+1]], fps, settings, cv_threads, index): k
+                 for k in range(n_segments)}
+      for future in as_completed(futures):
+        k = futures[future]
+        results[k] = future.result()
+        print(f"Segment {k + 1}/{n_segments}: frames {bounds[k]}-{bounds[k+1]} rendered")
+
+    # Every segment must start right after the frame the previous one ended on
+    for k in range(n_segments - 1):
+      frames, _, last, _ = results[k]
+      if frames != bounds[k+1] - bounds[k] or last != results[k+1][1]:
+        print(f"Warning: segment {k + 1} does not line up with segment {k + 2} "
+              f"(inexact seeking), rendering in one process")
+        return None
+
+    concatVideos(paths, output_path, ENCODER_OPTIONS.get('ffmpeg', 'ffmpeg'))
+  finally:
+    for path in paths:
+      if os.path.exists(path):
+        os.remove(path)
+
+  elapsed = time.time() - start_time
+  frames = sum(r[0] for r in results)
+  summary = dict(results[0][3], frames=frames, seconds=round(elapsed, 3),
+                 fps=round(frames / elapsed, 2) if elapsed > 0 else 0.0,
+                 bytes=os.path.getsize(output_path), segments=n_segments)
+  print(f"\n=== Segmented render ({summary['backend']}, {summary['codec']}) ===")
+  print(f"Frames rendered and encoded: {frames} in {n_segments} segments on {RENDER_WORKERS} processes, "
+        f"{elapsed:.2f} s ({summary['fps']:.1f} FPS)")
+  print(f"Output size: {summary['bytes'] / (1 << 20):.2f} MB")
+  return summary
+
+
+StreamFrame = namedtuple('StreamFrame', ['index', 'timestamp', 'frame', 'stabilized',
+                                         'motion', 'correction', 'tracked'])
+StreamFrame.__doc__ = """One stabilized frame of a stream.
+
+motion is the (dx, dy, da) measured from the previous frame (zeros for the
+first one), correction the (dx, dy, da) the frame was warped with and tracked
+the number of tracked points (None for the first frame). stabilized lives in
+a reused buffer and is only valid until the next frame is requested.
+"""
+
+
+def timestampedFrames(frames):
+  """(frame, timestamp) pairs of an iterable of frames or of such pairs"""
+  for item in frames:
+    if isinstance(item, tuple):
+      yield item
+    else:
+      yield item, None
+
+
+def streamDelay():
+  """Frames streamStabilized() reads ahead before yielding a frame"""
+  smoother = StreamingSmoother(kernelCascade(SMOOTHING_METHOD, SMOOTHING_RADIUS,
+                                             2 if DOUBLE_SMOOTHING else 1))
+  # Frame i needs the trajectory up to i + delay, and that sample needs frame
+  # i + delay + 1 to be decoded.
+  return smoother.delay + 1
+
+
+def streamStabilized(frames, renderer=None, tracker=None):
+  """Stabilize an iterable of frames (or (frame, timestamp) pairs) read only once.
+
+  Yields a StreamFrame per input frame, each as soon as its smoothed
+  trajectory is known, i.e. streamDelay() frames later or at the end of the
+  input. Only the kernel smoothers have a fixed lookahead. The input frames
+  are kept until they are yielded, so the producer must not reuse them.
+  Without a renderer the stabilized view is rendered at the input size with
+  BORDER_SCALE.
+  """
+  smoother = StreamingSmoother(kernelCascade(SMOOTHING_METHOD, SMOOTHING_RADIUS,
+                                             2 if DOUBLE_SMOOTHING else 1))
+  items = timestampedFrames(frames)
+  first = next(items, None)
+  if first is None:
+    return
+  prev, prev_time = first
+  if renderer is None:
+    h, w = prev.shape[:2]
+    renderer = FrameRenderer(w, h, 'stabilized', BORDER_SCALE)
+  prev_gray = analysisGray(prev, ANALYSIS_SCALE)
+
+  # Frames waiting for their smoothed trajectory:
+  # (frame, timestamp, motion, tracked, transform to the next frame, trajectory)
+  pending = deque()
+  trajectory = np.zeros(3)
+  motion, tracked = np.zeros(3), None
+  index = 0
+
+  def emit(smoothed):
+    nonlocal index
+    frame, timestamp, motion_in, tracked_in, transform, raw = pending.popleft()
+    correction = transform + (smoothed - raw)
+    record = StreamFrame(index, timestamp, frame, renderer.render(frame, *correction, index),
+                         motion_in, correction, tracked_in)
+    index += 1
+    return record
+
+  for curr, curr_time in items:
+    curr_gray = analysisGray(curr, ANALYSIS_SCALE)
+    transform, n_tracked = estimateMotion(prev_gray, curr_gray, ANALYSIS_SCALE, tracker)
+    transform = np.zeros(3) if transform is None else np.asarray(transform, dtype=np.float64)
+    trajectory = trajectory + transform
+
+    pending.append((prev, prev_time, motion, tracked, transform, trajectory))
+    for smoothed in smoother.push(trajectory):
+      yield emit(smoothed)
+
+    prev, prev_time, prev_gray = curr, curr_time, curr_gray
+    motion, tracked = transform, n_tracked
+
+  # The last frame has no successor and stays where the trajectory ends; the
+  # remaining frames use the edge padded trajectory
+  pending.append((prev, prev_time, motion, tracked, np.zeros(3), trajectory))
+  for smoothed in chain(smoother.push(trajectory), smoother.flush()):
+    yield emit(smoothed)
+
+
+def runStreaming(cap, output, renderer, fps):
+  """Decode every frame once and render it as soon as its smoothed value is known.
+
+  Returns the tracked point count of every frame pair.
+  """
+  delay_frames = streamDelay()
+  print(f"Streaming mode: output delay {delay_frames} frames"
+        + (f" ({delay_frames / fps:.2f} s)" if fps > 0 else ""))
+
+  decoded = 0
+
+  def frames():
+    nonlocal decoded
+    while True:
+      success, frame = cap.read()
+      if not success:
+        return
+      decoded += 1
+      yield frame
+
+  tracker = createTracker()
+  tracked = []
+  max_pending = 0
+  written = 0
+  for record in streamStabilized(frames(), renderer, tracker):
+    if record.index > 0:
+      tracked.append(record.tracked)
+      logFrame(record.index - 1, None, record.tracked or None)
+    max_pending = max(max_pending, decoded - record.index)
+    output.write(record.stabilized, record.index)
+    written += 1
+
+  if tracker is not None:
+    tracker.printSummary()
+  print(f"Streaming mode: {decoded} frames decoded once, {written} written, "
+        f"peak buffer {max_pending} frames")
+  return np.asarray(tracked, np.int32)
+
+
+def reportAnalysisScale(path, n_pairs, scales=(1.0, 0.5, 0.25)):
+  """Compare motion estimation cost and error at several analysis scales.
+
+  Full resolution is the reference. Only the first n_pairs frame pairs of
+  the input are used.
+  """
+  cap = cv2.VideoCapture(path)
+  frames = list(readFrames(cap, n_pairs + 1))
+  cap.release()
+  if len(frames) < 2:
+    return
+
+  scales = sorted(set(scales) | {1.0, ANALYSIS_SCALE}, reverse=True)
+  results = {}
+  for scale in scales:
+    grays = [analysisGray(frame, scale) for frame in frames]
+    start = time.perf_counter()
+    estimates = [estimateMotion(grays[i], grays[i+1], scale)[0] for i in range(len(grays) - 1)]
+    elapsed = time.perf_counter() - start
+    estimates = np.array([e if e is not None else [0, 0, 0] for e in estimates], dtype=np.float64)
+    results[scale] = (elapsed * 1000 / len(estimates), estimates)
+
+  reference_ms, reference = results[1.0]
+  print(f"\n=== Analysis scale tradeoff ({len(reference)} pairs, full resolution reference) ===")
+  print(f"{'scale':>6}{'ms/pair':>10}{'speedup':>9}{'err px':>9}{'err deg':>9}")
+  for scale in scales:
+    ms, estimates = results[scale]
+    err_px = np.mean(np.hypot(*(estimates[:, :2] - reference[:, :2]).T))
+    err_deg = np.degrees(np.mean(np.abs(estimates[:, 2] - reference[:, 2])))
+    marker = "  <- ANALYSIS_SCALE" if scale == ANALYSIS_SCALE else ""
+    print(f"{scale:>6.2f}{ms:>10.2f}{reference_ms / ms if ms > 0 else 0:>8.1f}x{err_px:>9.3f}{err_deg:>9.4f}{marker}")
+
+
+def trackedStatistics(tracked):
+  """Summary of the per-pair tracked point counts, None if no features were tracked (gyro)"""
+  if tracked is None:
+    return None
+  tracked = np.asarray(tracked)
+  if len(tracked) == 0:
+    return {'pairs': 0}
+  return {
+    'pairs': int(len(tracked)),
+    'mean': round(float(np.mean(tracked)), 2),
+    'min': int(np.min(tracked)),
+    'p5': round(float(np.percentile(tracked, 5)), 2),
+    'max': int(np.max(tracked)),
+    'no_features': int(np.count_nonzero(tracked == 0)),
+  }
+
+
+def stabilizeVideo(input_path, output_path):
+  """Stabilize one video file with the settings above.
+
+  Returns a dict with the frame count, timing and tracked point statistics.
+  """
+  start_time = time.time()
+
+  # Read input video
+  cap = cv2.VideoCapture(input_path)
+  if not cap.isOpened():
+    raise IOError(f"Could not open input video '{input_path}'")
+
+  # Get width and height of video stream
+  w = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
+  h = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
+
+  # Get frames per second (fps)
+  fps = cap.get(cv2.CAP_PROP_FPS)
+
+  # Frames between the warp and the encoder need their own buffers in pipeline mode
+  buffers = 1
+  if PIPELINE_MODE and not STREAMING_MODE:
+    buffers = PIPELINE_QUEUE_SIZE + 2 * PIPELINE_WORKERS['warp'] + 2
+  renderer = FrameRenderer(w, h, OUTPUT_LAYOUT, BORDER_SCALE, buffers=buffers)
+
+  # Set up output video with proper dimensions
+  output_width, output_height = renderer.size
+
+  def openOutput():
+    out = openWriter(output_path, fps, output_width, output_height)
+
+    # Check if VideoWriter was initialized successfully
+    if out is None:
+      cap.release()
+      raise IOError(f"Could not open video writer for '{output_path}'")
+
+    return out, FrameOutput(out, output_width, output_height)
+
+  encoder = None
+  if STREAMING_MODE:
+    if MOTION_SOURCE != 'flow':
+      print(f"Note: MOTION_SOURCE '{MOTION_SOURCE}' is two-pass only, streaming mode uses optical flow")
+    out, output = openOutput()
+    tracked = runStreaming(cap, output, renderer, fps)
+  else:
+    transforms_smooth, tracked, n_frames = analyseTwoPass(cap, input_path)
+    if renderInSegments(input_path):
+      encoder = renderVideoSegments(input_path, output_path, transforms_smooth, n_frames, fps)
+    if encoder is None:
+      out, output = openOutput()
+      renderTwoPass(cap, output, renderer, transforms_smooth, n_frames)
+
+  # Release video and ensure proper cleanup
+  cap.release()
+
+  if encoder is None:
+    # Ensure all frames are written before releasing
+    out.release()
+
+    output.printStatistics()
+    out.printSummary()
+    encoder = out.summary()
+  elapsed = time.time() - start_time
+
+  if ANALYSIS_SCALE != 1.0 and SCALE_REPORT_PAIRS > 0:
+    reportAnalysisScale(input_path, SCALE_REPORT_PAIRS)
+
+  # Verify video file was created successfully
+  file_size = 0
+  if os.path.exists(output_path):
+      file_size = os.path.getsize(output_path)
+      if file_size > 0:
+          print(f"Video successfully saved as '{output_path}' ({file_size} bytes)")
+      else:
+          print("Warning: Video file is empty")
+  else:
+      print("Error: Video file was not created")
+
+  return {
+    'input': input_path,
+    'output': output_path,
+    'width': w,
+    'height': h,
+    'input_fps': round(fps, 3),
+    'frames': encoder['frames'],
+    'seconds': round(elapsed, 3),
+    'fps': round(encoder['frames'] / elapsed, 2) if elapsed > 0 else 0.0,
+    'tracked_points': trackedStatistics(tracked),
+    'output_bytes': file_size,
+    'encoder': encoder,
+  }
+
+
+def main():
+  stabilizeVideo(INPUT_PATH, OUTPUT_PATH)
+
+  # Close windows
+  if SHOW_PREVIEW:
+    cv2.destroyAllWindows()
+
 
-# Close windows
-cv2.destroyAllWindows()
\ No newline at end of file
+if __name__ == "__main__":
+  main()